@@ -0,0 +1,50 @@
+import os
+import re
+
+# Indexes already built by this process: absolute folder path -> AltLibraryIndex
+loadedIndexes = dict()
+
+def cleanLibName(libName):
+    """
+    Library name without version and .so suffix (libfoo-1.2.so.3 -> libfoo), same as
+    Piecewise.cleanLib
+    """
+    if ( ".so" in libName ):
+        libName = re.sub(r"-[0-9][0-9.]*\.so",".so",libName)
+        libName = libName[:libName.index(".so")]
+    return libName
+
+class AltLibraryIndex:
+    """
+    Cleaned library name -> path of the files in an alternate library folder, so
+    looking up a library doesn't list the folder and clean every file name again.
+    """
+    def __init__(self, folderPath):
+        self.folderPath = os.path.abspath(folderPath)
+        self.mtime = os.stat(self.folderPath).st_mtime_ns
+        self.fileNames = os.listdir(self.folderPath)
+        self.cleanedToPath = dict()
+        for fileName in self.fileNames:
+            # The first file in listing order wins, like the previous linear scan
+            self.cleanedToPath.setdefault(cleanLibName(fileName), self.folderPath + "/" + fileName)
+
+    def isStale(self):
+        try:
+            return os.stat(self.folderPath).st_mtime_ns != self.mtime
+        except OSError:
+            return True
+
+    def lookup(self, libraryName):
+        return self.cleanedToPath.get(cleanLibName(libraryName), None)
+
+def getIndex(folderPath):
+    """
+    Return the index of the folder, rebuilt if files have been added or removed
+    since it was built (the folder mtime changed)
+    """
+    folderPath = os.path.abspath(folderPath)
+    index = loadedIndexes.get(folderPath, None)
+    if ( index is None or index.isStale() ):
+        index = AltLibraryIndex(folderPath)
+        loadedIndexes[folderPath] = index
+    return index
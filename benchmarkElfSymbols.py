@@ -0,0 +1,77 @@
+import os, sys
+import logging
+import optparse
+import time
+
+sys.path.insert(0, './python-utils/')
+
+import util
+import elfReader
+
+def setLogPath(logPath):
+    """
+    Set the property of the logger: path, config, and format
+    :param logPath:
+    :return:
+    """
+    if os.path.exists(logPath):
+        os.remove(logPath)
+
+    rootLogger = logging.getLogger("coverage")
+    if options.debug:
+        logging.basicConfig(filename=logPath, level=logging.DEBUG)
+        rootLogger.setLevel(logging.DEBUG)
+    else:
+        logging.basicConfig(filename=logPath, level=logging.INFO)
+        rootLogger.setLevel(logging.INFO)
+
+    consoleHandler = logging.StreamHandler()
+    rootLogger.addHandler(consoleHandler)
+    return rootLogger
+
+def timeExtraction(extractFunc, filePaths, logger):
+    results = dict()
+    startTime = time.time()
+    for filePath in filePaths:
+        functionList = extractFunc(filePath, logger)
+        results[filePath] = set(functionList) if functionList else set()
+    return time.time() - startTime, results
+
+if __name__ == '__main__':
+    """
+    Compare the nm/objdump based symbol extraction with the native ELF reader
+    """
+    usage = "Usage: %prog -i <Folder containing ELF files> -d <optional: debug>"
+
+    parser = optparse.OptionParser(usage=usage, version="1")
+
+    parser.add_option("-i", "--inputfolder", dest="inputfolder", default=None, nargs=1,
+                      help="Path to folder containing EXEs and LIBs")
+
+    parser.add_option("-d", "--debug", dest="debug", action="store_true", default=False,
+                      help="Debug enabled/disabled")
+
+    (options, args) = parser.parse_args()
+    if ( not options.inputfolder ):
+        parser.error("Option -i should be provided.")
+    rootLogger = setLogPath("benchmarkelfsymbols.log")
+
+    filePaths = list()
+    for fileName in sorted(os.listdir(options.inputfolder)):
+        filePath = options.inputfolder + "/" + fileName
+        if ( os.path.isfile(filePath) ):
+            filePaths.append(filePath)
+
+    extractors = [("extractExportedFunctions", util.extractExportedFunctionsWithNm, elfReader.extractExportedFunctions),
+                  ("extractImportedFunctions", util.extractImportedFunctions, elfReader.extractImportedFunctions),
+                  ("extractImportedFunctionsFromLibc", util.extractImportedFunctionsFromLibc, elfReader.extractImportedFunctionsFromLibc)]
+    for extractorName, nmFunc, nativeFunc in extractors:
+        nmTime, nmResults = timeExtraction(nmFunc, filePaths, rootLogger)
+        nativeTime, nativeResults = timeExtraction(nativeFunc, filePaths, rootLogger)
+        mismatchCount = 0
+        for filePath in filePaths:
+            if ( nmResults[filePath] != nativeResults[filePath] ):
+                mismatchCount += 1
+                rootLogger.debug("%s mismatch for %s: only nm: %s only native: %s", extractorName, filePath, str(nmResults[filePath] - nativeResults[filePath]), str(nativeResults[filePath] - nmResults[filePath]))
+        speedup = nmTime / nativeTime if nativeTime > 0 else float("inf")
+        rootLogger.info("%s: files: %d nm: %.3fs native: %.3fs speedup: %.1fx mismatches: %d", extractorName, len(filePaths), nmTime, nativeTime, speedup, mismatchCount)
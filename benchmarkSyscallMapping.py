@@ -0,0 +1,143 @@
+import os, sys
+import logging
+import optparse
+import time
+
+sys.path.insert(0, './python-utils/')
+
+import graph
+import elfSymbols
+import compiledGraph
+import libcSummary
+import syscallIndex
+
+def setLogPath(logPath):
+    """
+    Set the property of the logger: path, config, and format
+    :param logPath:
+    :return:
+    """
+    if os.path.exists(logPath):
+        os.remove(logPath)
+
+    rootLogger = logging.getLogger("coverage")
+    if options.debug:
+        logging.basicConfig(filename=logPath, level=logging.DEBUG)
+        rootLogger.setLevel(logging.DEBUG)
+    else:
+        logging.basicConfig(filename=logPath, level=logging.INFO)
+        rootLogger.setLevel(logging.INFO)
+
+    consoleHandler = logging.StreamHandler()
+    rootLogger.addHandler(consoleHandler)
+    return rootLogger
+
+def mapWithLeafAccumulation(glibcGraph, functions):
+    """
+    Previous mapping of extractElfFunctions.py: the leaves of every function are
+    unioned into a growing set and the whole set is re-parsed after each function
+    """
+    glibcSyscallList = list()
+    for i in range(400):
+        glibcSyscallList.append("syscall(" + str(i) + ")")
+        glibcSyscallList.append("syscall ( " + str(i) + " )")
+        glibcSyscallList.append("syscall( " + str(i) + " )")
+    syscalls = set()
+    tmpSet = set()
+    for function in functions:
+        leaves = glibcGraph.getLeavesFromStartNode(function, glibcSyscallList, list())
+        tmpSet = tmpSet.union(leaves)
+        for syscallStr in tmpSet:
+            syscallStr = syscallStr.replace("syscall( ", "syscall(")
+            syscallStr = syscallStr.replace("syscall ( ", "syscall(")
+            syscallStr = syscallStr.replace(" )", ")")
+            syscalls.add(int(syscallStr[8:-1]))
+    return syscalls
+
+def mapWithLeafMemo(glibcGraph, functions):
+    """
+    Per-function leaves as in mapWithLeafAccumulation, through the memoized
+    SyscallGraph.getLeavesFromStartNode: the libc internals shared by many imported
+    functions are only walked by the first query reaching them
+    """
+    syscallNums = list(range(syscallIndex.MAX_SYSCALL_NUMBER))
+    syscalls = set()
+    for function in functions:
+        syscalls.update(glibcGraph.getLeavesFromStartNode(function, syscallNums, list()))
+    return syscalls
+
+def timeMapping(mapFunc, libraryImports, exeImports):
+    startTime = time.time()
+    libSyscalls = mapFunc(libraryImports)
+    exeSyscalls = mapFunc(exeImports)
+    return time.time() - startTime, (libSyscalls, exeSyscalls)
+
+if __name__ == '__main__':
+    """
+    Compare the previous per-function leaf accumulation of extractElfFunctions.py with
+    folding the imported functions into a system call bitmask, on a folder whose files
+    only depend on libc
+    """
+    usage = "Usage: %prog -i <Folder containing ELF files> -g <Path to glibc CFG file> -s <optional: libc summary store> -d <optional: debug>"
+
+    parser = optparse.OptionParser(usage=usage, version="1")
+
+    parser.add_option("-i", "--inputfolder", dest="inputfolder", default=None, nargs=1,
+                      help="Path to folder containing EXEs and LIBs")
+
+    parser.add_option("-g", "--glibccfgpath", dest="glibccfgpath", default=None, nargs=1,
+                      help="Path to textual glibc CFG file")
+
+    parser.add_option("-s", "--libcsummary", dest="libcsummary", default=None, nargs=1,
+                      help="Libc summary store (built by buildLibcSummary.py), also timed if given")
+
+    parser.add_option("-d", "--debug", dest="debug", action="store_true", default=False,
+                      help="Debug enabled/disabled")
+
+    (options, args) = parser.parse_args()
+    if ( not options.inputfolder or not options.glibccfgpath ):
+        parser.error("Options -i and -g should be provided.")
+    rootLogger = setLogPath("benchmarksyscallmapping.log")
+
+    libraryImports = set()
+    exeImports = set()
+    for fileName in sorted(os.listdir(options.inputfolder)):
+        filePath = options.inputfolder + "/" + fileName
+        if ( not os.path.isfile(filePath) ):
+            continue
+        functionList = elfSymbols.extractImportedFunctionsFromLibc(filePath, rootLogger)
+        if ( not functionList ):
+            continue
+        if ( fileName.startswith("lib") ):
+            libraryImports.update(functionList)
+        else:
+            exeImports.update(functionList)
+    rootLogger.info("Imported libc functions: libraries: %d executables: %d", len(libraryImports), len(exeImports))
+
+    startTime = time.time()
+    legacyGraph = graph.Graph(rootLogger)
+    legacyGraph.createGraphFromInput(options.glibccfgpath, ":")
+    legacyLoadTime = time.time() - startTime
+    legacyTime, legacyResults = timeMapping(lambda functions: mapWithLeafAccumulation(legacyGraph, functions), libraryImports, exeImports)
+    rootLogger.info("leaf accumulation: load: %.3fs mapping: %.3fs", legacyLoadTime, legacyTime)
+
+    startTime = time.time()
+    glibcGraph = compiledGraph.loadGraph(options.glibccfgpath, ":", rootLogger)
+    graphLoadTime = time.time() - startTime
+    memoTime, memoResults = timeMapping(lambda functions: mapWithLeafMemo(glibcGraph, functions), libraryImports, exeImports)
+    rootLogger.info("memoized leaves: load: %.3fs mapping: %.3fs speedup: %.1fx matches: %s", graphLoadTime, memoTime, legacyTime / max(memoTime, 1e-9), memoResults == legacyResults)
+
+    mappings = list()
+    startTime = time.time()
+    glibcIndex = glibcGraph.getSyscallIndex()
+    mappings.append(("syscall index", glibcIndex, graphLoadTime + time.time() - startTime))
+    if ( options.libcsummary ):
+        startTime = time.time()
+        glibcSummary = libcSummary.LibcSummaryStore(options.libcsummary, rootLogger).load(options.glibccfgpath, ":")
+        if ( glibcSummary ):
+            mappings.append(("libc summary", glibcSummary, time.time() - startTime))
+
+    for mappingName, index, loadTime in mappings:
+        mappingTime, results = timeMapping(lambda functions: syscallIndex.maskToSet(syscallIndex.foldSyscallMask(index, functions) & syscallIndex.SYSCALL_FILTER_MASK), libraryImports, exeImports)
+        speedup = legacyTime / mappingTime if mappingTime > 0 else float("inf")
+        rootLogger.info("%s: load: %.3fs mapping: %.3fs speedup: %.1fx (%.1fx including load) matches: %s", mappingName, loadTime, mappingTime, speedup, (legacyLoadTime + legacyTime) / max(loadTime + mappingTime, 1e-9), results == legacyResults)
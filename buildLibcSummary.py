@@ -0,0 +1,58 @@
+import os, sys
+import logging
+import optparse
+import time
+
+import libcSummary
+
+def setLogPath(logPath):
+    """
+    Set the property of the logger: path, config, and format
+    :param logPath:
+    :return:
+    """
+    if os.path.exists(logPath):
+        os.remove(logPath)
+
+    rootLogger = logging.getLogger("coverage")
+    if options.debug:
+        logging.basicConfig(filename=logPath, level=logging.DEBUG)
+        rootLogger.setLevel(logging.DEBUG)
+    else:
+        logging.basicConfig(filename=logPath, level=logging.INFO)
+        rootLogger.setLevel(logging.INFO)
+
+    consoleHandler = logging.StreamHandler()
+    rootLogger.addHandler(consoleHandler)
+    return rootLogger
+
+if __name__ == '__main__':
+    """
+    Build the libc summary (libc function -> reachable system calls) of a glibc or musl
+    callgraph, the store can then be passed to the --libcsummary option of the analyses
+    """
+    usage = "Usage: %prog -i <libc callgraph file> -s <separator> -o <summary store folder>"
+
+    parser = optparse.OptionParser(usage=usage, version="1")
+
+    parser.add_option("-i", "--input", dest="input", default=None, nargs=1,
+                      help="Textual or compiled libc callgraph (e.g. glibc.all.callgraph, musllibc.callgraph)")
+
+    parser.add_option("-s", "--separator", dest="separator", default=":", nargs=1,
+                      help="Callgraph separator, : for glibc and -> for musl")
+
+    parser.add_option("-o", "--output", dest="output", default=None, nargs=1,
+                      help="Summary store folder, shared by the summaries of all libc callgraphs")
+
+    parser.add_option("-d", "--debug", dest="debug", action="store_true", default=False,
+                      help="Debug enabled/disabled")
+
+    (options, args) = parser.parse_args()
+    if ( not options.input or not options.output ):
+        parser.error("Options -i and -o should be provided.")
+    rootLogger = setLogPath("buildlibcsummary.log")
+
+    startTime = time.time()
+    summaryStore = libcSummary.LibcSummaryStore(options.output, rootLogger)
+    summary = summaryStore.build(options.input, options.separator)
+    rootLogger.info("Summarized %s in %.2fs: %d functions reach at least one system call", options.input, time.time() - startTime, len(summary.functionMasks))
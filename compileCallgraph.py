@@ -0,0 +1,81 @@
+import os, sys
+import logging
+import optparse
+import time
+
+import compiledGraph
+
+def setLogPath(logPath):
+    """
+    Set the property of the logger: path, config, and format
+    :param logPath:
+    :return:
+    """
+    if os.path.exists(logPath):
+        os.remove(logPath)
+
+    rootLogger = logging.getLogger("coverage")
+    if options.debug:
+        logging.basicConfig(filename=logPath, level=logging.DEBUG)
+        rootLogger.setLevel(logging.DEBUG)
+    else:
+        logging.basicConfig(filename=logPath, level=logging.INFO)
+        rootLogger.setLevel(logging.INFO)
+
+    consoleHandler = logging.StreamHandler()
+    rootLogger.addHandler(consoleHandler)
+    return rootLogger
+
+def getOutputPath(inputPath, outputFolder):
+    outputName = os.path.basename(inputPath)
+    if ( outputName.endswith(".callgraph.out") ):
+        outputName = outputName[:-len(".callgraph.out")]
+    outputName += ".csr"
+    if ( outputFolder ):
+        return os.path.join(outputFolder, outputName)
+    return os.path.join(os.path.dirname(inputPath), outputName)
+
+if __name__ == '__main__':
+    """
+    Convert textual callgraphs (.callgraph.out) to the memory mappable compiled format,
+    the compiled file can be passed wherever a callgraph path is expected
+    """
+    usage = "Usage: %prog -i <callgraph file or folder of .callgraph.out files> -s <separator> -o <optional: output file or folder>"
+
+    parser = optparse.OptionParser(usage=usage, version="1")
+
+    parser.add_option("-i", "--input", dest="input", default=None, nargs=1,
+                      help="Callgraph file, or folder whose .callgraph.out files should all be converted")
+
+    parser.add_option("-o", "--output", dest="output", default=None, nargs=1,
+                      help="Output file (or folder if the input is a folder), next to the input by default")
+
+    parser.add_option("-s", "--separator", dest="separator", default="->", nargs=1,
+                      help="Callgraph separator, : for glibc and -> for musl and other libraries")
+
+    parser.add_option("-d", "--debug", dest="debug", action="store_true", default=False,
+                      help="Debug enabled/disabled")
+
+    (options, args) = parser.parse_args()
+    if ( not options.input ):
+        parser.error("Option -i should be provided.")
+    rootLogger = setLogPath("compilecallgraph.log")
+
+    conversions = list()
+    if ( os.path.isdir(options.input) ):
+        if ( options.output ):
+            os.makedirs(options.output, exist_ok=True)
+        for fileName in sorted(os.listdir(options.input)):
+            if ( fileName.endswith(".callgraph.out") ):
+                inputPath = os.path.join(options.input, fileName)
+                conversions.append((inputPath, getOutputPath(inputPath, options.output)))
+    else:
+        outputPath = options.output if options.output else getOutputPath(options.input, None)
+        conversions.append((options.input, outputPath))
+
+    for inputPath, outputPath in conversions:
+        startTime = time.time()
+        if ( compiledGraph.compileCallgraph(inputPath, outputPath, options.separator, rootLogger) == -1 ):
+            rootLogger.error("Failed to convert: %s", inputPath)
+            continue
+        rootLogger.info("Converted %s to %s in %.2fs (%d -> %d bytes)", inputPath, outputPath, time.time() - startTime, os.path.getsize(inputPath), os.path.getsize(outputPath))
@@ -0,0 +1,365 @@
+import os
+import sys
+import mmap
+import array
+import struct
+import tempfile
+from collections.abc import Mapping
+
+import reachability
+import syscallGraph
+import syscallIndex
+
+MAGIC = b"CSRG"
+FORMAT_VERSION = 1
+# magic, version, nodeCount, edgeCount, maskBytes (per node), stringTableSize
+HEADER = struct.Struct("<4sIIIII")
+
+class CompiledGraphError(Exception):
+    pass
+
+def getCanonicalName(node):
+    """
+    Name of a (normalized) node in the string table, every spelling of a system
+    call leaf is stored as syscall(N)
+    """
+    if ( isinstance(node, int) ):
+        return "syscall(" + str(node) + ")"
+    return node
+
+def isCompiledGraph(filePath):
+    if ( not os.path.isfile(filePath) ):
+        return False
+    with open(filePath, 'rb') as inputFile:
+        return inputFile.read(len(MAGIC)) == MAGIC
+
+def toLittleEndianBytes(values, typeCode):
+    valueArray = array.array(typeCode, values)
+    if ( sys.byteorder != "little" ):
+        valueArray.byteswap()
+    return valueArray.tobytes()
+
+def compileGraph(graphObj, outputPath, logger):
+    """
+    Write a SyscallGraph in the compiled format:
+      header
+      nameOffsets     uint32[nodeCount + 1]  into the string table, nodes sorted by name
+      syscallNumbers  int32[nodeCount]       -1 for nodes which aren't system calls
+      edgeOffsets     uint32[nodeCount + 1]  CSR successors
+      edgeTargets     uint32[edgeCount]
+      reverseOffsets  uint32[nodeCount + 1]  CSR predecessors
+      reverseTargets  uint32[edgeCount]
+      masks           maskBytes[nodeCount]   reachable system calls of every node (little endian bitmask)
+      stringTable     utf-8 node names
+    """
+    adjGraph = reachability.getAdjacency(graphObj)
+    nodes = sorted(graphObj.getAllNodes(), key=lambda node: getCanonicalName(node).encode("utf-8", "surrogateescape"))
+    nodeIds = dict()
+    for nodeId, node in enumerate(nodes):
+        nodeIds[node] = nodeId
+
+    nameOffsets = [0]
+    stringTable = bytearray()
+    syscallNumbers = list()
+    maxSyscallNum = 0
+    for node in nodes:
+        stringTable += getCanonicalName(node).encode("utf-8", "surrogateescape")
+        nameOffsets.append(len(stringTable))
+        syscallNum = reachability.getSyscallNumber(node)
+        syscallNumbers.append(-1 if syscallNum is None else syscallNum)
+        if ( syscallNum is not None and syscallNum > maxSyscallNum ):
+            maxSyscallNum = syscallNum
+
+    edgeOffsets = [0]
+    edgeTargets = list()
+    predecessors = [list() for node in nodes]
+    for nodeId, node in enumerate(nodes):
+        for successor in adjGraph.get(node, ()):
+            successorId = nodeIds[successor]
+            edgeTargets.append(successorId)
+            predecessors[successorId].append(nodeId)
+        edgeOffsets.append(len(edgeTargets))
+    reverseOffsets = [0]
+    reverseTargets = list()
+    for nodePredecessors in predecessors:
+        reverseTargets.extend(nodePredecessors)
+        reverseOffsets.append(len(reverseTargets))
+
+    maskBytes = (maxSyscallNum // 64 + 1) * 8
+    index = graphObj.getSyscallIndex() if hasattr(graphObj, "getSyscallIndex") else syscallIndex.SyscallIndex(graphObj, logger)
+    masks = bytearray()
+    for node in nodes:
+        masks += index.getSyscallMask(node).to_bytes(maskBytes, "little")
+
+    outputDir = os.path.dirname(os.path.abspath(outputPath))
+    tmpFd, tmpPath = tempfile.mkstemp(dir=outputDir, prefix=".tmp.", suffix=".csr")
+    try:
+        with os.fdopen(tmpFd, 'wb') as outputFile:
+            outputFile.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(nodes), len(edgeTargets), maskBytes, len(stringTable)))
+            outputFile.write(toLittleEndianBytes(nameOffsets, "I"))
+            outputFile.write(toLittleEndianBytes(syscallNumbers, "i"))
+            outputFile.write(toLittleEndianBytes(edgeOffsets, "I"))
+            outputFile.write(toLittleEndianBytes(edgeTargets, "I"))
+            outputFile.write(toLittleEndianBytes(reverseOffsets, "I"))
+            outputFile.write(toLittleEndianBytes(reverseTargets, "I"))
+            outputFile.write(masks)
+            outputFile.write(stringTable)
+        # mkstemp creates the file readable by the owner only
+        os.chmod(tmpPath, 0o644)
+        os.replace(tmpPath, outputPath)
+    except Exception:
+        if ( os.path.exists(tmpPath) ):
+            os.remove(tmpPath)
+        raise
+    logger.info("Compiled graph with %d nodes and %d edges to: %s", len(nodes), len(edgeTargets), outputPath)
+
+def compileCallgraph(inputPath, outputPath, separator, logger):
+    graphObj = syscallGraph.SyscallGraph(logger)
+    if ( graphObj.createGraphFromInput(inputPath, separator) == -1 ):
+        return -1
+    compileGraph(graphObj, outputPath, logger)
+    return 0
+
+class CompiledAdjacency(Mapping):
+    """
+    Read-only node -> successors (or predecessors) view over the CSR arrays,
+    nodes with no edges are absent like in a dict based adjacency
+    """
+    def __init__(self, compiledGraph, offsets, targets):
+        self.compiledGraph = compiledGraph
+        self.offsets = offsets
+        self.targets = targets
+        self.length = None
+
+    def get(self, node, default=None):
+        nodeId = self.compiledGraph.getNodeId(node)
+        if ( nodeId is None ):
+            return default
+        start = self.offsets[nodeId]
+        end = self.offsets[nodeId + 1]
+        if ( start == end ):
+            return default
+        getNode = self.compiledGraph.getNode
+        return [getNode(targetId) for targetId in self.targets[start:end]]
+
+    def __getitem__(self, node):
+        successors = self.get(node, None)
+        if ( successors is None ):
+            raise KeyError(node)
+        return successors
+
+    def __contains__(self, node):
+        nodeId = self.compiledGraph.getNodeId(node)
+        return nodeId is not None and self.offsets[nodeId] != self.offsets[nodeId + 1]
+
+    def __iter__(self):
+        offsets = self.offsets
+        for nodeId in range(self.compiledGraph.nodeCount):
+            if ( offsets[nodeId] != offsets[nodeId + 1] ):
+                yield self.compiledGraph.getNode(nodeId)
+
+    def __len__(self):
+        if ( self.length is None ):
+            offsets = self.offsets
+            self.length = sum(1 for nodeId in range(self.compiledGraph.nodeCount) if offsets[nodeId] != offsets[nodeId + 1])
+        return self.length
+
+class CompiledSyscallIndex:
+    """
+    SyscallIndex interface over the per-node masks stored in the compiled file
+    """
+    def __init__(self, compiledGraph):
+        self.compiledGraph = compiledGraph
+
+    def getSyscallMask(self, node):
+        nodeId = self.compiledGraph.getNodeId(node)
+        if ( nodeId is None ):
+            return 0
+        return self.compiledGraph.getNodeMask(nodeId)
+
+    def getSyscallMaskFromStartNodes(self, startNodes):
+        syscallMask = 0
+        for startNode in startNodes:
+            syscallMask |= self.getSyscallMask(startNode)
+        return syscallMask
+
+    def getSyscallsFromStartNode(self, startNode):
+        return syscallIndex.maskToSet(self.getSyscallMask(startNode))
+
+    def getSyscallsFromStartNodes(self, startNodes):
+        return syscallIndex.maskToSet(self.getSyscallMaskFromStartNodes(startNodes))
+
+class CompiledGraph(syscallGraph.SyscallGraph):
+    """
+    Read-only callgraph backed by a memory mapped compiled file. Nothing is parsed
+    when it's opened, node names are found by binary search in the sorted string
+    table and the reachable system call index and reverse adjacency are stored in
+    the file, so using it as the base of an OverlayGraph doesn't build any per-node
+    Python objects either. Edges can't be added, use an OverlayGraph on top of it.
+    """
+    def __init__(self, filePath, logger):
+        syscallGraph.SyscallGraph.__init__(self, logger)
+        self.filePath = filePath
+        self.data = None
+        self.views = list()
+        # Only the nodes a query touches are decoded, they are kept so later queries don't repeat the lookup
+        self.nodeIds = dict()
+        self.nodes = dict()
+        self.fileObj = open(filePath, 'rb')
+        try:
+            self.data = mmap.mmap(self.fileObj.fileno(), 0, access=mmap.ACCESS_READ)
+            self.parseHeader()
+        except CompiledGraphError:
+            self.close()
+            raise
+        except (ValueError, struct.error, TypeError) as e:
+            self.close()
+            raise CompiledGraphError("Malformed compiled graph: " + filePath + " (" + str(e) + ")")
+        self.adjGraph = CompiledAdjacency(self, self.edgeOffsets, self.edgeTargets)
+        self.localAdjGraph = self.adjGraph
+        self.syscallIndex = CompiledSyscallIndex(self)
+        self.reverseAdjGraph = CompiledAdjacency(self, self.reverseOffsets, self.reverseTargets)
+
+    def close(self):
+        for view in self.views:
+            view.release()
+        self.views = list()
+        if ( self.data is not None ):
+            self.data.close()
+            self.data = None
+        self.fileObj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def __getstate__(self):
+        # Worker processes reopen the mapping instead of pickling its content
+        return {"filePath": self.filePath, "logger": self.logger}
+
+    def __setstate__(self, state):
+        self.__init__(state["filePath"], state["logger"])
+
+    def getArray(self, offset, count, typeCode):
+        if ( offset + count * 4 > len(self.data) ):
+            raise CompiledGraphError("Truncated compiled graph: " + self.filePath)
+        view = memoryview(self.data)[offset:offset + count * 4]
+        if ( sys.byteorder == "little" ):
+            castView = view.cast(typeCode)
+            view.release()
+            self.views.append(castView)
+            return castView
+        valueArray = array.array(typeCode, view)
+        valueArray.byteswap()
+        return valueArray
+
+    def parseHeader(self):
+        magic, version, nodeCount, edgeCount, maskBytes, stringTableSize = HEADER.unpack_from(self.data, 0)
+        if ( magic != MAGIC ):
+            raise CompiledGraphError("Not a compiled graph: " + self.filePath)
+        if ( version != FORMAT_VERSION ):
+            raise CompiledGraphError("Unsupported compiled graph version: " + str(version) + " in " + self.filePath)
+        self.nodeCount = nodeCount
+        self.edgeCount = edgeCount
+        self.maskBytes = maskBytes
+        offset = HEADER.size
+        self.nameOffsets = self.getArray(offset, nodeCount + 1, "I")
+        offset += (nodeCount + 1) * 4
+        self.syscallNumbers = self.getArray(offset, nodeCount, "i")
+        offset += nodeCount * 4
+        self.edgeOffsets = self.getArray(offset, nodeCount + 1, "I")
+        offset += (nodeCount + 1) * 4
+        self.edgeTargets = self.getArray(offset, edgeCount, "I")
+        offset += edgeCount * 4
+        self.reverseOffsets = self.getArray(offset, nodeCount + 1, "I")
+        offset += (nodeCount + 1) * 4
+        self.reverseTargets = self.getArray(offset, edgeCount, "I")
+        offset += edgeCount * 4
+        self.masksOffset = offset
+        offset += nodeCount * maskBytes
+        self.stringTableOffset = offset
+        if ( offset + stringTableSize != len(self.data) ):
+            raise CompiledGraphError("Truncated compiled graph: " + self.filePath)
+
+    def getNodeName(self, nodeId):
+        start = self.stringTableOffset + self.nameOffsets[nodeId]
+        end = self.stringTableOffset + self.nameOffsets[nodeId + 1]
+        return self.data[start:end].decode("utf-8", "surrogateescape")
+
+    def getNode(self, nodeId):
+        """
+        Node as stored by SyscallGraph: an int for system call leaves, the name otherwise
+        """
+        node = self.nodes.get(nodeId, None)
+        if ( node is None ):
+            syscallNum = self.syscallNumbers[nodeId]
+            node = syscallNum if syscallNum >= 0 else self.getNodeName(nodeId)
+            self.nodes[nodeId] = node
+        return node
+
+    def getNodeId(self, node):
+        if ( node in self.nodeIds ):
+            return self.nodeIds[node]
+        nodeId = self.findNodeId(node)
+        self.nodeIds[node] = nodeId
+        return nodeId
+
+    def findNodeId(self, node):
+        syscallNum = reachability.getSyscallNumber(node)
+        name = getCanonicalName(node if syscallNum is None else syscallNum)
+        key = name.encode("utf-8", "surrogateescape")
+        data = self.data
+        nameOffsets = self.nameOffsets
+        stringTableOffset = self.stringTableOffset
+        low = 0
+        high = self.nodeCount
+        while ( low < high ):
+            middle = (low + high) // 2
+            middleName = data[stringTableOffset + nameOffsets[middle]:stringTableOffset + nameOffsets[middle + 1]]
+            if ( middleName < key ):
+                low = middle + 1
+            elif ( middleName > key ):
+                high = middle
+            else:
+                return middle
+        return None
+
+    def getNodeMask(self, nodeId):
+        start = self.masksOffset + nodeId * self.maskBytes
+        return int.from_bytes(self.data[start:start + self.maskBytes], "little")
+
+    def invalidate(self):
+        # Nothing is derived from the file which could become stale
+        pass
+
+    def addEdge(self, srcNode, dstNode):
+        raise CompiledGraphError("Compiled graphs are read-only, add edges to an overlayGraph.OverlayGraph on top of it")
+
+    def createGraphFromInput(self, inputFilePath, separator="->"):
+        raise CompiledGraphError("Compiled graphs are read-only, add edges to an overlayGraph.OverlayGraph on top of it")
+
+    def getAllNodes(self):
+        return set(self.getNode(nodeId) for nodeId in range(self.nodeCount))
+
+    def getNodeCount(self):
+        return self.nodeCount
+
+    def getSyscallsFromStartNodes(self, startNodes):
+        return self.syscallIndex.getSyscallsFromStartNodes(startNodes)
+
+def loadGraph(cfgPath, separator, logger):
+    """
+    Open a compiled callgraph, or parse a textual one into a SyscallGraph
+    :param cfgPath: compiled graph or .callgraph.out file
+    :param separator: separator of the textual format
+    :param logger:
+    :return:
+    """
+    if ( isCompiledGraph(cfgPath) ):
+        logger.debug("Opening compiled callgraph: %s", cfgPath)
+        return CompiledGraph(cfgPath, logger)
+    graphObj = syscallGraph.SyscallGraph(logger)
+    graphObj.createGraphFromInput(cfgPath, separator)
+    return graphObj
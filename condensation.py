@@ -0,0 +1,80 @@
+def condenseGraph(adjGraph, rootNodes):
+    """
+    Iterative Tarjan strongly connected components over the part of the graph
+    reachable from rootNodes (recursion would overflow on libc sized graphs)
+    Components are numbered in reverse topological order: a component only has
+    edges to components with a smaller index, so iterating the list in order is
+    a bottom-up walk of the condensed DAG
+    :param adjGraph: node -> successors mapping
+    :param rootNodes: iterable of nodes to start from
+    :return: componentOf (node -> component index), components (list of member lists)
+    """
+    nodeIndex = dict()
+    lowLink = dict()
+    onStack = set()
+    sccStack = list()
+    componentOf = dict()
+    components = list()
+    counter = 0
+    for rootNode in rootNodes:
+        if ( rootNode in nodeIndex ):
+            continue
+        nodeIndex[rootNode] = counter
+        lowLink[rootNode] = counter
+        counter += 1
+        sccStack.append(rootNode)
+        onStack.add(rootNode)
+        workStack = [(rootNode, iter(adjGraph.get(rootNode, ())))]
+        while ( workStack ):
+            currentNode, successors = workStack[-1]
+            descended = False
+            for successor in successors:
+                if ( successor not in nodeIndex ):
+                    nodeIndex[successor] = counter
+                    lowLink[successor] = counter
+                    counter += 1
+                    sccStack.append(successor)
+                    onStack.add(successor)
+                    workStack.append((successor, iter(adjGraph.get(successor, ()))))
+                    descended = True
+                    break
+                elif ( successor in onStack and nodeIndex[successor] < lowLink[currentNode] ):
+                    lowLink[currentNode] = nodeIndex[successor]
+            if ( descended ):
+                continue
+            workStack.pop()
+            if ( workStack ):
+                parentNode = workStack[-1][0]
+                if ( lowLink[currentNode] < lowLink[parentNode] ):
+                    lowLink[parentNode] = lowLink[currentNode]
+            if ( lowLink[currentNode] == nodeIndex[currentNode] ):
+                componentId = len(components)
+                members = list()
+                while ( True ):
+                    member = sccStack.pop()
+                    onStack.discard(member)
+                    componentOf[member] = componentId
+                    members.append(member)
+                    if ( member == currentNode ):
+                        break
+                components.append(members)
+    return componentOf, components
+
+def getComponentSuccessors(adjGraph, componentOf, components):
+    """
+    Edges of the condensed DAG, without self edges
+    :param adjGraph:
+    :param componentOf:
+    :param components:
+    :return: list of successor component index sets, one per component
+    """
+    componentSuccessors = list()
+    for componentId, members in enumerate(components):
+        successorSet = set()
+        for member in members:
+            for successor in adjGraph.get(member, ()):
+                successorId = componentOf[successor]
+                if ( successorId != componentId ):
+                    successorSet.add(successorId)
+        componentSuccessors.append(successorSet)
+    return componentSuccessors
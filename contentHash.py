@@ -0,0 +1,59 @@
+import os
+import hashlib
+
+# (path, size, mtime) -> digest, so a file is only read once per process
+fileDigestCache = dict()
+
+def hashFile(filePath):
+    """
+    Return the sha256 digest of the file content
+    Missing files hash to a marker so that a file appearing later changes the digest
+    :param filePath:
+    :return:
+    """
+    if ( not filePath or not os.path.isfile(filePath) ):
+        return "missing:" + str(filePath)
+    fileStat = os.stat(filePath)
+    cacheKey = (os.path.abspath(filePath), fileStat.st_size, fileStat.st_mtime_ns)
+    digest = fileDigestCache.get(cacheKey, None)
+    if ( digest ):
+        return digest
+    hasher = hashlib.sha256()
+    with open(filePath, 'rb') as inputFile:
+        chunk = inputFile.read(1 << 20)
+        while ( chunk ):
+            hasher.update(chunk)
+            chunk = inputFile.read(1 << 20)
+    digest = hasher.hexdigest()
+    fileDigestCache[cacheKey] = digest
+    return digest
+
+def hashFolder(folderPath):
+    """
+    Return the sha256 digest of the relative paths and contents of all files below
+    the folder, e.g. a folder of library CFGs
+    :param folderPath:
+    :return:
+    """
+    if ( not folderPath or not os.path.isdir(folderPath) ):
+        return "missing:" + str(folderPath)
+    items = list()
+    for dirPath, dirNames, fileNames in os.walk(folderPath):
+        dirNames.sort()
+        for fileName in sorted(fileNames):
+            filePath = os.path.join(dirPath, fileName)
+            items.append(os.path.relpath(filePath, folderPath))
+            items.append(hashFile(filePath))
+    return hashStrings(items)
+
+def hashStrings(strList):
+    """
+    Return the sha256 digest of an ordered list of strings
+    :param strList:
+    :return:
+    """
+    hasher = hashlib.sha256()
+    for item in strList:
+        hasher.update(str(item).encode("utf-8", "surrogateescape"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()
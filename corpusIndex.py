@@ -0,0 +1,153 @@
+import os
+import json
+
+import contentHash
+
+ELF_MAGIC = b"\x7fELF"
+
+def isElfFile(filePath):
+    if ( not os.path.isfile(filePath) ):
+        return False
+    try:
+        with open(filePath, 'rb') as inputFile:
+            return inputFile.read(4) == ELF_MAGIC
+    except OSError:
+        return False
+
+class CorpusIndex:
+    """
+    Index of the ELF files in a corpus of container folders (corpusPath/<folder>/<file>).
+    Every ELF file is content-hashed once, identical files in different folders map to
+    the same artifact so analyses can run once per unique artifact and have their
+    results fanned back out to every folder referencing it.
+    """
+    def __init__(self, corpusPath, logger):
+        self.corpusPath = corpusPath
+        self.logger = logger
+        self.artifactPaths = dict()     #hash -> path of the first file seen with this content
+        self.references = dict()        #hash -> list of (folderName, fileName)
+        self.fileToHash = dict()        #(folderName, fileName) -> hash
+        self.folderFiles = dict()       #folderName -> fileName -> hash
+        self.fileStats = dict()         #(folderName, fileName) -> (size, mtime in ns)
+
+    def build(self, folderNames=None, knownFiles=dict()):
+        """
+        Hash every ELF file in the given container folders (all folders by default).
+        Files whose size and modification time match their entry in knownFiles (read
+        from an earlier manifest) keep the hash of the entry instead of being hashed again.
+        :param folderNames:
+        :param knownFiles: dict (folderName, fileName) -> (size, mtime in ns, hash)
+        :return: number of files which had to be hashed
+        """
+        if ( folderNames is None ):
+            folderNames = sorted(os.listdir(self.corpusPath))
+        hashedCount = 0
+        for folderName in folderNames:
+            folderPath = os.path.join(self.corpusPath, folderName)
+            if ( not os.path.isdir(folderPath) ):
+                continue
+            for fileName in sorted(os.listdir(folderPath)):
+                filePath = os.path.join(folderPath, fileName)
+                try:
+                    fileStat = os.stat(filePath)
+                except OSError:
+                    continue
+                fileStats = (fileStat.st_size, fileStat.st_mtime_ns)
+                knownFile = knownFiles.get((folderName, fileName), None)
+                if ( knownFile and tuple(knownFile[:2]) == fileStats ):
+                    fileHash = knownFile[2]
+                elif ( isElfFile(filePath) ):
+                    fileHash = contentHash.hashFile(filePath)
+                    hashedCount += 1
+                else:
+                    self.logger.debug("CorpusIndex skipping non-ELF file: %s", filePath)
+                    continue
+                self.addFile(folderName, fileName, fileHash, fileStats)
+        self.logger.info("CorpusIndex: %d ELF files (%d hashed), %d unique artifacts", len(self.fileToHash), hashedCount, len(self.artifactPaths))
+        return hashedCount
+
+    def addFile(self, folderName, fileName, fileHash, fileStats=None):
+        if ( fileHash not in self.artifactPaths ):
+            self.artifactPaths[fileHash] = os.path.join(self.corpusPath, folderName, fileName)
+            self.references[fileHash] = list()
+        self.references[fileHash].append((folderName, fileName))
+        self.fileToHash[(folderName, fileName)] = fileHash
+        self.folderFiles.setdefault(folderName, dict())[fileName] = fileHash
+        self.fileStats[(folderName, fileName)] = fileStats
+
+    def getHash(self, folderName, fileName):
+        return self.fileToHash.get((folderName, fileName), None)
+
+    def getArtifactPath(self, fileHash):
+        return self.artifactPaths[fileHash]
+
+    def getReferences(self, fileHash):
+        return self.references.get(fileHash, list())
+
+    def getUniqueArtifacts(self):
+        """
+        :return: list of (hash, path) sorted by path
+        """
+        return sorted(self.artifactPaths.items(), key=lambda item: item[1])
+
+    def getFolderFiles(self, folderName):
+        return self.folderFiles.get(folderName, dict())
+
+    def fanOut(self, artifactResults):
+        """
+        Map per-artifact results back to every file referencing the artifact
+        :param artifactResults: dict hash -> result
+        :return: dict (folderName, fileName) -> result
+        """
+        fileResults = dict()
+        for fileHash, result in artifactResults.items():
+            for reference in self.getReferences(fileHash):
+                fileResults[reference] = result
+        return fileResults
+
+    def save(self, manifestPath):
+        manifest = dict()
+        manifest["corpusPath"] = self.corpusPath
+        manifest["artifacts"] = dict()
+        for fileHash, artifactPath in self.artifactPaths.items():
+            manifest["artifacts"][fileHash] = {"path": artifactPath, "references": self.references[fileHash]}
+        manifest["files"] = list()
+        for (folderName, fileName), fileHash in sorted(self.fileToHash.items()):
+            fileStats = self.fileStats[(folderName, fileName)]
+            if ( fileStats ):
+                manifest["files"].append([folderName, fileName, fileStats[0], fileStats[1], fileHash])
+        tmpPath = manifestPath + ".tmp"
+        with open(tmpPath, 'w') as manifestFile:
+            json.dump(manifest, manifestFile, indent=1, sort_keys=True)
+        os.replace(tmpPath, manifestPath)
+
+def loadKnownFiles(manifestPath, corpusPath, logger):
+    """
+    :return: dict (folderName, fileName) -> (size, mtime in ns, hash) of the files
+             indexed by the manifest, empty if it was created for another corpus
+    """
+    with open(manifestPath, 'r') as manifestFile:
+        manifest = json.load(manifestFile)
+    knownFiles = dict()
+    if ( manifest.get("corpusPath", None) != corpusPath ):
+        logger.warning("Corpus manifest: %s was created for: %s, indexing: %s again", manifestPath, manifest.get("corpusPath", None), corpusPath)
+        return knownFiles
+    for folderName, fileName, fileSize, fileMtime, fileHash in manifest.get("files", list()):
+        knownFiles[(folderName, fileName)] = (fileSize, fileMtime, fileHash)
+    return knownFiles
+
+def loadOrBuildIndex(corpusPath, logger, manifestPath=None, folderNames=None):
+    """
+    Index the requested folders of the corpus. Files listed in an existing manifest
+    with unchanged size and modification time reuse their hash, new and changed files
+    are hashed, and files which disappeared are dropped. The manifest is then updated.
+    """
+    myCorpusIndex = CorpusIndex(corpusPath, logger)
+    knownFiles = dict()
+    if ( manifestPath and os.path.isfile(manifestPath) ):
+        logger.info("Loading corpus manifest: %s", manifestPath)
+        knownFiles = loadKnownFiles(manifestPath, corpusPath, logger)
+    myCorpusIndex.build(folderNames, knownFiles)
+    if ( manifestPath ):
+        myCorpusIndex.save(manifestPath)
+    return myCorpusIndex
@@ -0,0 +1,338 @@
+import mmap
+import struct
+
+ELF_MAGIC = b"\x7fELF"
+ELFCLASS64 = 2
+ELFDATA2MSB = 2
+
+SHT_SYMTAB = 2
+SHT_STRTAB = 3
+SHT_DYNAMIC = 6
+SHT_NOBITS = 8
+SHT_DYNSYM = 11
+SHT_GNU_VERDEF = 0x6ffffffd
+SHT_GNU_VERNEED = 0x6ffffffe
+SHT_GNU_VERSYM = 0x6fffffff
+
+DT_NULL = 0
+DT_NEEDED = 1
+DT_RPATH = 15
+DT_RUNPATH = 29
+
+SHN_UNDEF = 0
+SHN_XINDEX = 0xffff
+
+STT_FUNC = 2
+STT_GNU_IFUNC = 10
+STB_GLOBAL = 1
+STB_WEAK = 2
+
+VERSYM_HIDDEN = 0x8000
+VER_NDX_LOCAL = 0
+VER_NDX_GLOBAL = 1
+VER_FLG_BASE = 0x1
+
+class ElfFormatError(Exception):
+    pass
+
+class ElfSection:
+    def __init__(self, name, sectionType, flags, addr, offset, size, link, info, entsize):
+        self.name = name
+        self.sectionType = sectionType
+        self.flags = flags
+        self.addr = addr
+        self.offset = offset
+        self.size = size
+        self.link = link
+        self.info = info
+        self.entsize = entsize
+
+class ElfSymbol:
+    def __init__(self, index, name, value, size, symbolType, binding, shndx, version):
+        self.index = index
+        self.name = name
+        self.value = value
+        self.size = size
+        self.symbolType = symbolType
+        self.binding = binding
+        self.shndx = shndx
+        self.version = version
+
+    def isDefined(self):
+        return self.shndx != SHN_UNDEF
+
+    def isFunction(self):
+        return self.symbolType == STT_FUNC or self.symbolType == STT_GNU_IFUNC
+
+class ElfFile:
+    """
+    Minimal read-only ELF parser working on a memory mapped file: section headers,
+    .dynsym/.symtab symbols and GNU symbol versioning. Nothing is copied out of the
+    mapping except the fields which are actually requested.
+    """
+    def __init__(self, filePath):
+        self.filePath = filePath
+        self.fileObj = open(filePath, 'rb')
+        try:
+            self.data = mmap.mmap(self.fileObj.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            #Empty file
+            self.fileObj.close()
+            raise ElfFormatError("Empty file: " + filePath)
+        try:
+            self.parseHeader()
+            self.parseSections()
+        except (struct.error, IndexError) as e:
+            self.close()
+            raise ElfFormatError("Malformed ELF file: " + filePath + " (" + str(e) + ")")
+
+    def close(self):
+        if ( self.data is not None ):
+            self.data.close()
+            self.data = None
+        self.fileObj.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def parseHeader(self):
+        data = self.data
+        if ( len(data) < 52 or data[:4] != ELF_MAGIC ):
+            self.close()
+            raise ElfFormatError("Not an ELF file: " + self.filePath)
+        self.is64 = (data[4] == ELFCLASS64)
+        self.endian = ">" if data[5] == ELFDATA2MSB else "<"
+        if ( self.is64 ):
+            (self.elfType, self.machine, version, self.entry, self.phoff, self.shoff, flags, ehsize,
+             self.phentsize, self.phnum, self.shentsize, self.shnum, self.shstrndx) = struct.unpack_from(self.endian + "HHIQQQIHHHHHH", data, 16)
+            self.sectionStruct = struct.Struct(self.endian + "IIQQQQIIQQ")
+            self.symbolStruct = struct.Struct(self.endian + "IBBHQQ")
+            self.dynamicStruct = struct.Struct(self.endian + "qQ")
+        else:
+            (self.elfType, self.machine, version, self.entry, self.phoff, self.shoff, flags, ehsize,
+             self.phentsize, self.phnum, self.shentsize, self.shnum, self.shstrndx) = struct.unpack_from(self.endian + "HHIIIIIHHHHHH", data, 16)
+            self.sectionStruct = struct.Struct(self.endian + "IIIIIIIIII")
+            self.symbolStruct = struct.Struct(self.endian + "IIIBBH")
+            self.dynamicStruct = struct.Struct(self.endian + "iI")
+
+    def readSectionHeader(self, index):
+        fields = self.sectionStruct.unpack_from(self.data, self.shoff + index * self.shentsize)
+        #name, type, flags, addr, offset, size, link, info, addralign, entsize
+        return fields
+
+    def parseSections(self):
+        self.sections = list()
+        self.sectionsByName = dict()
+        if ( self.shoff == 0 ):
+            return
+        sectionCount = self.shnum
+        shstrndx = self.shstrndx
+        if ( sectionCount == 0 or shstrndx == SHN_XINDEX ):
+            firstSection = self.readSectionHeader(0)
+            if ( sectionCount == 0 ):
+                sectionCount = firstSection[5]
+            if ( shstrndx == SHN_XINDEX ):
+                shstrndx = firstSection[6]
+        headers = list()
+        for index in range(sectionCount):
+            headers.append(self.readSectionHeader(index))
+        nameTableOffset = headers[shstrndx][4] if shstrndx < len(headers) else 0
+        for fields in headers:
+            nameOffset, sectionType, flags, addr, offset, size, link, info, addralign, entsize = fields
+            name = self.readString(nameTableOffset + nameOffset) if nameTableOffset else ""
+            section = ElfSection(name, sectionType, flags, addr, offset, size, link, info, entsize)
+            self.sections.append(section)
+            if ( name not in self.sectionsByName ):
+                self.sectionsByName[name] = section
+
+    def getSection(self, name):
+        return self.sectionsByName.get(name, None)
+
+    def getSectionsByType(self, sectionType):
+        return [section for section in self.sections if section.sectionType == sectionType]
+
+    def getSectionData(self, section):
+        """
+        Zero-copy view of the section content
+        """
+        if ( section.sectionType == SHT_NOBITS ):
+            return memoryview(b"")
+        return memoryview(self.data)[section.offset:section.offset + section.size]
+
+    def readString(self, offset):
+        endOffset = self.data.find(b"\0", offset)
+        if ( endOffset == -1 ):
+            endOffset = len(self.data)
+        return self.data[offset:endOffset].decode("utf-8", "replace")
+
+    def getVersionNames(self):
+        """
+        Map of version index -> version name, from .gnu.version_r (imports) and .gnu.version_d (definitions).
+        The base definition (the soname of the file) isn't a version, unversioned symbols use its index.
+        """
+        versionNames = dict()
+        for section in self.getSectionsByType(SHT_GNU_VERNEED):
+            stringTableOffset = self.sections[section.link].offset
+            entryOffset = section.offset
+            for entryNum in range(section.info):
+                vnVersion, vnCnt, vnFile, vnAux, vnNext = struct.unpack_from(self.endian + "HHIII", self.data, entryOffset)
+                auxOffset = entryOffset + vnAux
+                for auxNum in range(vnCnt):
+                    vnaHash, vnaFlags, vnaOther, vnaName, vnaNext = struct.unpack_from(self.endian + "IHHII", self.data, auxOffset)
+                    versionNames[vnaOther & 0x7fff] = self.readString(stringTableOffset + vnaName)
+                    if ( vnaNext == 0 ):
+                        break
+                    auxOffset += vnaNext
+                if ( vnNext == 0 ):
+                    break
+                entryOffset += vnNext
+        for section in self.getSectionsByType(SHT_GNU_VERDEF):
+            stringTableOffset = self.sections[section.link].offset
+            entryOffset = section.offset
+            for entryNum in range(section.info):
+                vdVersion, vdFlags, vdNdx, vdCnt, vdHash, vdAux, vdNext = struct.unpack_from(self.endian + "HHHHIII", self.data, entryOffset)
+                if ( vdCnt > 0 and not vdFlags & VER_FLG_BASE ):
+                    vdaName, vdaNext = struct.unpack_from(self.endian + "II", self.data, entryOffset + vdAux)
+                    versionNames[vdNdx & 0x7fff] = self.readString(stringTableOffset + vdaName)
+                if ( vdNext == 0 ):
+                    break
+                entryOffset += vdNext
+        return versionNames
+
+    def iterDynamicEntries(self):
+        """
+        Yield the (tag, value) pairs of the .dynamic section up to DT_NULL
+        """
+        for section in self.getSectionsByType(SHT_DYNAMIC):
+            entrySize = self.dynamicStruct.size
+            entryOffset = section.offset
+            sectionEnd = min(section.offset + section.size, len(self.data))
+            while ( entryOffset + entrySize <= sectionEnd ):
+                tag, value = self.dynamicStruct.unpack_from(self.data, entryOffset)
+                if ( tag == DT_NULL ):
+                    break
+                yield tag, value
+                entryOffset += entrySize
+
+    def getInterpreter(self):
+        """
+        Program interpreter (dynamic loader) requested in .interp, None for static files
+        """
+        section = self.getSection(".interp")
+        if ( section is None or section.sectionType == SHT_NOBITS ):
+            return None
+        return self.readString(section.offset)
+
+    def getDynamicInfo(self):
+        """
+        Libraries and search paths the dynamic loader would use for this file
+        :return: (list of DT_NEEDED names, list of DT_RPATH dirs, list of DT_RUNPATH dirs)
+        """
+        neededLibraries = list()
+        rpath = list()
+        runpath = list()
+        dynamicSections = self.getSectionsByType(SHT_DYNAMIC)
+        if ( not dynamicSections ):
+            return neededLibraries, rpath, runpath
+        stringTableOffset = self.sections[dynamicSections[0].link].offset
+        for tag, value in self.iterDynamicEntries():
+            if ( tag == DT_NEEDED ):
+                neededLibraries.append(self.readString(stringTableOffset + value))
+            elif ( tag == DT_RPATH ):
+                rpath.extend(self.readString(stringTableOffset + value).split(":"))
+            elif ( tag == DT_RUNPATH ):
+                runpath.extend(self.readString(stringTableOffset + value).split(":"))
+        return neededLibraries, rpath, runpath
+
+    def iterSymbols(self, sectionType=SHT_DYNSYM):
+        """
+        Yield the symbols of the .dynsym (default) or .symtab section
+        """
+        for section in self.getSectionsByType(sectionType):
+            if ( section.entsize == 0 ):
+                continue
+            stringTableOffset = self.sections[section.link].offset
+            versions = None
+            versionNames = None
+            if ( sectionType == SHT_DYNSYM ):
+                versymSections = self.getSectionsByType(SHT_GNU_VERSYM)
+                if ( versymSections ):
+                    versions = versymSections[0]
+                    versionNames = self.getVersionNames()
+            symbolCount = section.size // section.entsize
+            for index in range(1, symbolCount):
+                entryOffset = section.offset + index * section.entsize
+                if ( self.is64 ):
+                    nameOffset, info, other, shndx, value, size = self.symbolStruct.unpack_from(self.data, entryOffset)
+                else:
+                    nameOffset, value, size, info, other, shndx = self.symbolStruct.unpack_from(self.data, entryOffset)
+                version = None
+                if ( versions is not None ):
+                    versionIndex = struct.unpack_from(self.endian + "H", self.data, versions.offset + index * 2)[0] & ~VERSYM_HIDDEN
+                    if ( versionIndex not in (VER_NDX_LOCAL, VER_NDX_GLOBAL) ):
+                        version = versionNames.get(versionIndex, None)
+                yield ElfSymbol(index, self.readString(stringTableOffset + nameOffset), value, size, info & 0xf, info >> 4, shndx, version)
+
+def openElf(filePath, logger):
+    try:
+        return ElfFile(filePath)
+    except (OSError, ElfFormatError) as e:
+        logger.debug("elfReader failed to open: %s (%s)", filePath, str(e))
+        return None
+
+def extractExportedFunctions(filePath, logger):
+    """
+    Native equivalent of util.extractExportedFunctionsWithNm: defined global/weak
+    functions of the dynamic symbol table
+    """
+    functionList = list()
+    elfFile = openElf(filePath, logger)
+    if ( elfFile is None ):
+        return functionList
+    with elfFile:
+        for symbol in elfFile.iterSymbols(SHT_DYNSYM):
+            if ( symbol.isDefined() and symbol.isFunction() and symbol.binding in (STB_GLOBAL, STB_WEAK) ):
+                functionList.append(symbol.name)
+    return functionList
+
+def extractImportedFunctions(filePath, logger):
+    """
+    Native equivalent of util.extractImportedFunctions: undefined functions of the
+    dynamic symbol table
+    """
+    functionList = list()
+    elfFile = openElf(filePath, logger)
+    if ( elfFile is None ):
+        return functionList
+    with elfFile:
+        for symbol in elfFile.iterSymbols(SHT_DYNSYM):
+            if ( not symbol.isDefined() and symbol.isFunction() ):
+                functionList.append(symbol.name)
+    return functionList
+
+def extractImportedFunctionsFromLibc(filePath, logger):
+    """
+    Native equivalent of util.extractImportedFunctionsFromLibc: undefined functions
+    bound to a GLIBC_* version. Unversioned imports are kept as well, musl doesn't
+    use symbol versioning.
+    """
+    elfFile = openElf(filePath, logger)
+    if ( elfFile is None ):
+        return list()
+    with elfFile:
+        return getImportedFunctionsFromLibc(elfFile)
+
+def getImportedFunctionsFromLibc(elfFile):
+    """
+    :param elfFile: open ElfFile
+    :return: imported libc functions, see extractImportedFunctionsFromLibc
+    """
+    functionList = list()
+    for symbol in elfFile.iterSymbols(SHT_DYNSYM):
+        if ( not symbol.isDefined() and symbol.isFunction() ):
+            if ( symbol.version is None or symbol.version.startswith("GLIBC_") ):
+                functionList.append(symbol.name)
+    return functionList
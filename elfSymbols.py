@@ -0,0 +1,57 @@
+import sys
+
+sys.path.insert(0, './python-utils/')
+
+import util
+import elfReader
+
+# "nm" shells out to nm/objdump through util, "native" parses the ELF file with elfReader
+BACKEND_NM = "nm"
+BACKEND_NATIVE = "native"
+backends = [BACKEND_NM, BACKEND_NATIVE]
+
+backend = BACKEND_NM
+
+class ExtractionError(Exception):
+    pass
+
+def setBackend(backendName):
+    global backend
+    if ( backendName not in backends ):
+        raise ValueError("Unknown symbol extraction backend: " + str(backendName))
+    backend = backendName
+
+def getBackend():
+    return backend
+
+def extractExportedFunctions(filePath, logger):
+    if ( backend == BACKEND_NATIVE ):
+        return elfReader.extractExportedFunctions(filePath, logger)
+    return util.extractExportedFunctionsWithNm(filePath, logger)
+
+def extractImportedFunctions(filePath, logger):
+    if ( backend == BACKEND_NATIVE ):
+        return elfReader.extractImportedFunctions(filePath, logger)
+    return util.extractImportedFunctions(filePath, logger)
+
+def extractImportedFunctionsFromLibc(filePath, logger):
+    if ( backend == BACKEND_NATIVE ):
+        return elfReader.extractImportedFunctionsFromLibc(filePath, logger)
+    return util.extractImportedFunctionsFromLibc(filePath, logger)
+
+def extractImportedFunctionsFromLibcOrRaise(filePath, logger):
+    """
+    Same as extractImportedFunctionsFromLibc, but a failing nm/objdump or an unreadable
+    ELF file raises instead of returning None or an empty list, for the journaled units
+    which are retried on failure
+    :param filePath:
+    :param logger:
+    :return: list of imported libc functions
+    """
+    if ( backend == BACKEND_NATIVE ):
+        with elfReader.ElfFile(filePath) as elfFile:
+            return elfReader.getImportedFunctionsFromLibc(elfFile)
+    functionList = util.extractImportedFunctionsFromLibc(filePath, logger)
+    if ( functionList is None ):
+        raise ExtractionError("Import extraction failed: " + filePath)
+    return functionList
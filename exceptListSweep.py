@@ -0,0 +1,170 @@
+import array
+
+import internedGraph
+
+# Tag of the edges which are part of every configuration (binary callgraph)
+ALWAYS_TAG = 0
+
+class TaggedGraph:
+    """
+    Complete graph of a binary and all of its libraries, built once with every edge
+    tagged with the libraries it was contributed by. An except list then only
+    deactivates the edges whose libraries are all excluded, instead of rebuilding
+    the complete graph for it.
+    Many except lists are evaluated in one traversal: every node carries a bitmask
+    of the configurations in which it's reachable (bit i for except list i) and an
+    edge propagates the bits of the configurations in which it's active.
+    """
+    def __init__(self, logger):
+        self.logger = logger
+        self.internedGraph = internedGraph.InternedGraph(logger)
+        self.tagIds = {None: ALWAYS_TAG}
+        self.tagNames = [None]
+        self.edgeTags = dict()          #(srcId, dstId) -> bitmask of tag ids
+        self.gatedStartNodes = dict()   #tag id -> node ids reached only if the library isn't excluded
+        self.tagSyscalls = dict()       #tag id -> system calls added only if the library isn't excluded
+        self.offsets = None
+        self.targets = None
+        self.targetTags = None
+
+    def addTag(self, tagName):
+        tagId = self.tagIds.get(tagName, None)
+        if ( tagId is None ):
+            tagId = len(self.tagNames)
+            self.tagIds[tagName] = tagId
+            self.tagNames.append(tagName)
+        return tagId
+
+    def addEdges(self, edges, tagName=None):
+        """
+        :param edges: list of (src, dst)
+        :param tagName: library contributing the edges, None for edges which can't be excluded
+        """
+        tagBit = 1 << self.addTag(tagName)
+        internNode = self.internedGraph.internNode
+        edgeTags = self.edgeTags
+        for srcNode, dstNode in edges:
+            edgeKey = (internNode(srcNode), internNode(dstNode))
+            edgeTags[edgeKey] = edgeTags.get(edgeKey, 0) | tagBit
+        self.offsets = None
+
+    def addLibraryWithoutCfg(self, tagName, directSyscalls, importedFunctions):
+        """
+        Library without callgraph: its direct system calls and the system calls
+        reachable from its imported functions count unless it's excluded
+        """
+        tagId = self.addTag(tagName)
+        self.tagSyscalls.setdefault(tagId, set()).update(directSyscalls)
+        gatedNodes = self.gatedStartNodes.setdefault(tagId, set())
+        for function in importedFunctions:
+            gatedNodes.add(self.internedGraph.internNode(function))
+
+    def getNodeCount(self):
+        return self.internedGraph.getNodeCount()
+
+    def getTagNames(self):
+        return self.tagNames[1:]
+
+    def freeze(self):
+        """
+        CSR arrays of the deduplicated edges, with the tag bitmask of every edge
+        """
+        nodeCount = self.internedGraph.getNodeCount()
+        offsets = array.array('I', bytes(4 * (nodeCount + 1)))
+        for srcId, dstId in self.edgeTags.keys():
+            offsets[srcId + 1] += 1
+        for nodeId in range(nodeCount):
+            offsets[nodeId + 1] += offsets[nodeId]
+        position = array.array('I', offsets[:nodeCount])
+        targets = array.array('I', bytes(4 * len(self.edgeTags)))
+        targetTags = [0] * len(self.edgeTags)
+        for (srcId, dstId), tagMask in self.edgeTags.items():
+            targets[position[srcId]] = dstId
+            targetTags[position[srcId]] = tagMask
+            position[srcId] += 1
+        self.offsets = offsets
+        self.targets = targets
+        self.targetTags = targetTags
+
+    def getIncludedConfigs(self, exceptLists):
+        """
+        :return: list indexed by tag id of the bitmask of configurations which keep the tag
+        """
+        allConfigs = (1 << len(exceptLists)) - 1
+        includedConfigs = [allConfigs] * len(self.tagNames)
+        for configId, exceptList in enumerate(exceptLists):
+            for libraryName in exceptList:
+                tagId = self.tagIds.get(libraryName, None)
+                if ( tagId is not None and tagId != ALWAYS_TAG ):
+                    includedConfigs[tagId] &= ~(1 << configId)
+        return includedConfigs
+
+    def evaluate(self, startNodes, exceptLists):
+        """
+        Accessible system calls for every except list in a single traversal
+        :param startNodes: node names, nodes which aren't part of the graph are ignored
+        :param exceptLists: list of except lists (library names as used by createCompleteGraph)
+        :return: list of sets of system call numbers, one per except list
+        """
+        if ( self.offsets is None ):
+            self.freeze()
+        configCount = len(exceptLists)
+        allConfigs = (1 << configCount) - 1
+        includedConfigs = self.getIncludedConfigs(exceptLists)
+
+        #Configurations in which each distinct tag combination keeps its edge
+        activeConfigsOfTags = dict()
+        activeConfigs = list()
+        for tagMask in self.targetTags:
+            edgeConfigs = activeConfigsOfTags.get(tagMask, None)
+            if ( edgeConfigs is None ):
+                edgeConfigs = 0
+                tagId = 0
+                remainingTags = tagMask
+                while ( remainingTags ):
+                    if ( remainingTags & 1 ):
+                        edgeConfigs |= includedConfigs[tagId]
+                    remainingTags >>= 1
+                    tagId += 1
+                activeConfigsOfTags[tagMask] = edgeConfigs
+            activeConfigs.append(edgeConfigs)
+
+        nodeIds = self.internedGraph.nodeIds
+        reach = [0] * self.internedGraph.getNodeCount()
+        worklist = list()
+        seeds = [(nodeIds.get(node, None), allConfigs) for node in startNodes]
+        for tagId, gatedNodes in self.gatedStartNodes.items():
+            seeds.extend([(nodeId, includedConfigs[tagId]) for nodeId in gatedNodes])
+        for nodeId, seedConfigs in seeds:
+            if ( nodeId is not None and seedConfigs & ~reach[nodeId] ):
+                reach[nodeId] |= seedConfigs
+                worklist.append(nodeId)
+
+        offsets = self.offsets
+        targets = self.targets
+        while ( worklist ):
+            nodeId = worklist.pop()
+            nodeReach = reach[nodeId]
+            for edgeIndex in range(offsets[nodeId], offsets[nodeId + 1]):
+                targetId = targets[edgeIndex]
+                newReach = nodeReach & activeConfigs[edgeIndex] & ~reach[targetId]
+                if ( newReach ):
+                    reach[targetId] |= newReach
+                    worklist.append(targetId)
+
+        configSyscalls = [set() for configId in range(configCount)]
+        for nodeId, syscallNum in enumerate(self.internedGraph.syscallNumbers):
+            if ( syscallNum >= 0 and reach[nodeId] ):
+                addToConfigs(configSyscalls, reach[nodeId], (syscallNum,))
+        for tagId, syscalls in self.tagSyscalls.items():
+            addToConfigs(configSyscalls, includedConfigs[tagId], syscalls)
+        self.logger.debug("Evaluated %d except lists over %d nodes and %d edges", configCount, len(reach), len(targets))
+        return configSyscalls
+
+def addToConfigs(configSyscalls, configMask, syscalls):
+    configId = 0
+    while ( configMask ):
+        if ( configMask & 1 ):
+            configSyscalls[configId].update(syscalls)
+        configMask >>= 1
+        configId += 1
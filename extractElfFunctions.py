@@ -4,8 +4,12 @@ import optparse
 import time
 
 sys.path.insert(0, '../')
-import graph
-import util
+import elfSymbols
+import compiledGraph
+import libcSummary
+import syscallIndex
+import contentHash
+import jobJournal
 
 
 def isValidOpts(opts):
@@ -47,6 +51,13 @@ def setLogPath(logPath):
     return rootLogger
 #    rootLogger.addHandler(ch)
 
+def extractFileImports(filePath):
+    """
+    :param filePath:
+    :return: imported libc functions of the file, raises if the extraction failed
+    """
+    return elfSymbols.extractImportedFunctionsFromLibcOrRaise(filePath, logging.getLogger("coverage"))
+
 if __name__ == '__main__':
     """
     Main function for finding physical memory usage of process
@@ -64,10 +75,26 @@ if __name__ == '__main__':
     parser.add_option("-g", "--glibccfgpath", dest="glibccfgpath", default=None, nargs=1,
                       help="Glibc CFG file path")
 
+    parser.add_option("", "--resume", dest="resume", action="store_true", default=False,
+                      help="Skip the files already completed in the journal (<outputfolder>/journal.jsonl) of a previous, interrupted run")
+
+    parser.add_option("", "--maxattempts", dest="maxattempts", type="int", default=jobJournal.DEFAULT_MAX_ATTEMPTS, nargs=1,
+                      help="Number of times a failing file is processed before it's given up on (counted across --resume runs)")
+
+    parser.add_option("", "--unittimeout", dest="unittimeout", type="int", default=0, nargs=1,
+                      help="Seconds after which the extraction of a single file is failed (e.g. hanging nm or objdump), 0 for no limit")
+
+    parser.add_option("", "--libcsummary", dest="libcsummary", default=None, nargs=1,
+                      help="Libc summary store (built by buildLibcSummary.py), used instead of loading the glibc CFG")
+
+    parser.add_option("", "--symbolbackend", dest="symbolbackend", type="choice", choices=elfSymbols.backends, default=elfSymbols.BACKEND_NM, nargs=1,
+                      help="ELF symbol extraction backend: nm (nm/objdump) or native (built-in ELF reader)")
+
     parser.add_option("-d", "--debug", dest="debug", action="store_true", default=False,
                       help="Debug enabled/disabled")
 
     (options, args) = parser.parse_args()
+    elfSymbols.setBackend(options.symbolbackend)
     if isValidOpts(options):
         rootLogger = setLogPath("extractfunctions.log")
 
@@ -77,10 +104,23 @@ if __name__ == '__main__':
         libFilePath = options.outputfolder + "/" + "libFuncs.out"
         exeFilePath = options.outputfolder + "/" + "exeFuncs.out"
 
+        # Extracted functions are journaled per file, --resume skips the files already done
+        fileNames = os.listdir(options.inputfolder)
+        myJobJournal = jobJournal.JobJournal(options.outputfolder + "/" + "journal.jsonl", jobJournal.getConfigHash(["extractfunctions", options.symbolbackend]), rootLogger, options.maxattempts)
+        myJobJournal.open(options.resume)
+        try:
+            fileJobs = list()
+            for fileName in fileNames:
+                filePath = options.inputfolder + "/" + fileName
+                fileJobs.append(((fileName, contentHash.hashFile(filePath)), filePath))
+            myJobJournal.run(fileJobs, extractFileImports, timeout=options.unittimeout)
+        finally:
+            myJobJournal.close()
+
         libFile = open(libFilePath, 'w')
         exeFile = open(exeFilePath, 'w')
-        for fileName in os.listdir(options.inputfolder):
-            functionList = util.extractImportedFunctionsFromLibc(options.inputfolder + "/" + fileName, rootLogger)
+        for fileName, fileJob in zip(fileNames, fileJobs):
+            functionList = myJobJournal.getResults(fileJob[0])
             if ( not functionList ):
                 rootLogger.warning("Function extraction for file: %s failed!", fileName)
             else:
@@ -89,12 +129,10 @@ if __name__ == '__main__':
                         rootLogger.debug("filename %s is a library", fileName)
                         libraryImports.add(function)
                         libFile.write(function + "\n")
-                        libFile.flush()
                     else:
                         rootLogger.debug("filename %s is an executable", fileName)
                         exeImports.add(function)
                         exeFile.write(function + "\n")
-                        exeFile.flush()
         libFile.close()
         exeFile.close()
 
@@ -102,52 +140,21 @@ if __name__ == '__main__':
         rootLogger.info("(exeImports-libImports): %s", str(exeImports-libraryImports))
 
 
-        #Map to system calls
-        libSyscalls = set()
-        exeSyscalls = set()
-        glibcSyscallList = list()
-
-        i = 0
-        while i < 400:
-            glibcSyscallList.append("syscall(" + str(i) + ")")
-            glibcSyscallList.append("syscall ( " + str(i) + " )")
-            glibcSyscallList.append("syscall( " + str(i) + " )")
-            i += 1
-
-        glibcGraph = graph.Graph(rootLogger)
-        glibcGraph.createGraphFromInput(options.glibccfgpath, ":")
-        glibcWrapperListTemp = []
-        i = 0
-        while i < 400:
-            glibcWrapperListTemp.append(i)
-            i += 1
-        glibcWrapperList = set(glibcWrapperListTemp)
-
-        tmpSet = set()
-        for function in libraryImports:
-            leaves = glibcGraph.getLeavesFromStartNode(function, glibcSyscallList, list())
-            tmpSet = tmpSet.union(leaves)
-
-            for syscallStr in tmpSet:
-                syscallStr = syscallStr.replace("syscall( ", "syscall(")
-                syscallStr = syscallStr.replace("syscall ( ", "syscall(")
-                syscallStr = syscallStr.replace(" )", ")")
-                syscallNum = int(syscallStr[8:-1])
-                libSyscalls.add(syscallNum)
-
-        tmpSet = set()
-        for function in exeImports:
-            leaves = glibcGraph.getLeavesFromStartNode(function, glibcSyscallList, list())
-            tmpSet = tmpSet.union(leaves)
-
-            for syscallStr in tmpSet:
-                syscallStr = syscallStr.replace("syscall( ", "syscall(")
-                syscallStr = syscallStr.replace("syscall ( ", "syscall(")
-                syscallStr = syscallStr.replace(" )", ")")
-                syscallNum = int(syscallStr[8:-1])
-                exeSyscalls.add(syscallNum)
-
-        rootLogger.info("len(libSyscalls-exeSyscalls): %d", len(libSyscalls-exeSyscalls))
-        rootLogger.info("(libSyscalls-exeSyscalls): %s", str(libSyscalls-exeSyscalls))
-        rootLogger.info("len(exeSyscalls-libSyscalls): %d", len(exeSyscalls-libSyscalls))
-        rootLogger.info("(exeSyscalls-libSyscalls): %s", str(exeSyscalls-libSyscalls))
+        #Map to system calls, the glibc CFG is only loaded if there's no summary of it
+        glibcIndex = None
+        if ( options.libcsummary ):
+            glibcIndex = libcSummary.LibcSummaryStore(options.libcsummary, rootLogger).load(options.glibccfgpath, ":")
+        if ( glibcIndex is None ):
+            glibcGraph = compiledGraph.loadGraph(options.glibccfgpath, ":", rootLogger)
+            glibcIndex = glibcGraph.getSyscallIndex()
+
+        #Every imported function is folded into a system call bitmask once, the differences are mask operations
+        libSyscallMask = syscallIndex.foldSyscallMask(glibcIndex, libraryImports) & syscallIndex.SYSCALL_FILTER_MASK
+        exeSyscallMask = syscallIndex.foldSyscallMask(glibcIndex, exeImports) & syscallIndex.SYSCALL_FILTER_MASK
+        onlyLibSyscalls = syscallIndex.maskToSet(libSyscallMask & ~exeSyscallMask)
+        onlyExeSyscalls = syscallIndex.maskToSet(exeSyscallMask & ~libSyscallMask)
+
+        rootLogger.info("len(libSyscalls-exeSyscalls): %d", len(onlyLibSyscalls))
+        rootLogger.info("(libSyscalls-exeSyscalls): %s", str(onlyLibSyscalls))
+        rootLogger.info("len(exeSyscalls-libSyscalls): %d", len(onlyExeSyscalls))
+        rootLogger.info("(exeSyscalls-libSyscalls): %s", str(onlyExeSyscalls))
@@ -2,12 +2,17 @@ import os, sys, subprocess, signal
 import logging
 import optparse
 import time
+import multiprocessing
 
 sys.path.insert(0, '../')
-import graph
-import util
+import elfSymbols
 import folderAnalysis
+import compiledGraph
+import libcSummary
 import syscall
+import corpusIndex
+import contentHash
+import jobJournal
 
 
 def isValidOpts(opts):
@@ -49,6 +54,138 @@ def setLogPath(logPath):
     return rootLogger
 #    rootLogger.addHandler(ch)
 
+# Options and summaries, filled by the parent process before the worker pool is created
+# (or by initWorker). The libc graphs are added by getLibcGraph, with fork the parent
+# preloads them so the workers inherit them copy-on-write.
+workerState = dict()
+
+def loadWorkerState(glibcCfgPath, muslCfgPath, othercfgs, libcSummaryDir, logger):
+    """
+    Options and libc summaries of the analysis, the libc graphs are loaded by
+    getLibcGraph (or preloadLibcGraphs before forking)
+    """
+    glibcSummary = muslSummary = None
+    if ( libcSummaryDir ):
+        summaryStore = libcSummary.LibcSummaryStore(libcSummaryDir, logger)
+        glibcSummary = summaryStore.load(glibcCfgPath, ":")
+        muslSummary = summaryStore.load(muslCfgPath, "->")
+    workerState["glibcCfgPath"] = glibcCfgPath
+    workerState["muslCfgPath"] = muslCfgPath
+    workerState["glibcGraph"] = None
+    workerState["muslGraph"] = None
+    workerState["glibcSummary"] = glibcSummary
+    workerState["muslSummary"] = muslSummary
+    workerState["othercfgs"] = othercfgs
+    workerState["logger"] = logger
+
+def getLibcGraph(isMusl):
+    """
+    The musl or glibc graph, loaded with its indexes by the first folder of this
+    process which needs it (folders answered by the libc summary never do)
+    """
+    graphKey = "muslGraph" if isMusl else "glibcGraph"
+    if ( workerState[graphKey] is None ):
+        if ( isMusl ):
+            libcGraph = compiledGraph.loadGraph(workerState["muslCfgPath"], "->", workerState["logger"])
+        else:
+            libcGraph = compiledGraph.loadGraph(workerState["glibcCfgPath"], ":", workerState["logger"])
+        #Compiled graphs are memory mapped and already contain their indexes, every per-folder overlay graph reuses them
+        libcGraph.getSyscallIndex()
+        libcGraph.getReverseAdjacency()
+        workerState[graphKey] = libcGraph
+    return workerState[graphKey]
+
+def preloadLibcGraphs(folderPaths):
+    """
+    Load the libc graphs needed by any of the folders in this (parent) process, so
+    forked workers share them and their indexes copy-on-write instead of each
+    parsing them again. Nothing is loaded if the summaries answer every folder.
+    """
+    requiredLibcs = set()
+    for folderPath in folderPaths:
+        myFolderAnalysis = folderAnalysis.FolderAnalysis(folderPath, workerState["othercfgs"], None, None, workerState["logger"], muslSummary=workerState["muslSummary"], glibcSummary=workerState["glibcSummary"])
+        requiredLibc = myFolderAnalysis.getRequiredLibc()
+        if ( requiredLibc is not None ):
+            requiredLibcs.add(requiredLibc)
+            if ( len(requiredLibcs) == 2 ):
+                break
+    for isMusl in sorted(requiredLibcs):
+        getLibcGraph(isMusl)
+
+def initWorker(glibcCfgPath, muslCfgPath, othercfgs, libcSummaryDir, symbolBackend):
+    """
+    Worker initializer used when fork is not available, each worker parses the graphs it needs once
+    """
+    elfSymbols.setBackend(symbolBackend)
+    loadWorkerState(glibcCfgPath, muslCfgPath, othercfgs, libcSummaryDir, logging.getLogger("coverage"))
+
+def extractArtifactImports(filePath):
+    """
+    Extract the imported libc functions of one unique artifact of the corpus
+    :param filePath: path of the artifact
+    :return: functionList, raises if the extraction failed so the artifact is retried
+    """
+    return elfSymbols.extractImportedFunctionsFromLibcOrRaise(filePath, logging.getLogger("coverage"))
+
+def analyzeFolder(folderUnit):
+    """
+    Run the library specialization analysis for a single container folder
+    :param folderUnit: (folderPath, fileName -> imported functions)
+    :return: (elfSyscalls, libSyscalls, libSyscallsPerLib)
+    """
+    folderPath, importedFunctions = folderUnit
+    myFolderAnalysis = folderAnalysis.FolderAnalysis(folderPath, workerState["othercfgs"], None, None, workerState["logger"], importedFunctions=importedFunctions, muslSummary=workerState["muslSummary"], glibcSummary=workerState["glibcSummary"], libcGraphLoader=getLibcGraph)
+    return myFolderAnalysis.extractLibrarySpecializationPotential()
+
+def getFolderUnitKey(myCorpusIndex, folderPath, folderName):
+    """
+    Journal key of a container folder, a folder whose files changed since the
+    journaled run (e.g. another image extracted under the same name) is a new unit
+    :return: ("folder", folderName, hash of the file names and ELF file contents)
+    """
+    folderFiles = myCorpusIndex.getFolderFiles(folderName)
+    #Non-ELF files are named as well, their names select the libc and the library CFGs
+    fileNames = os.listdir(folderPath) if os.path.isdir(folderPath) else list()
+    fileItems = [fileName + ":" + folderFiles.get(fileName, "") for fileName in fileNames]
+    return ("folder", folderName, contentHash.hashStrings(sorted(fileItems)))
+
+def encodeJournalResults(results):
+    """
+    Journal (JSON) representation of artifact imports and folder results, sets become sorted lists
+    """
+    if ( isinstance(results, tuple) ):
+        elfSyscalls, libSyscalls, libSyscallsPerLib = results
+        return {"elfSyscalls": sorted(elfSyscalls), "libSyscalls": sorted(libSyscalls), "libSyscallsPerLib": {libName: sorted(libSyscalls) for libName, libSyscalls in libSyscallsPerLib.items()}}
+    return results
+
+def decodeJournalResults(results):
+    if ( isinstance(results, dict) ):
+        return (set(results["elfSyscalls"]), set(results["libSyscalls"]), {libName: set(libSyscalls) for libName, libSyscalls in results["libSyscallsPerLib"].items()})
+    return results
+
+def reportFolder(folderName, folderResult, syscallMap, rootLogger):
+    elfSyscalls, libSyscalls, libSyscallsPerLib = folderResult
+    onlyLibSyscalls = set(libSyscalls-elfSyscalls)
+    rootLogger.info("folderName: %s, len(onlyLibSyscalls): %d", folderName, len(onlyLibSyscalls))
+    rootLogger.debug("libSyscalls: %s", libSyscalls)
+    rootLogger.debug("elfSyscalls: %s", elfSyscalls)
+    allSyscalls = set(elfSyscalls.union(libSyscalls))
+    rootLogger.debug("allSyscalls: %s", allSyscalls)
+    elfSyscallNames = set()
+    for elfSyscallNum in elfSyscalls:
+        if ( syscallMap.get(elfSyscallNum, None) == None ):
+            rootLogger.error("No system call name found for: %d", elfSyscallNum)
+        elfSyscallNames.add(syscallMap[elfSyscallNum])
+    rootLogger.debug("elfSyscall Names: %s", elfSyscallNames)
+    allSyscallNames = set()
+    for allSyscallNum in allSyscalls:
+        allSyscallNames.add(syscallMap[allSyscallNum])
+    rootLogger.debug("allSyscall Names: %s", allSyscallNames)
+    rootLogger.debug("len(allSyscallNum): %d len(allSyscallNames): %d", len(allSyscalls), len(allSyscallNames))
+    if ( len(onlyLibSyscalls) > 10 ):
+        for libName, libSyscalls in libSyscallsPerLib.items():
+            rootLogger.info("   %s (unique syscalls):%d", libName, len(set(libSyscalls-elfSyscalls)))
+
 if __name__ == '__main__':
     """
     Main function to extract potential for library specialization
@@ -69,48 +206,104 @@ if __name__ == '__main__':
     parser.add_option("-m", "--muslcfgpath", dest="muslcfgpath", default=None, nargs=1,
                       help="Musl CFG file path")
 
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", default=1, nargs=1,
+                      help="Number of folders to analyze in parallel")
+
+    parser.add_option("", "--libcsummary", dest="libcsummary", default=None, nargs=1,
+                      help="Libc summary store (built by buildLibcSummary.py), used for folders without any library CFG")
+
+    parser.add_option("", "--manifest", dest="manifest", default=None, nargs=1,
+                      help="Corpus manifest path, unchanged files (size and mtime) reuse their hash from it, it is created or updated")
+
+    parser.add_option("", "--journal", dest="journal", default="libspecialpotential.jsonl", nargs=1,
+                      help="Journal of the completed artifacts and folders, used by --resume")
+
+    parser.add_option("", "--resume", dest="resume", action="store_true", default=False,
+                      help="Skip the artifacts and folders already completed in the journal of a previous, interrupted run")
+
+    parser.add_option("", "--maxattempts", dest="maxattempts", type="int", default=jobJournal.DEFAULT_MAX_ATTEMPTS, nargs=1,
+                      help="Number of times a failing artifact or folder is analyzed before it's given up on (counted across --resume runs)")
+
+    parser.add_option("", "--unittimeout", dest="unittimeout", type="int", default=0, nargs=1,
+                      help="Seconds after which a single artifact or folder is failed (e.g. hanging nm or objdump), 0 for no limit")
+
+    parser.add_option("", "--symbolbackend", dest="symbolbackend", type="choice", choices=elfSymbols.backends, default=elfSymbols.BACKEND_NM, nargs=1,
+                      help="ELF symbol extraction backend: nm (nm/objdump) or native (built-in ELF reader)")
+
     parser.add_option("-d", "--debug", dest="debug", action="store_true", default=False,
                       help="Debug enabled/disabled")
 
     (options, args) = parser.parse_args()
+    elfSymbols.setBackend(options.symbolbackend)
     if isValidOpts(options):
         rootLogger = setLogPath("libspecialpotential.log")
 
-        glibcGraph = graph.Graph(rootLogger)
-        glibcGraph.createGraphFromInput(options.glibccfgpath, ":")
-        muslGraph = graph.Graph(rootLogger)
-        muslGraph.createGraphFromInput(options.muslcfgpath, "->")
-
         syscallObj = syscall.Syscall(rootLogger)
         syscallMap = syscallObj.createMap()
 
         filterList = ["nginx"]
-        
-        for folderName in os.listdir(options.inputfolder):
+
+        folderNames = list()
+        for folderName in sorted(os.listdir(options.inputfolder)):
             if ( len(filterList) == 0 or folderName in filterList ):
-                rootLogger.info("Running analysis on folderName: %s", folderName)
-                myFolderAnalysis = folderAnalysis.FolderAnalysis(options.inputfolder + "/" + folderName, options.othercfgs, muslGraph, glibcGraph, rootLogger)
-                elfSyscalls, libSyscalls, libSyscallsPerLib = myFolderAnalysis.extractLibrarySpecializationPotential()
-                onlyLibSyscalls = set(libSyscalls-elfSyscalls)
-                rootLogger.info("folderName: %s, len(onlyLibSyscalls): %d", folderName, len(onlyLibSyscalls))
-                rootLogger.debug("libSyscalls: %s", libSyscalls)
-                rootLogger.debug("elfSyscalls: %s", elfSyscalls)
-                allSyscalls = set(elfSyscalls.union(libSyscalls))
-                rootLogger.debug("allSyscalls: %s", allSyscalls)
-                elfSyscallNames = set()
-                for elfSyscallNum in elfSyscalls:
-                    if ( syscallMap.get(elfSyscallNum, None) == None ):
-                        rootLogger.error("No system call name found for: %d", elfSyscallNum)
-                    elfSyscallNames.add(syscallMap[elfSyscallNum])
-                rootLogger.debug("elfSyscall Names: %s", elfSyscallNames)
-                allSyscallNames = set()
-                for allSyscallNum in allSyscalls:
-                    allSyscallNames.add(syscallMap[allSyscallNum])
-                rootLogger.debug("allSyscall Names: %s", allSyscallNames)
-                rootLogger.debug("len(allSyscallNum): %d len(allSyscallNames): %d", len(allSyscalls), len(allSyscallNames))
-                if ( len(onlyLibSyscalls) > 10 ):
-                    for libName, libSyscalls in libSyscallsPerLib.items():
-                        rootLogger.info("   %s (unique syscalls):%d", libName, len(set(libSyscalls-elfSyscalls)))
+                folderNames.append(folderName)
+        folderPathToName = dict()
+        for folderName in folderNames:
+            folderPathToName[options.inputfolder + "/" + folderName] = folderName
+
+        # Identical ELF files across folders are only processed (nm/objdump) once
+        myCorpusIndex = corpusIndex.loadOrBuildIndex(options.inputfolder, rootLogger, options.manifest, folderNames)
+        # Artifacts and folders are journaled as they complete, --resume skips those completed
+        # by a previous run with the same callgraphs and backend
+        configHash = jobJournal.getConfigHash(["libspecialpotential", contentHash.hashFile(options.glibccfgpath), contentHash.hashFile(options.muslcfgpath), contentHash.hashFolder(options.othercfgs), options.symbolbackend])
+        myJobJournal = jobJournal.JobJournal(options.journal, configHash, rootLogger, options.maxattempts, encodeResults=encodeJournalResults, decodeResults=decodeJournalResults)
+        myJobJournal.open(options.resume)
+        try:
+            artifactJobs = [(("imports", fileHash), filePath) for fileHash, filePath in myCorpusIndex.getUniqueArtifacts()]
+            if ( options.jobs > 1 ):
+                #Workers which aren't forked don't inherit the backend selected in the parent
+                with multiprocessing.Pool(options.jobs, initializer=elfSymbols.setBackend, initargs=(options.symbolbackend,)) as pool:
+                    myJobJournal.run(artifactJobs, extractArtifactImports, pool=pool, timeout=options.unittimeout)
+            else:
+                myJobJournal.run(artifactJobs, extractArtifactImports, timeout=options.unittimeout)
+            folderJobs = list()
+            folderUnitKeys = dict()
+            for folderPath, folderName in folderPathToName.items():
+                importedFunctions = dict()
+                for fileName, fileHash in myCorpusIndex.getFolderFiles(folderName).items():
+                    #Artifacts which failed every attempt are treated like non-ELF files
+                    importedFunctions[fileName] = myJobJournal.getResults(("imports", fileHash)) or list()
+                folderUnitKeys[folderName] = getFolderUnitKey(myCorpusIndex, folderPath, folderName)
+                folderJobs.append((folderUnitKeys[folderName], (folderPath, importedFunctions)))
+
+            def logFolderFinished(unitKey, folderResult):
+                rootLogger.info("Finished analysis on folderName: %s", unitKey[1])
+
+            if ( options.jobs > 1 ):
+                if ( "fork" in multiprocessing.get_all_start_methods() ):
+                    # Parse once in the parent, workers share the graphs copy-on-write
+                    loadWorkerState(options.glibccfgpath, options.muslcfgpath, options.othercfgs, options.libcsummary, rootLogger)
+                    preloadLibcGraphs(folderPathToName.keys())
+                    poolContext = multiprocessing.get_context("fork")
+                    pool = poolContext.Pool(options.jobs)
+                else:
+                    pool = multiprocessing.Pool(options.jobs, initializer=initWorker, initargs=(options.glibccfgpath, options.muslcfgpath, options.othercfgs, options.libcsummary, options.symbolbackend))
+                with pool:
+                    # Results stream back in completion order
+                    myJobJournal.run(folderJobs, analyzeFolder, pool=pool, timeout=options.unittimeout, onResult=logFolderFinished)
+            else:
+                loadWorkerState(options.glibccfgpath, options.muslcfgpath, options.othercfgs, options.libcsummary, rootLogger)
+                myJobJournal.run(folderJobs, analyzeFolder, timeout=options.unittimeout, onResult=logFolderFinished)
+        finally:
+            myJobJournal.close()
+
+        # Report in folder name order, independent of the completion order of the workers
+        for folderName in folderNames:
+            folderResult = myJobJournal.getResults(folderUnitKeys[folderName])
+            if ( folderResult is None ):
+                rootLogger.error("No results for folderName: %s, the analysis failed", folderName)
+                continue
+            reportFolder(folderName, folderResult, syscallMap, rootLogger)
 
 
         #rootLogger.info("len(libSyscalls-exeSyscalls): %d", len(libSyscalls-exeSyscalls))
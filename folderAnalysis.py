@@ -5,39 +5,78 @@ import re
 sys.path.insert(0, '../')
 
 import util
+import overlayGraph
+import elfSymbols
+import reachabilityMatrix
+import syscallIndex
+
+#Row of the executables' start nodes in the reachability matrix, the other rows are keyed by library file name
+ELF_GROUP = None
+
+def getLibraryCfgFileName(fileName):
+    """
+    Name of the library CFG file of a library file of the folder (libfoo-1.2.so.3 -> libfoo.callgraph.out)
+    """
+    cfgFileName = re.sub("-.*so",".so",fileName)
+    cfgFileName = cfgFileName[:cfgFileName.index(".so")]
+    return cfgFileName + ".callgraph.out"
 
 class FolderAnalysis:
-    def __init__(self, folderPath, otherCfgPath, muslGraph, glibcGraph, logger):
+    def __init__(self, folderPath, otherCfgPath, muslGraph, glibcGraph, logger, importedFunctions=None, muslSummary=None, glibcSummary=None, libcGraphLoader=None):
         self.folderPath = folderPath
         self.otherCfgPath = otherCfgPath
         self.muslGraph = muslGraph
         self.glibcGraph = glibcGraph
         self.logger = logger
-
-    def extractLibrarySpecializationPotential(self):
-        syscallList = list()
-
-        i = 0
-        while i < 400:
-            #syscallList.append("syscall(" + str(i) + ")")
-            syscallList.append("syscall(" + str(i) + ")")
-            syscallList.append("syscall ( " + str(i) + " )")
-            syscallList.append("syscall( " + str(i) + " )")
-            i += 1
-
+        #Optional fileName -> imported libc functions, precomputed once per unique artifact of the corpus
+        self.importedFunctions = importedFunctions
+        #Optional libcSummary.LibcSummary of each libc, used for folders without any library CFG
+        self.muslSummary = muslSummary
+        self.glibcSummary = glibcSummary
+        #Optional function(isMusl) returning the libc graph, used if muslGraph/glibcGraph is None
+        #and only called for folders which need the graph
+        self.libcGraphLoader = libcGraphLoader
+
+    def getLibcGraph(self, isMusl):
+        libcGraph = self.muslGraph if isMusl else self.glibcGraph
+        if ( libcGraph is None and self.libcGraphLoader is not None ):
+            libcGraph = self.libcGraphLoader(isMusl)
+        return libcGraph
+
+    def getRequiredLibc(self):
+        """
+        :return: None if the libc summary answers the folder (no library with a CFG),
+                 otherwise whether the libc graph it needs is the musl one
+        """
+        isMusl = util.usesMusl(self.folderPath)
+        if ( not (self.muslSummary if isMusl else self.glibcSummary) ):
+            return isMusl
+        libsWithCfg = set(os.listdir(self.otherCfgPath))
+        for fileName in os.listdir(self.folderPath):
+            if ( fileName.startswith("lib") and fileName != "libs.out" and getLibraryCfgFileName(fileName) in libsWithCfg ):
+                return isMusl
+        return None
+
+    def getImportedFunctions(self, fileName):
+        if ( self.importedFunctions is not None ):
+            #Files missing from the precomputed imports are not ELF files
+            return self.importedFunctions.get(fileName, list())
+        return elfSymbols.extractImportedFunctionsFromLibc(self.folderPath + "/" + fileName, self.logger)
+
+    def extractReachabilityMatrix(self):
+        """
+        Reachable system calls of the executables (ELF_GROUP row) and of every library
+        without CFG (one row per library file name) of the folder, in one propagation
+        :return: reachabilityMatrix.ReachabilityMatrix
+        """
         exceptList = ["access","arch_prctl","brk","close","execve","exit_group","fcntl","fstat","geteuid","lseek","mmap","mprotect","munmap","openat","prlimit64","read","rt_sigaction","rt_sigprocmask","set_robust_list","set_tid_address","stat","statfs","write","setns","capget","capset","chdir","fchown","futex","getdents64","getpid","getppid","lstat","openat","prctl","setgid","setgroups","setuid","stat","io_setup","getdents","clone","readlinkat","newfstatat","getrandom","sigaltstack","getresgid","getresuid","setresgid","setresuid","alarm","getsid","getpgrp", "epoll_pwait", "vfork"]
 
 
-        myGraph = self.glibcGraph
-        if ( util.usesMusl(self.folderPath) ):
-            self.logger.warning("Setting libc to MUSL")
-            myGraph = self.muslGraph
-
         libsWithCfg = set()
         libsInLibc = set()
         elfFunctionStarts = set()
-        libFunctionStarts = set()
         libFunctionStartsPerLib = dict()
+        libraryCfgPaths = list()
 
         for fileName in os.listdir(self.otherCfgPath):
             libsWithCfg.add(fileName)
@@ -62,13 +101,11 @@ class FolderAnalysis:
             self.logger.debug("fileName: %s", fileName)
             if ( fileName.startswith("lib") and fileName != "libs.out"):
                 cfgAvailable = True
-                tmpFileName = re.sub("-.*so",".so",fileName)
-                tmpFileName = tmpFileName[:tmpFileName.index(".so")]
-                tmpFileName = tmpFileName + ".callgraph.out"
+                tmpFileName = getLibraryCfgFileName(fileName)
                 self.logger.debug("tmpFileName: %s", tmpFileName)
                 if ( tmpFileName in libsWithCfg ):
                     self.logger.debug("adding tmpFileName to CFG: %s", tmpFileName)
-                    myGraph.createGraphFromInput(self.otherCfgPath + "/" + tmpFileName, "->")
+                    libraryCfgPaths.append(self.otherCfgPath + "/" + tmpFileName)
                 elif ( tmpFileName in libsInLibc ):
                     cfgAvailable = True
                 else:
@@ -76,62 +113,46 @@ class FolderAnalysis:
             self.logger.debug("cfgAvailable: %s", cfgAvailable)
             if ( not fileName.startswith("lib") ): 
                 self.logger.debug("Adding function starts for %s to elfFunctionStarts", fileName)
-                functionList = util.extractImportedFunctionsFromLibc(self.folderPath + "/" + fileName, self.logger)
+                functionList = self.getImportedFunctions(fileName)
                 #if ( not functionList ):
                 #    self.logger.warning("Function extraction for file: %s failed!", fileName)
                 elfFunctionStarts.update(set(functionList))
             if ( fileName.startswith("lib") and not cfgAvailable ):
                 self.logger.debug("Adding function starts for %s to libFunctionStarts", fileName)
-                functionList = util.extractImportedFunctionsFromLibc(self.folderPath + "/" + fileName, self.logger)
+                functionList = self.getImportedFunctions(fileName)
                 #if ( not functionList ):
                 #    self.logger.warning("Function extraction for file: %s failed!", fileName)
-                libFunctionStarts.update(set(functionList))
                 #self.logger.debug("libFunctionStarts: %s", str(libFunctionStarts))
                 tmpSet = libFunctionStartsPerLib.get(fileName, set())
                 tmpSet.update(set(functionList))
                 libFunctionStartsPerLib[fileName] = tmpSet
 
-        tmpSet = set()
-        elfSyscalls = set()
-        libSyscalls = set()
-        libSyscallsPerLib = dict()
+        isMusl = util.usesMusl(self.folderPath)
+        baseSummary = self.glibcSummary
+        if ( isMusl ):
+            self.logger.warning("Setting libc to MUSL")
+            baseSummary = self.muslSummary
+        if ( not libraryCfgPaths and baseSummary ):
+            #Nothing to layer on top of libc, the summary replaces the libc graph
+            myGraph = baseSummary
+        else:
+            #The library CFGs of this folder are layered on top of the shared libc graph, which is never modified
+            myGraph = overlayGraph.OverlayGraph(self.getLibcGraph(isMusl), self.logger)
+            for libraryCfgPath in libraryCfgPaths:
+                myGraph.createGraphFromInput(libraryCfgPath, "->")
+
+        #Only the part of the graph affected by this folder's CFGs is traversed, the rest uses the libc index
+        startNodeGroups = [(ELF_GROUP, elfFunctionStarts)]
+        startNodeGroups.extend(libFunctionStartsPerLib.items())
+        return reachabilityMatrix.computeReachabilityMatrix(myGraph, startNodeGroups, self.logger, syscallIndex.SYSCALL_FILTER_MASK)
 
-        for function in elfFunctionStarts:
-            leaves = myGraph.getLeavesFromStartNode(function, syscallList, list())
-            tmpSet = tmpSet.union(leaves)
-
-        for syscallStr in tmpSet:
-            syscallStr = syscallStr.replace("syscall( ", "syscall(")
-            syscallStr = syscallStr.replace("syscall ( ", "syscall(")
-            syscallStr = syscallStr.replace(" )", ")")
-            syscallNum = int(syscallStr[8:-1])
-            elfSyscalls.add(syscallNum)
-
-        tmpSet = set()
-        for function in libFunctionStarts:
-            leaves = myGraph.getLeavesFromStartNode(function, syscallList, list())
-            tmpSet = tmpSet.union(leaves)
-
-        for syscallStr in tmpSet:
-            syscallStr = syscallStr.replace("syscall( ", "syscall(")
-            syscallStr = syscallStr.replace("syscall ( ", "syscall(")
-            syscallStr = syscallStr.replace(" )", ")")
-            syscallNum = int(syscallStr[8:-1])
-            libSyscalls.add(syscallNum)
-
-        for libName, libFunctionStarts in libFunctionStartsPerLib.items():
-            tmpSet = set()
-            for function in libFunctionStarts:
-                leaves = myGraph.getLeavesFromStartNode(function, syscallList, list())
-                tmpSet = tmpSet.union(leaves)
-
-            tmpLibSyscalls = libSyscallsPerLib.get(libName, set())
-            for syscallStr in tmpSet:
-                syscallStr = syscallStr.replace("syscall( ", "syscall(")
-                syscallStr = syscallStr.replace("syscall ( ", "syscall(")
-                syscallStr = syscallStr.replace(" )", ")")
-                syscallNum = int(syscallStr[8:-1])
-                tmpLibSyscalls.add(syscallNum)
-            libSyscallsPerLib[libName] = tmpLibSyscalls          
+    def extractLibrarySpecializationPotential(self):
+        myReachabilityMatrix = self.extractReachabilityMatrix()
+        libNames = myReachabilityMatrix.groupKeys[1:]
+        elfSyscalls = myReachabilityMatrix.getSyscalls(ELF_GROUP)
+        libSyscalls = myReachabilityMatrix.getSyscallsOfGroups(libNames)
+        libSyscallsPerLib = dict()
+        for libName in libNames:
+            libSyscallsPerLib[libName] = myReachabilityMatrix.getSyscalls(libName)
 
         return elfSyscalls, libSyscalls, libSyscallsPerLib
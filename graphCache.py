@@ -0,0 +1,87 @@
+import os
+import pickle
+import tempfile
+
+import contentHash
+
+# Bump whenever the way cached objects are generated changes, to invalidate old entries
+TOOL_VERSION = "1"
+
+class GraphCache:
+    """
+    Content-addressed on-disk cache, entries are keyed by a hash of everything which
+    was used to generate them. Writes are atomic (temp file + rename) so multiple
+    processes can share the same cache folder, and the folder is kept under a size
+    limit by evicting the least recently used entries.
+    """
+    def __init__(self, cacheDir, logger, maxSizeBytes=2 * 1024 * 1024 * 1024, suffix=".pickle"):
+        self.cacheDir = cacheDir
+        self.logger = logger
+        self.maxSizeBytes = maxSizeBytes
+        self.suffix = suffix
+        os.makedirs(self.cacheDir, exist_ok=True)
+
+    def computeKey(self, keyComponents):
+        return contentHash.hashStrings([TOOL_VERSION] + list(keyComponents))
+
+    def getEntryPath(self, key):
+        return os.path.join(self.cacheDir, key + self.suffix)
+
+    def load(self, key):
+        entryPath = self.getEntryPath(key)
+        if ( not os.path.isfile(entryPath) ):
+            return None
+        try:
+            with open(entryPath, 'rb') as entryFile:
+                value = pickle.load(entryFile)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            self.logger.warning("Failed to read cache entry: %s (%s), ignoring it", entryPath, str(e))
+            return None
+        try:
+            # Used as the access time for LRU eviction
+            os.utime(entryPath, None)
+        except OSError:
+            pass
+        self.logger.debug("Cache hit for key: %s", key)
+        return value
+
+    def store(self, key, value):
+        entryPath = self.getEntryPath(key)
+        tmpFd, tmpPath = tempfile.mkstemp(dir=self.cacheDir, prefix=".tmp.", suffix=self.suffix)
+        try:
+            with os.fdopen(tmpFd, 'wb') as tmpFile:
+                pickle.dump(value, tmpFile, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpPath, entryPath)
+        except Exception:
+            if ( os.path.exists(tmpPath) ):
+                os.remove(tmpPath)
+            raise
+        self.logger.debug("Stored cache entry for key: %s", key)
+        self.evict()
+
+    def evict(self):
+        entries = list()
+        totalSize = 0
+        for fileName in os.listdir(self.cacheDir):
+            if ( not fileName.endswith(self.suffix) or fileName.startswith(".tmp.") ):
+                continue
+            entryPath = os.path.join(self.cacheDir, fileName)
+            try:
+                entryStat = os.stat(entryPath)
+            except OSError:
+                continue
+            entries.append((entryStat.st_mtime, entryStat.st_size, entryPath))
+            totalSize += entryStat.st_size
+        if ( totalSize <= self.maxSizeBytes ):
+            return
+        entries.sort()
+        for entryMtime, entrySize, entryPath in entries:
+            if ( totalSize <= self.maxSizeBytes ):
+                break
+            try:
+                os.remove(entryPath)
+                totalSize -= entrySize
+                self.logger.debug("Evicted cache entry: %s", entryPath)
+            except OSError:
+                # Another process might have removed it already
+                pass
@@ -0,0 +1,235 @@
+import os
+import pickle
+import tempfile
+
+import condensation
+import contentHash
+import elfSymbols
+import internedGraph
+import syscallIndex
+import syscallScanner
+
+# Bump whenever the content of the state file changes
+STATE_VERSION = "2"
+
+class StartNodeResult:
+    """
+    System calls reachable from a single start node, and what they were derived from:
+    the units (libraries, binary) whose nodes were visited and the exports crossed on
+    the way (visited function nodes which don't belong to any unit, the names through
+    which units call each other), a unit which starts or stops exporting one of them
+    changes the result as well
+    """
+    def __init__(self, syscalls, dependencies, crossedExports):
+        self.syscalls = syscalls
+        self.dependencies = dependencies
+        self.crossedExports = crossedExports
+
+class IncrementalAnalysis:
+    """
+    Incremental Piecewise.extractAccessibleSystemCalls. The reachable system calls are
+    kept per start node along with the units they depend on, in a state file. When
+    a library (shared object or callgraph) or the binary changes, only the fragments
+    of the changed units are rebuilt (unchanged ones come from the fragment store) and
+    only the start nodes which reached a changed unit are traversed again. If no unit
+    changed, the previous results are reused without loading the complete graph.
+    """
+    def __init__(self, piecewiseObj, statePath, logger):
+        self.piecewiseObj = piecewiseObj
+        self.statePath = statePath
+        self.logger = logger
+
+    def getBinaryName(self):
+        binaryName = self.piecewiseObj.binaryPath
+        if ( "/" in binaryName ):
+            binaryName = binaryName[binaryName.rindex('/')+1:]
+        return binaryName
+
+    def loadState(self):
+        if ( not self.statePath or not os.path.isfile(self.statePath) ):
+            return None
+        try:
+            with open(self.statePath, 'rb') as stateFile:
+                state = pickle.load(stateFile)
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            self.logger.warning("Failed to read incremental state: %s (%s), starting from scratch", self.statePath, str(e))
+            return None
+        if ( state.get("version", None) != STATE_VERSION ):
+            return None
+        return state
+
+    def saveState(self, state):
+        if ( not self.statePath ):
+            return
+        stateDir = os.path.dirname(os.path.abspath(self.statePath))
+        tmpFd, tmpPath = tempfile.mkstemp(dir=stateDir, prefix=".tmp.", suffix=".state")
+        try:
+            with os.fdopen(tmpFd, 'wb') as tmpFile:
+                pickle.dump(state, tmpFile, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmpPath, self.statePath)
+        except Exception:
+            if ( os.path.exists(tmpPath) ):
+                os.remove(tmpPath)
+            raise
+
+    def getUnitHashes(self, altLibPath):
+        """
+        Content hash of every unit of the complete graph: the binary (with its
+        callgraph) and every library (shared object and callgraph). The libc-related
+        libraries only provide libc start nodes, they're folded into the libc unit.
+        """
+        piecewiseObj = self.piecewiseObj
+        unitHashes = dict()
+        unitHashes[self.getBinaryName()] = contentHash.hashStrings([contentHash.hashFile(piecewiseObj.binaryPath), contentHash.hashFile(piecewiseObj.binaryCfgPath)])
+        libcRelatedHashes = list()
+        for libraryName, libPath in sorted(piecewiseObj.readLibraries(altLibPath).items()):
+            if ( ".so" not in libraryName ):
+                continue
+            libPathInAlt = piecewiseObj.existsInAltPath(libraryName, altLibPath)
+            if ( libPathInAlt ):
+                libPath = libPathInAlt
+            libraryName = piecewiseObj.cleanLib(libraryName)
+            libraryCfgFilePath = piecewiseObj.cfgPath + "/" + libraryName + ".callgraph.out"
+            libraryHash = contentHash.hashStrings([contentHash.hashFile(libPath), contentHash.hashFile(libraryCfgFilePath)])
+            if ( libraryName in piecewiseObj.libcRelatedList ):
+                libcRelatedHashes.append(libraryName + ":" + libraryHash)
+            else:
+                unitHashes[libraryName] = libraryHash
+        unitHashes["libc"] = contentHash.hashStrings([unitHashes.get("libc", "")] + libcRelatedHashes)
+        return unitHashes
+
+    def getStartNodeResults(self, completeInternedGraph, startNodes):
+        """
+        Results of all the given start nodes from a single pass instead of a traversal
+        per start node: the part of the graph reachable from them is condensed into
+        strongly connected components, which are walked bottom-up accumulating the
+        system calls, units and crossed exports reachable from each component as bitmasks
+        :param completeInternedGraph: frozen InternedGraph containing every start node
+        :param startNodes:
+        :return: dict start node -> StartNodeResult
+        """
+        startIds = [completeInternedGraph.getNodeId(startNode) for startNode in startNodes]
+        adjacency = internedGraph.IdAdjacency(completeInternedGraph)
+        componentOf, components = condensation.condenseGraph(adjacency, startIds)
+        componentSuccessors = condensation.getComponentSuccessors(adjacency, componentOf, components)
+        syscallNumbers = completeInternedGraph.syscallNumbers
+        owners = completeInternedGraph.owners
+        #Every unowned node gets a bit in the crossed exports masks
+        exportIds = list()
+        syscallMasks = list()
+        unitMasks = list()
+        exportMasks = list()
+        #Components are numbered bottom-up, successors are always done first
+        for componentId, members in enumerate(components):
+            syscallMask = 0
+            unitMask = 0
+            exportMask = 0
+            for nodeId in members:
+                if ( syscallNumbers[nodeId] >= 0 ):
+                    syscallMask |= 1 << syscallNumbers[nodeId]
+                elif ( owners[nodeId] != internedGraph.NO_OWNER ):
+                    unitMask |= 1 << owners[nodeId]
+                else:
+                    exportMask |= 1 << len(exportIds)
+                    exportIds.append(nodeId)
+            for successorId in componentSuccessors[componentId]:
+                syscallMask |= syscallMasks[successorId]
+                unitMask |= unitMasks[successorId]
+                exportMask |= exportMasks[successorId]
+            syscallMasks.append(syscallMask)
+            unitMasks.append(unitMask)
+            exportMasks.append(exportMask)
+
+        ownerNames = completeInternedGraph.ownerNames
+        nodeNames = completeInternedGraph.nodeNames
+        startResults = dict()
+        for startNode, startId in zip(startNodes, startIds):
+            componentId = componentOf[startId]
+            syscalls = frozenset(syscallIndex.maskToSet(syscallMasks[componentId]))
+            dependencies = frozenset(ownerNames[ownerId] for ownerId in syscallIndex.maskToSet(unitMasks[componentId]))
+            crossedExports = frozenset(nodeNames[exportIds[exportBit]] for exportBit in syscallIndex.maskToSet(exportMasks[componentId]))
+            startResults[startNode] = StartNodeResult(syscalls, dependencies, crossedExports)
+        return startResults
+
+    def isAffected(self, startNodeResult, changedUnits, changedExports):
+        if ( not startNodeResult.dependencies.isdisjoint(changedUnits) ):
+            return True
+        return not startNodeResult.crossedExports.isdisjoint(changedExports)
+
+    def extractAccessibleSystemCalls(self, startNodes, exceptList=list(), altLibPath=None):
+        """
+        Same result as Piecewise.extractAccessibleSystemCalls (without the per-library
+        visited functions) and the difference to the previous run
+        :return: set of accessible system calls, set of added system calls, set of removed system calls
+        """
+        piecewiseObj = self.piecewiseObj
+        startNodes = set(startNodes)
+        startNodes.update(piecewiseObj.getLibcStartNodes())
+        #The library syscalls and exports of the state depend on the extraction backends as well
+        settings = (os.path.abspath(piecewiseObj.binaryPath), tuple(sorted(exceptList)), altLibPath, elfSymbols.getBackend(), syscallScanner.getBackend())
+
+        previousState = self.loadState()
+        if ( previousState and previousState["settings"] != settings ):
+            self.logger.info("Incremental state was created for another binary, except list or backend, starting from scratch")
+            previousState = None
+
+        unitHashes = self.getUnitHashes(altLibPath)
+        changedUnits = set(unitHashes.keys())
+        if ( previousState ):
+            previousHashes = previousState["unitHashes"]
+            changedUnits = set()
+            for unitName in set(unitHashes.keys()).union(previousHashes.keys()):
+                if ( unitHashes.get(unitName, None) != previousHashes.get(unitName, None) ):
+                    changedUnits.add(unitName)
+        self.logger.info("Incremental analysis: %d units, changed: %s", len(unitHashes), str(sorted(changedUnits)))
+
+        previousResults = previousState["startResults"] if previousState else dict()
+        affectedStartNodes = startNodes.difference(previousResults.keys())
+        if ( changedUnits or affectedStartNodes ):
+            #Fragments of unchanged libraries are reused from the fragment store, the interned graph from the graph cache
+            completeInternedGraph, librarySyscalls, libraryToFuncDict, binaryFuncSet = piecewiseObj.createCompleteInternedGraph(exceptList, altLibPath)
+            unitExports = dict()
+            for libraryName, libraryFuncs in libraryToFuncDict.items():
+                unitExports[libraryName] = frozenset(libraryFuncs)
+            unitExports[self.getBinaryName()] = frozenset(["main"])
+
+            changedExports = set()
+            if ( previousState ):
+                previousExports = previousState["unitExports"]
+                for unitName in changedUnits:
+                    changedExports.update(unitExports.get(unitName, ()))
+                    changedExports.update(previousExports.get(unitName, ()))
+            for startNode in startNodes.intersection(previousResults.keys()):
+                if ( self.isAffected(previousResults[startNode], changedUnits, changedExports) ):
+                    affectedStartNodes.add(startNode)
+            completeInternedGraph.addNodes(affectedStartNodes)
+            recomputedResults = self.getStartNodeResults(completeInternedGraph, sorted(affectedStartNodes))
+        else:
+            librarySyscalls = previousState["librarySyscalls"]
+            unitExports = previousState["unitExports"]
+            recomputedResults = dict()
+        self.logger.info("Incremental analysis: recomputed %d of %d start nodes", len(recomputedResults), len(startNodes))
+
+        startResults = dict()
+        for startNode in startNodes:
+            startResults[startNode] = recomputedResults.get(startNode, None) or previousResults[startNode]
+
+        accessibleSyscalls = set(librarySyscalls)
+        for startNodeResult in startResults.values():
+            accessibleSyscalls.update(startNodeResult.syscalls)
+        previousSyscalls = set(previousState["accessibleSyscalls"]) if previousState else set()
+        addedSyscalls = accessibleSyscalls - previousSyscalls
+        removedSyscalls = previousSyscalls - accessibleSyscalls
+        if ( previousState ):
+            self.logger.info("Accessible system calls: %d, added: %s, removed: %s", len(accessibleSyscalls), str(sorted(addedSyscalls)), str(sorted(removedSyscalls)))
+
+        state = dict()
+        state["version"] = STATE_VERSION
+        state["settings"] = settings
+        state["unitHashes"] = unitHashes
+        state["unitExports"] = unitExports
+        state["startResults"] = startResults
+        state["librarySyscalls"] = frozenset(librarySyscalls)
+        state["accessibleSyscalls"] = frozenset(accessibleSyscalls)
+        self.saveState(state)
+        return accessibleSyscalls, addedSyscalls, removedSyscalls
@@ -0,0 +1,221 @@
+import array
+
+import reachability
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NO_OWNER = -1
+
+class InternedGraph:
+    """
+    Array backed callgraph: every node name is interned once to an integer id, edges
+    are stored as CSR arrays of ids and every node has an owner (the library whose
+    prefix it carries, NO_OWNER otherwise). Traversals mark visited nodes in a
+    bytearray, so visited nodes are bucketed per library through the owner array
+    instead of prefix checks on every visited name.
+    """
+    def __init__(self, logger):
+        self.logger = logger
+        self.nodeIds = dict()
+        self.nodeNames = list()
+        self.syscallNumbers = array.array('i')
+        self.owners = array.array('i')
+        self.ownerIds = dict()
+        self.ownerNames = list()
+        self.edgeSources = array.array('I')
+        self.edgeTargets = array.array('I')
+        self.offsets = None
+        self.targets = None
+
+    def addOwner(self, ownerName):
+        ownerId = self.ownerIds.get(ownerName, None)
+        if ( ownerId is None ):
+            ownerId = len(self.ownerNames)
+            self.ownerIds[ownerName] = ownerId
+            self.ownerNames.append(ownerName)
+        return ownerId
+
+    def getOwnerId(self, ownerName):
+        return self.ownerIds.get(ownerName, NO_OWNER)
+
+    def internNode(self, node, ownerId=NO_OWNER):
+        nodeId = self.nodeIds.get(node, None)
+        if ( nodeId is None ):
+            nodeId = len(self.nodeNames)
+            self.nodeIds[node] = nodeId
+            self.nodeNames.append(node)
+            syscallNum = reachability.getSyscallNumber(node)
+            self.syscallNumbers.append(-1 if syscallNum is None else syscallNum)
+            self.owners.append(ownerId)
+        return nodeId
+
+    def addNodes(self, nodes):
+        """
+        Intern nodes without edges (e.g. start nodes which aren't part of the
+        graph), a frozen graph stays frozen
+        """
+        for node in nodes:
+            if ( node not in self.nodeIds ):
+                self.internNode(node, getPrefixOwner(node, self.ownerIds))
+                if ( self.offsets is not None ):
+                    self.offsets.append(self.offsets[-1])
+
+    def getNodeId(self, node):
+        return self.nodeIds.get(node, None)
+
+    def getNodeCount(self):
+        return len(self.nodeNames)
+
+    def addEdge(self, srcNode, dstNode):
+        self.edgeSources.append(self.internNode(srcNode))
+        self.edgeTargets.append(self.internNode(dstNode))
+        self.offsets = None
+
+    def freeze(self):
+        """
+        Build the CSR arrays from the edge list (counting sort by source)
+        """
+        nodeCount = len(self.nodeNames)
+        offsets = array.array('I', bytes(4 * (nodeCount + 1)))
+        for srcId in self.edgeSources:
+            offsets[srcId + 1] += 1
+        for nodeId in range(nodeCount):
+            offsets[nodeId + 1] += offsets[nodeId]
+        position = array.array('I', offsets[:nodeCount])
+        targets = array.array('I', bytes(4 * len(self.edgeTargets)))
+        for srcId, dstId in zip(self.edgeSources, self.edgeTargets):
+            targets[position[srcId]] = dstId
+            position[srcId] += 1
+        self.offsets = offsets
+        self.targets = targets
+
+    def traverse(self, startNodes, exceptNodes=None):
+        """
+        Multi-source traversal over node ids
+        :param startNodes: node names, nodes which aren't part of the graph are ignored
+        :param exceptNodes: optional node names which should not be entered
+        :return: set of reached system call numbers, bytearray with 1 for every visited node id
+        """
+        if ( self.offsets is None ):
+            self.freeze()
+        offsets = self.offsets
+        targets = self.targets
+        syscallNumbers = self.syscallNumbers
+        visited = bytearray(len(self.nodeNames))
+        if ( exceptNodes ):
+            for node in exceptNodes:
+                nodeId = self.nodeIds.get(node, None)
+                if ( nodeId is not None ):
+                    #Never entered and not reported as visited either
+                    visited[nodeId] = 2
+        worklist = list()
+        for node in startNodes:
+            nodeId = self.nodeIds.get(node, None)
+            if ( nodeId is not None and visited[nodeId] != 1 ):
+                visited[nodeId] = 1
+                worklist.append(nodeId)
+        syscalls = set()
+        while ( worklist ):
+            nodeId = worklist.pop()
+            if ( syscallNumbers[nodeId] >= 0 ):
+                syscalls.add(syscallNumbers[nodeId])
+            for targetId in targets[offsets[nodeId]:offsets[nodeId + 1]]:
+                if ( not visited[targetId] ):
+                    visited[targetId] = 1
+                    worklist.append(targetId)
+        if ( exceptNodes ):
+            visited = visited.replace(b"\x02", b"\x00")
+        return syscalls, visited
+
+    def getVisitedIds(self, visited):
+        if ( numpy is not None ):
+            return numpy.flatnonzero(numpy.frombuffer(visited, dtype=numpy.uint8)).tolist()
+        return [nodeId for nodeId, isVisited in enumerate(visited) if isVisited]
+
+    def countVisited(self, visited):
+        return visited.count(1)
+
+    def isVisited(self, visited, node):
+        nodeId = self.nodeIds.get(node, None)
+        return nodeId is not None and visited[nodeId] == 1
+
+    def getVisitedNodesPerOwner(self, visited):
+        """
+        Visited node names bucketed by owner in a single pass over the visited ids
+        :return: dict owner id (NO_OWNER included) -> list of visited node names
+        """
+        owners = self.owners
+        nodeNames = self.nodeNames
+        visitedPerOwner = dict()
+        for nodeId in self.getVisitedIds(visited):
+            ownerId = owners[nodeId]
+            ownerNodes = visitedPerOwner.get(ownerId, None)
+            if ( ownerNodes is None ):
+                ownerNodes = visitedPerOwner[ownerId] = list()
+            ownerNodes.append(nodeNames[nodeId])
+        return visitedPerOwner
+
+class IdAdjacency:
+    """
+    node id -> successor ids view of a frozen InternedGraph, for the algorithms
+    working on adjacency mappings (e.g. condensation.condenseGraph)
+    """
+    def __init__(self, graphObj):
+        if ( graphObj.offsets is None ):
+            graphObj.freeze()
+        self.offsets = graphObj.offsets
+        self.targets = graphObj.targets
+
+    def get(self, nodeId, default=()):
+        if ( nodeId + 1 >= len(self.offsets) ):
+            return default
+        return self.targets[self.offsets[nodeId]:self.offsets[nodeId + 1]]
+
+def getPrefixOwner(node, ownerIds):
+    """
+    Owner whose "name." is a prefix of the node, NO_OWNER if there isn't any
+    """
+    if ( not isinstance(node, str) ):
+        return NO_OWNER
+    dotPosition = node.find(".")
+    while ( dotPosition != -1 ):
+        ownerId = ownerIds.get(node[:dotPosition], None)
+        if ( ownerId is not None ):
+            return ownerId
+        dotPosition = node.find(".", dotPosition + 1)
+    return NO_OWNER
+
+def fromAdjacency(adjGraph, ownerNames, logger, extraNodes=()):
+    """
+    Intern a node -> successors mapping, nodes prefixed with one of ownerNames
+    (ownerName.function, as added by createCompleteGraph) are owned by it
+    :param adjGraph:
+    :param ownerNames: library names used as node prefixes
+    :param logger:
+    :param extraNodes: nodes to intern even if they have no edges (e.g. start nodes)
+    :return: frozen InternedGraph
+    """
+    internedGraph = InternedGraph(logger)
+    for ownerName in ownerNames:
+        internedGraph.addOwner(ownerName)
+    ownerIds = internedGraph.ownerIds
+    internNode = internedGraph.internNode
+    edgeSources = internedGraph.edgeSources
+    edgeTargets = internedGraph.edgeTargets
+    for srcNode, successors in adjGraph.items():
+        srcId = internedGraph.nodeIds.get(srcNode, None)
+        if ( srcId is None ):
+            srcId = internNode(srcNode, getPrefixOwner(srcNode, ownerIds))
+        for dstNode in successors:
+            dstId = internedGraph.nodeIds.get(dstNode, None)
+            if ( dstId is None ):
+                dstId = internNode(dstNode, getPrefixOwner(dstNode, ownerIds))
+            edgeSources.append(srcId)
+            edgeTargets.append(dstId)
+    internedGraph.addNodes(extraNodes)
+    internedGraph.freeze()
+    logger.debug("InternedGraph created with %d nodes, %d edges and %d owners", internedGraph.getNodeCount(), len(edgeTargets), len(ownerNames))
+    return internedGraph
@@ -0,0 +1,218 @@
+import os
+import signal
+
+import contentHash
+import resultStream
+
+DEFAULT_MAX_ATTEMPTS = 3
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+class JobTimeout(Exception):
+    pass
+
+def getConfigHash(configItems):
+    """
+    Hash of everything a unit result depends on besides the unit itself (callgraph
+    files, options), results recorded with another configuration aren't reused
+    :param configItems: list of strings
+    :return:
+    """
+    return contentHash.hashStrings(configItems)
+
+def toRecordKey(unitKey):
+    return list(unitKey) if isinstance(unitKey, tuple) else unitKey
+
+def fromRecordKey(recordKey):
+    return tuple(recordKey) if isinstance(recordKey, list) else recordKey
+
+def getDescendantPids(pid):
+    """
+    Processes below pid, read from /proc (e.g. the shell and nm/objdump/ldd started
+    through python-utils, which doesn't take a timeout)
+    :param pid:
+    :return: set of pids
+    """
+    childPids = dict()
+    for entry in os.listdir("/proc"):
+        if ( not entry.isdigit() ):
+            continue
+        try:
+            with open("/proc/" + entry + "/stat") as statFile:
+                stat = statFile.read()
+        except OSError:
+            continue
+        #The command name in parentheses may contain spaces, the parent pid follows the state
+        parentPid = int(stat[stat.rindex(")") + 2:].split()[1])
+        childPids.setdefault(parentPid, list()).append(int(entry))
+    descendantPids = set()
+    pendingPids = [pid]
+    while ( pendingPids ):
+        for childPid in childPids.get(pendingPids.pop(), list()):
+            if ( childPid not in descendantPids ):
+                descendantPids.add(childPid)
+                pendingPids.append(childPid)
+    return descendantPids
+
+def killProcesses(pids):
+    """
+    SIGKILL the processes and reap those which are our own children
+    """
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    for pid in pids:
+        try:
+            os.waitpid(pid, 0)
+        except OSError:
+            #Not our child (its parent was killed as well) or already reaped
+            pass
+
+class JobRunner:
+    """
+    Picklable wrapper running the job function of a single unit, in the worker
+    processes as well. Failures (exceptions, timeouts of nm/objdump/ldd) are returned
+    instead of raised so the run carries on with the other units. On a timeout the
+    processes the unit started are killed, otherwise a hung nm/objdump/ldd outlives it.
+    """
+    def __init__(self, jobFunction, timeout=0):
+        self.jobFunction = jobFunction
+        self.timeout = timeout
+        self.previousPids = set()
+
+    def onTimeout(self, signum, frame):
+        #Killed before unwinding: a subprocess call interrupted by the exception kills and
+        #reaps its shell, which orphans the hung command beneath it
+        killProcesses(getDescendantPids(os.getpid()) - self.previousPids)
+        raise JobTimeout()
+
+    def __call__(self, job):
+        unitKey, jobArgument = job
+        previousHandler = None
+        if ( self.timeout ):
+            #Processes which already exist (e.g. pool workers when run serially) are left alone
+            self.previousPids = getDescendantPids(os.getpid())
+            previousHandler = signal.signal(signal.SIGALRM, self.onTimeout)
+            signal.alarm(self.timeout)
+        try:
+            return unitKey, self.jobFunction(jobArgument), None
+        except JobTimeout:
+            return unitKey, None, "timed out after " + str(self.timeout) + "s"
+        except Exception as e:
+            return unitKey, None, type(e).__name__ + ": " + str(e)
+        finally:
+            if ( self.timeout ):
+                signal.alarm(0)
+                signal.signal(signal.SIGALRM, previousHandler)
+
+class JobJournal:
+    """
+    Journal of the units of a batch run (libraries, artifacts, container folders), one
+    JSONL record per finished attempt with the configuration hash and the results.
+    A restarted run skips the units completed with the same configuration and only
+    redoes the failed or missing ones, a unit is given up on after maxAttempts
+    failures (counted across restarts).
+    """
+    def __init__(self, journalPath, configHash, logger, maxAttempts=DEFAULT_MAX_ATTEMPTS, encodeResults=None, decodeResults=None):
+        self.journalPath = journalPath
+        self.configHash = configHash
+        self.logger = logger
+        self.maxAttempts = maxAttempts
+        self.encodeResults = encodeResults
+        self.decodeResults = decodeResults
+        self.stream = resultStream.ResultStream(journalPath, logger)
+        self.completed = dict()
+        self.failedAttempts = dict()
+
+    def open(self, resume):
+        """
+        :param resume: load the units of the existing journal, otherwise start an empty one
+        """
+        if ( resume ):
+            self.load()
+        self.stream.open(resume)
+
+    def load(self):
+        skippedCount = 0
+        for record in self.stream.readRecords():
+            if ( record.get("config", None) != self.configHash ):
+                skippedCount += 1
+                continue
+            unitKey = fromRecordKey(record["unit"])
+            if ( record["status"] == STATUS_DONE ):
+                results = record["results"]
+                if ( self.decodeResults ):
+                    results = self.decodeResults(results)
+                self.completed[unitKey] = results
+                self.failedAttempts.pop(unitKey, None)
+            elif ( unitKey not in self.completed ):
+                self.failedAttempts[unitKey] = self.failedAttempts.get(unitKey, 0) + 1
+        if ( skippedCount ):
+            self.logger.info("Ignoring %d journal records of another configuration: %s", skippedCount, self.journalPath)
+        self.logger.info("Loaded journal %s: %d completed and %d failed units", self.journalPath, len(self.completed), len(self.failedAttempts))
+
+    def close(self):
+        self.stream.close()
+
+    def isCompleted(self, unitKey):
+        return unitKey in self.completed
+
+    def getResults(self, unitKey):
+        return self.completed.get(unitKey, None)
+
+    def getCompleted(self):
+        return self.completed
+
+    def getAttempts(self, unitKey):
+        return self.failedAttempts.get(unitKey, 0)
+
+    def shouldRun(self, unitKey):
+        return unitKey not in self.completed and self.getAttempts(unitKey) < self.maxAttempts
+
+    def recordSuccess(self, unitKey, results):
+        record = {"unit": toRecordKey(unitKey), "config": self.configHash, "status": STATUS_DONE}
+        record["results"] = self.encodeResults(results) if self.encodeResults else results
+        self.stream.appendRecord(record)
+        self.completed[unitKey] = results
+        self.failedAttempts.pop(unitKey, None)
+
+    def recordFailure(self, unitKey, error):
+        self.failedAttempts[unitKey] = self.getAttempts(unitKey) + 1
+        self.stream.appendRecord({"unit": toRecordKey(unitKey), "config": self.configHash, "status": STATUS_FAILED, "error": error})
+        self.logger.warning("Unit %s failed (attempt %d of %d): %s", str(unitKey), self.failedAttempts[unitKey], self.maxAttempts, error)
+
+    def run(self, jobs, jobFunction, pool=None, timeout=0, onResult=None):
+        """
+        Run the job function for every unit which isn't completed yet, failed units are
+        retried until they succeed or run out of attempts
+        :param jobs: list of (unitKey, argument of jobFunction)
+        :param jobFunction: picklable function (module level) if a pool is used
+        :param pool: optional multiprocessing pool, the units are run in order otherwise
+        :param timeout: seconds after which a single unit is failed, 0 for no limit
+        :param onResult: optional function called with (unitKey, results) for every unit completed by this run
+        :return: dict of unitKey -> results of all completed units (including those of previous runs)
+        """
+        jobRunner = JobRunner(jobFunction, timeout)
+        jobArguments = dict(jobs)
+        pendingJobs = [job for job in jobs if self.shouldRun(job[0])]
+        self.logger.info("Journal %s: %d of %d units to run", self.journalPath, len(pendingJobs), len(jobs))
+        while ( pendingJobs ):
+            jobResults = pool.imap_unordered(jobRunner, pendingJobs) if pool else map(jobRunner, pendingJobs)
+            retryJobs = list()
+            for unitKey, results, error in jobResults:
+                if ( error is None ):
+                    self.recordSuccess(unitKey, results)
+                    if ( onResult ):
+                        onResult(unitKey, results)
+                else:
+                    self.recordFailure(unitKey, error)
+                    if ( self.shouldRun(unitKey) ):
+                        retryJobs.append((unitKey, jobArguments[unitKey]))
+            pendingJobs = retryJobs
+        givenUpCount = len([job for job in jobs if not self.isCompleted(job[0])])
+        if ( givenUpCount ):
+            self.logger.warning("Journal %s: %d units failed %d times and were given up on", self.journalPath, givenUpCount, self.maxAttempts)
+        return self.completed
@@ -0,0 +1,71 @@
+import condensation
+
+class BoundedAdjacency:
+    """
+    node -> successors view of a graph which stops at already memoized nodes and
+    never enters the except nodes
+    """
+    def __init__(self, adjGraph, nodeLeaves, exceptNodes):
+        self.adjGraph = adjGraph
+        self.nodeLeaves = nodeLeaves
+        self.exceptNodes = exceptNodes
+
+    def get(self, node, default=None):
+        if ( node in self.nodeLeaves ):
+            return default
+        successors = self.adjGraph.get(node, None)
+        if ( not successors ):
+            return default
+        if ( self.exceptNodes ):
+            return [successor for successor in successors if successor not in self.exceptNodes]
+        return successors
+
+class LeafMemo:
+    """
+    Memoized getLeavesFromStartNode for one leaf filter and except list. A query
+    condenses only the part of the graph which isn't memoized yet, the leaves of
+    every node it reaches are kept, so later queries stop at the first memoized
+    node (e.g. the libc internals shared by fopen, open and openat).
+    The memo is only valid as long as no edges are added to the graph.
+    """
+    def __init__(self, adjGraph, leafFilter=None, exceptNodes=frozenset()):
+        self.adjGraph = adjGraph
+        self.leafFilter = leafFilter
+        self.exceptNodes = exceptNodes
+        self.nodeLeaves = dict()
+        self.boundedAdjGraph = BoundedAdjacency(adjGraph, self.nodeLeaves, exceptNodes)
+
+    def getLeaves(self, startNode):
+        """
+        :return: frozenset of the leaves (nodes without successors) reachable from startNode
+        """
+        leaves = self.nodeLeaves.get(startNode, None)
+        if ( leaves is not None ):
+            return leaves
+        adjGraph = self.adjGraph
+        leafFilter = self.leafFilter
+        nodeLeaves = self.nodeLeaves
+        componentOf, components = condensation.condenseGraph(self.boundedAdjGraph, [startNode])
+        componentSuccessors = condensation.getComponentSuccessors(self.boundedAdjGraph, componentOf, components)
+        componentLeaves = list()
+        for componentId, members in enumerate(components):
+            memoizedLeaves = nodeLeaves.get(members[0], None)
+            if ( memoizedLeaves is not None ):
+                #Boundary of this query, a single node computed by an earlier one
+                componentLeaves.append(memoizedLeaves)
+                continue
+            ownLeaves = set()
+            for member in members:
+                if ( not adjGraph.get(member, None) and (leafFilter is None or member in leafFilter) ):
+                    ownLeaves.add(member)
+            successorIds = componentSuccessors[componentId]
+            if ( not ownLeaves and len(successorIds) == 1 ):
+                leaves = componentLeaves[next(iter(successorIds))]
+            else:
+                for successorId in successorIds:
+                    ownLeaves.update(componentLeaves[successorId])
+                leaves = frozenset(ownLeaves)
+            componentLeaves.append(leaves)
+            for member in members:
+                nodeLeaves[member] = leaves
+        return nodeLeaves[startNode]
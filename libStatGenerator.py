@@ -2,13 +2,21 @@ import os, sys, subprocess, signal
 import logging
 import optparse
 import re
+import multiprocessing
 
 import piecewise
+import compiledGraph
+import corpusIndex
+import altLibraryIndex
+import contentHash
+import libcSummary
+import libraryResolver
 
 sys.path.insert(0, './python-utils/')
 
-import util
-import binaryAnalysis
+import elfSymbols
+import syscallScanner
+import jobJournal
 
 def cleanLib(libName, logger):
     logger.debug("cleanLib libName input: %s", libName)
@@ -51,7 +59,7 @@ def setLogPath(logPath):
 
 def extractAllImportedFunctionsFromElfFile(elfFilePath, logger):
     funcSet = set()
-    functionList = util.extractImportedFunctions(elfFilePath, logger)
+    functionList = elfSymbols.extractImportedFunctions(elfFilePath, logger)
     if ( not functionList ):
         logger.debug("Function extraction for file: %s failed (probably not an ELF file).", elfFilePath)
     else:
@@ -61,12 +69,138 @@ def extractAllImportedFunctionsFromElfFile(elfFilePath, logger):
 
 def usesMusl(folder, logger):
     #return True
-    for fileName in os.listdir(folder):
+    for fileName in altLibraryIndex.getIndex(folder).fileNames:
         if ( "musl" in fileName ):
             return True
     return False
 
 
+# Options, libc summaries and the libc graphs loaded so far, filled once per worker process (or once in the parent for --jobs 1)
+workerState = dict()
+
+def loadWorkerState(glibcCfgPath, muslCfgPath, otherLibCfgPathEmpty, otherLibCfgPath, libcSummaryDir, logger):
+    """
+    The libc graphs aren't loaded here, getLibcGraph loads them for the first library which needs them
+    """
+    glibcSummary = muslSummary = None
+    if ( libcSummaryDir ):
+        summaryStore = libcSummary.LibcSummaryStore(libcSummaryDir, logger)
+        glibcSummary = summaryStore.load(glibcCfgPath, ":")
+        muslSummary = summaryStore.load(muslCfgPath, "->")
+    workerState["glibcGraph"] = None
+    workerState["muslGraph"] = None
+    workerState["glibcSummary"] = glibcSummary
+    workerState["muslSummary"] = muslSummary
+    workerState["glibcCfgPath"] = glibcCfgPath
+    workerState["muslCfgPath"] = muslCfgPath
+    workerState["otherLibCfgPathEmpty"] = otherLibCfgPathEmpty
+    workerState["otherLibCfgPath"] = otherLibCfgPath
+    workerState["logger"] = logger
+
+def getLibcGraph(isMusl):
+    """
+    The musl or glibc graph with its indexes, loaded on first use (libraries which
+    only depend on libc are answered by the summary without it)
+    """
+    graphKey = "muslGraph" if isMusl else "glibcGraph"
+    if ( workerState[graphKey] is None ):
+        if ( isMusl ):
+            libcGraph = compiledGraph.loadGraph(workerState["muslCfgPath"], "->", workerState["logger"])
+        else:
+            libcGraph = compiledGraph.loadGraph(workerState["glibcCfgPath"], ":", workerState["logger"])
+        libcGraph.getSyscallIndex()
+        libcGraph.getReverseAdjacency()
+        workerState[graphKey] = libcGraph
+    return workerState[graphKey]
+
+def initWorker(glibcCfgPath, muslCfgPath, otherLibCfgPathEmpty, otherLibCfgPath, libcSummaryDir, symbolBackend, syscallScannerBackend):
+    #Workers which aren't forked (spawn, forkserver) don't inherit the backends selected in the parent
+    elfSymbols.setBackend(symbolBackend)
+    syscallScanner.setBackend(syscallScannerBackend)
+    loadWorkerState(glibcCfgPath, muslCfgPath, otherLibCfgPathEmpty, otherLibCfgPath, libcSummaryDir, logging.getLogger("coverage"))
+
+def analyzeLibrary(libraryUnit):
+    """
+    Analyze a single library: accessible system calls without and with library
+    specialization and the direct system calls
+    :param libraryUnit: (elfFilePath, altLibPath, isMusl)
+    :return: (elfSyscallsLen, elfSyscallsLibSpecLen, libDirectSyscallSetLen)
+    """
+    elfFilePath, altLibPath, isMusl = libraryUnit
+    logger = workerState["logger"]
+    logger.info("Analyzing file: %s", elfFilePath)
+    startFunctions = extractAllImportedFunctionsFromElfFile(elfFilePath, logger)
+
+    if ( isMusl ):
+        libcCfgPath = workerState["muslCfgPath"]
+        libcSummaryObj = workerState["muslSummary"]
+        separator = "->"
+    else:
+        libcCfgPath = workerState["glibcCfgPath"]
+        libcSummaryObj = workerState["glibcSummary"]
+        separator = ":"
+    libcGraphLoader = lambda: getLibcGraph(isMusl)
+
+    # Without library specialization
+    piecewiseObj = piecewise.Piecewise(elfFilePath, "", libcCfgPath, workerState["otherLibCfgPathEmpty"], logger, cfginputseparator=separator, libcSummary=libcSummaryObj, libcGraphLoader=libcGraphLoader)
+    elfSyscalls = piecewiseObj.extractAccessibleSystemCallsFromBinary(set(startFunctions), altLibPath=altLibPath, procLibraryDict=dict(), addLibcStartNodes=False)
+
+    # With library specialization
+    piecewiseObj = piecewise.Piecewise(elfFilePath, "", libcCfgPath, workerState["otherLibCfgPath"], logger, cfginputseparator=separator, libcSummary=libcSummaryObj, libcGraphLoader=libcGraphLoader)
+    elfSyscallsLibSpec = piecewiseObj.extractAccessibleSystemCallsFromBinary(set(startFunctions), altLibPath=altLibPath, procLibraryDict=dict(), addLibcStartNodes=False)
+
+    libDirectSyscallSet, successCount, failedCount = syscallScanner.extractDirectSyscalls(elfFilePath, logger)
+    if ( not libDirectSyscallSet ):
+        libDirectSyscallSet = set()
+
+    return (len(elfSyscalls), len(elfSyscallsLibSpec), len(libDirectSyscallSet))
+
+def formatStatLine(libName, libStats):
+    return libName + ";" + ";".join([str(stat) for stat in libStats]) + "\n"
+
+def writeReports(outputPath, libraryEntries, unitResults, libcRelatedList, logger):
+    """
+    Write the raw output and the unique/sorted reports in a single pass over the results
+    :param outputPath: raw output path, the reports are written to outputPath.uniq, .sorted, .sortedbydiff and .sortedbydirect
+    :param libraryEntries: list of (elfFileName, unitKey) in output order
+    :param unitResults: dict of unitKey -> (elfSyscallsLen, elfSyscallsLibSpecLen, libDirectSyscallSetLen)
+    :param libcRelatedList: libraries left out of the unique and sorted (except sortedbydirect) reports
+    :param logger:
+    :return:
+    """
+    # Cleaned library name -> (total, specialized total, specialization benefit, direct)
+    libToStats = dict()
+    missingCount = 0
+    with open(outputPath, 'w') as outputFile:
+        for elfFileName, unitKey in libraryEntries:
+            unitResult = unitResults.get(unitKey, None)
+            if ( unitResult is None ):
+                missingCount += 1
+                continue
+            elfFileNameCleaned = cleanLib(elfFileName, logger)
+            elfSyscallsLen, elfSyscallsLibSpecLen, libDirectSyscallSetLen = unitResult
+
+            #The total already includes the direct system calls, the first entry is kept unless a later one is larger
+            if ( elfFileNameCleaned not in libToStats or not libToStats[elfFileNameCleaned][0] or (elfSyscallsLen > libToStats[elfFileNameCleaned][0]) ):
+                libToStats[elfFileNameCleaned] = (elfSyscallsLen + libDirectSyscallSetLen, elfSyscallsLibSpecLen + libDirectSyscallSetLen, elfSyscallsLen - elfSyscallsLibSpecLen, libDirectSyscallSetLen)
+
+            #1. Generate raw output
+            outputFile.write(formatStatLine(elfFileName, (elfSyscallsLen, elfSyscallsLibSpecLen, elfSyscallsLen - elfSyscallsLibSpecLen, libDirectSyscallSetLen)))
+    if ( missingCount ):
+        logger.warning("%d libraries failed to be analyzed and are missing from the output, see the journal for the errors", missingCount)
+
+    #2. Generate Unique Output, 3-5. sorted by total syscalls, library specialization benefit and direct syscalls
+    filteredStats = [(libName, libStats) for libName, libStats in libToStats.items() if libName not in libcRelatedList]
+    reports = ((".uniq", filteredStats, None),
+               (".sorted", filteredStats, 0),
+               (".sortedbydiff", filteredStats, 2),
+               (".sortedbydirect", list(libToStats.items()), 3))
+    for suffix, reportStats, sortColumn in reports:
+        if ( sortColumn is not None ):
+            reportStats = sorted(reportStats, key=lambda item: item[1][sortColumn], reverse=True)
+        with open(outputPath + suffix, 'w') as reportFile:
+            reportFile.writelines([formatStatLine(libName, libStats) for libName, libStats in reportStats])
+
 if __name__ == '__main__':
     """
     Find system calls for function
@@ -93,118 +227,84 @@ if __name__ == '__main__':
     parser.add_option("", "--output", dest="output", default="libstats.out", nargs=1,
                       help="Path to output file which holds stats")
 
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", default=1, nargs=1,
+                      help="Number of libraries to analyze in parallel")
+
+    parser.add_option("", "--resume", dest="resume", action="store_true", default=False,
+                      help="Skip the libraries already completed in the journal (<output>.jsonl) of a previous, interrupted run")
+
+    parser.add_option("", "--maxattempts", dest="maxattempts", type="int", default=jobJournal.DEFAULT_MAX_ATTEMPTS, nargs=1,
+                      help="Number of times a failing library is analyzed before it's given up on (counted across --resume runs)")
+
+    parser.add_option("", "--unittimeout", dest="unittimeout", type="int", default=0, nargs=1,
+                      help="Seconds after which the analysis of a single library is failed (e.g. hanging nm, objdump or ldd), 0 for no limit")
+
+    parser.add_option("", "--libcsummary", dest="libcsummary", default=None, nargs=1,
+                      help="Libc summary store (built by buildLibcSummary.py), libraries which depend only on libc are answered from it")
+
+    parser.add_option("", "--manifest", dest="manifest", default=None, nargs=1,
+                      help="Corpus manifest path, unchanged files (size and mtime) reuse their hash from it, it is created or updated")
+
+    parser.add_option("", "--symbolbackend", dest="symbolbackend", type="choice", choices=elfSymbols.backends, default=elfSymbols.BACKEND_NM, nargs=1,
+                      help="ELF symbol extraction backend: nm (nm/objdump) or native (built-in ELF reader)")
+
+    parser.add_option("", "--syscallscanner", dest="syscallscanner", type="choice", choices=syscallScanner.backends, default=syscallScanner.BACKEND_OBJDUMP, nargs=1,
+                      help="Direct system call extraction backend: objdump (objdump -d) or native (scan the mmap'd file)")
+
     parser.add_option("-d", "--debug", dest="debug", action="store_true", default=False,
                       help="Debug enabled/disabled")
 
     (options, args) = parser.parse_args()
+    elfSymbols.setBackend(options.symbolbackend)
+    syscallScanner.setBackend(options.syscallscanner)
     if isValidOpts(options):
         rootLogger = setLogPath("libstatgenerator.log")
         libcRelatedList = ["ld", "libc", "libdl", "libcrypt", "libnss_compat", "libnsl", "libnss_files", "libnss_nis", "libpthread", "libm", "libresolv", "librt", "libutil", "libnss_dns"]
 
-        outputFile = open(options.output, 'w')
-        outputUniqFile = open(options.output + ".uniq", 'w')
-        outputSortedFile = open(options.output + ".sorted", 'w')
-        outputSortedByDiffFile = open(options.output + ".sortedbydiff", 'w')
-        outputSortedByDirectFile = open(options.output + ".sortedbydirect", 'w')
-
-        libToTotalSyscalls = dict()
-        libToSpecializedTotalSyscalls = dict()
-        libToSpecBenefit = dict()
-        libToDirectSyscalls = dict()
-
-        containerOutputPaths = os.listdir(options.folderpath)
+        # Identical library files (same content) in different containers are only analyzed once,
+        # as long as their dependencies resolve to identical files as well. The closures resolved
+        # here are inherited by the worker processes.
+        myCorpusIndex = corpusIndex.loadOrBuildIndex(options.folderpath, rootLogger, options.manifest)
+        myLibraryResolver = libraryResolver.LibraryResolver(rootLogger)
+        libraryEntries = list()
+        libraryUnits = dict()
+        closureHashesPerLibrary = dict()
+        containerOutputPaths = sorted(os.listdir(options.folderpath))
         for containerOutputPath in containerOutputPaths:
             rootLogger.info("Analyzing folder: %s", containerOutputPath)
+            # The folder is the altLibPath of all its libraries, its index is built here once
+            # and inherited by the worker processes
             isMusl = usesMusl(options.folderpath + "/" + containerOutputPath, rootLogger)
-            elfFilePaths = os.listdir(options.folderpath + "/" + containerOutputPath)
-            for elfFileName in elfFilePaths:
+            folderFiles = myCorpusIndex.getFolderFiles(containerOutputPath)
+            for elfFileName in sorted(folderFiles.keys()):
                 if ( elfFileName.startswith("lib") and "so" in elfFileName ):
-                    elfFileNameCleaned = cleanLib(elfFileName, rootLogger)
                     elfFilePath = options.folderpath + "/" + containerOutputPath + "/" + elfFileName
-                    rootLogger.info("Analyzing file: %s", elfFilePath)
-                    startFunctions = extractAllImportedFunctionsFromElfFile(elfFilePath, rootLogger)
-
-                    # Without library specialization
-                    if ( isMusl ):
-                        piecewiseObj = piecewise.Piecewise(elfFilePath, "", options.muslcfgpath, options.otherlibcfgpathempty, rootLogger, cfginputseparator="->")
-                    else:
-                        piecewiseObj = piecewise.Piecewise(elfFilePath, "", options.glibccfgpath, options.otherlibcfgpathempty, rootLogger)
-    
-                    elfSyscalls = piecewiseObj.extractAccessibleSystemCallsFromBinary(startFunctions, altLibPath=options.folderpath + "/" + containerOutputPath, procLibraryDict=dict(), addLibcStartNodes=False)
-
-                    # With library specialization
-                    if ( isMusl ):
-                        piecewiseObj = piecewise.Piecewise(elfFilePath, "", options.muslcfgpath, options.otherlibcfgpath, rootLogger, cfginputseparator="->")
-                    else:
-                        piecewiseObj = piecewise.Piecewise(elfFilePath, "", options.glibccfgpath, options.otherlibcfgpath, rootLogger)
-    
-                    elfSyscallsLibSpec = piecewiseObj.extractAccessibleSystemCallsFromBinary(startFunctions, altLibPath=options.folderpath + "/" + containerOutputPath, procLibraryDict=dict(), addLibcStartNodes=False)
-
-
-                    elfProfiler = binaryAnalysis.BinaryAnalysis(elfFilePath, rootLogger)
-                    libDirectSyscallSet, successCount, failedCount = elfProfiler.extractDirectSyscalls()
-                    if ( not libDirectSyscallSet ):
-                        libDirectSyscallSet = set()
-
-                    if ( not libToTotalSyscalls.get(elfFileNameCleaned, None) or (len(elfSyscalls) > libToTotalSyscalls[elfFileNameCleaned]) ):
-                        libToTotalSyscalls[elfFileNameCleaned] = len(elfSyscalls) + len(libDirectSyscallSet)
-                        libToSpecializedTotalSyscalls[elfFileNameCleaned] = len(elfSyscallsLibSpec) + len(libDirectSyscallSet)
-                        libToSpecBenefit[elfFileNameCleaned] = len(elfSyscalls) - len(elfSyscallsLibSpec)
-                        libToDirectSyscalls[elfFileNameCleaned] = len(libDirectSyscallSet)
-                
-                    #1. Generate raw output
-                    outputFile.write(elfFileName + ";" + str(len(elfSyscalls)) + ";" + str(len(elfSyscallsLibSpec)) + ";" + str(len(elfSyscalls) - len(elfSyscallsLibSpec)) + ";" + str(len(libDirectSyscallSet)) + "\n")
-                    outputFile.flush()
-        outputFile.close()
-
-        #2. Generate Unique Output
-        for libName, sycallCount in libToTotalSyscalls.items():
-            if ( libName not in libcRelatedList ):
-                elfSyscallsLen = libToTotalSyscalls[libName]
-                elfSyscallsLibSpecLen = libToSpecializedTotalSyscalls[libName]
-                elfSyscallsDiffLen = libToSpecBenefit[libName]
-                libDirectSyscallSetLen = libToDirectSyscalls[libName]
-                outputUniqFile.write(libName + ";" + str(elfSyscallsLen) + ";" + str(elfSyscallsLibSpecLen) + ";" + str(elfSyscallsDiffLen) + ";" + str(libDirectSyscallSetLen) + "\n")
-                outputUniqFile.flush()
-        outputUniqFile.close()
-
-        #3. Generated sorted output based on number of total syscalls
-        sortedLibToTotalSyscalls = dict(sorted(libToTotalSyscalls.items(), key=lambda item: item[1], reverse=True))
-        for libName, sycallCount in sortedLibToTotalSyscalls.items():
-            if ( libName not in libcRelatedList ):
-                elfSyscallsLen = sortedLibToTotalSyscalls[libName]
-                elfSyscallsLibSpecLen = libToSpecializedTotalSyscalls[libName]
-                elfSyscallsDiffLen = libToSpecBenefit[libName]
-                libDirectSyscallSetLen = libToDirectSyscalls[libName]
-                outputSortedFile.write(libName + ";" + str(elfSyscallsLen) + ";" + str(elfSyscallsLibSpecLen) + ";" + str(elfSyscallsDiffLen) + ";" + str(libDirectSyscallSetLen) + "\n")
-                outputSortedFile.flush()
-
-        outputSortedFile.close()
-
-
-        #4. Generated sorted output based on number of library specialization benefit
-        sortedLibToSpecBenefit = dict(sorted(libToSpecBenefit.items(), key=lambda item: item[1], reverse=True))
-        for libName, sycallCount in sortedLibToSpecBenefit.items():
-            if ( libName not in libcRelatedList ):
-                elfSyscallsLen = libToTotalSyscalls[libName]
-                elfSyscallsLibSpecLen = libToSpecializedTotalSyscalls[libName]
-                elfSyscallsDiffLen = sortedLibToSpecBenefit[libName]
-                libDirectSyscallSetLen = libToDirectSyscalls[libName]
-                outputSortedByDiffFile.write(libName + ";" + str(elfSyscallsLen) + ";" + str(elfSyscallsLibSpecLen) + ";" + str(elfSyscallsDiffLen) + ";" + str(libDirectSyscallSetLen) + "\n")
-                outputSortedByDiffFile.flush()
-
-        outputSortedByDiffFile.close()
-
-
-        #5. Generated sorted output based on number of direct syscall invocations
-        sortedLibToDirectSyscalls = dict(sorted(libToDirectSyscalls.items(), key=lambda item: item[1], reverse=True))
-        for libName, sycallCount in sortedLibToDirectSyscalls.items():
-            #if ( libName not in libcRelatedList ):
-            elfSyscallsLen = libToTotalSyscalls[libName]
-            elfSyscallsLibSpecLen = libToSpecializedTotalSyscalls[libName]
-            elfSyscallsDiffLen = sortedLibToSpecBenefit[libName]
-            libDirectSyscallSetLen = libToDirectSyscalls[libName]
-            outputSortedByDirectFile.write(libName + ";" + str(elfSyscallsLen) + ";" + str(elfSyscallsLibSpecLen) + ";" + str(elfSyscallsDiffLen) + ";" + str(libDirectSyscallSetLen) + "\n")
-            outputSortedByDirectFile.flush()
-
-        outputSortedByDirectFile.close()
+                    closureHash = myLibraryResolver.getClosureHash(elfFilePath, options.folderpath + "/" + containerOutputPath)
+                    closureHashes = closureHashesPerLibrary.setdefault(folderFiles[elfFileName], set())
+                    closureHashes.add(closureHash)
+                    if ( len(closureHashes) == 2 ):
+                        rootLogger.info("Library %s is shipped with different dependencies in several folders, it's analyzed once per dependency closure", elfFileName)
+                    unitKey = (folderFiles[elfFileName], isMusl, closureHash)
+                    if ( unitKey not in libraryUnits ):
+                        libraryUnits[unitKey] = (elfFilePath, options.folderpath + "/" + containerOutputPath, isMusl)
+                    libraryEntries.append((elfFileName, unitKey))
+        rootLogger.info("Found %d libraries, %d unique", len(libraryEntries), len(libraryUnits))
+
+        # Every analyzed library is journaled as soon as it's done, --resume skips the
+        # libraries completed by a previous run with the same callgraphs and backends
+        configHash = jobJournal.getConfigHash(["libstat", contentHash.hashFile(options.glibccfgpath), contentHash.hashFile(options.muslcfgpath), contentHash.hashFolder(options.otherlibcfgpathempty), contentHash.hashFolder(options.otherlibcfgpath), options.symbolbackend, options.syscallscanner])
+        myJobJournal = jobJournal.JobJournal(options.output + ".jsonl", configHash, rootLogger, options.maxattempts)
+        myJobJournal.open(options.resume)
+        try:
+            if ( options.jobs > 1 ):
+                # Every worker parses the glibc or musl CFG once, when a library first needs it
+                pool = multiprocessing.Pool(options.jobs, initializer=initWorker, initargs=(options.glibccfgpath, options.muslcfgpath, options.otherlibcfgpathempty, options.otherlibcfgpath, options.libcsummary, options.symbolbackend, options.syscallscanner))
+                with pool:
+                    unitResults = myJobJournal.run(list(libraryUnits.items()), analyzeLibrary, pool=pool, timeout=options.unittimeout)
+            else:
+                loadWorkerState(options.glibccfgpath, options.muslcfgpath, options.otherlibcfgpathempty, options.otherlibcfgpath, options.libcsummary, rootLogger)
+                unitResults = myJobJournal.run(list(libraryUnits.items()), analyzeLibrary, timeout=options.unittimeout)
+        finally:
+            myJobJournal.close()
+
+        writeReports(options.output, libraryEntries, unitResults, libcRelatedList, rootLogger)
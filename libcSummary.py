@@ -0,0 +1,96 @@
+import graphCache
+import contentHash
+import compiledGraph
+import syscallIndex
+
+# Bump whenever the content of the summaries changes
+SUMMARY_VERSION = "1"
+
+# Summaries already loaded by this process: store key -> LibcSummary
+loadedSummaries = dict()
+
+class LibcSummary:
+    """
+    Prebuilt libc function -> reachable system calls (bitmask) map, derived once from
+    the glibc or musl callgraph. It has the SyscallIndex interface and an empty
+    adjacency, so it can stand in for the libc graph of a binary which depends on
+    nothing but libc without loading the graph.
+    """
+    def __init__(self, cfgHash, separator, functionMasks):
+        self.cfgHash = cfgHash
+        self.separator = separator
+        self.functionMasks = functionMasks
+        self.adjGraph = dict()
+
+    def getSyscallIndex(self):
+        return self
+
+    def getSyscallMask(self, node):
+        return self.functionMasks.get(node, 0)
+
+    def getSyscallMaskFromStartNodes(self, startNodes):
+        functionMasks = self.functionMasks
+        syscallMask = 0
+        for startNode in startNodes:
+            syscallMask |= functionMasks.get(startNode, 0)
+        return syscallMask
+
+    def getSyscallsFromStartNode(self, startNode):
+        return syscallIndex.maskToSet(self.getSyscallMask(startNode))
+
+    def getSyscallsFromStartNodes(self, startNodes):
+        return syscallIndex.maskToSet(self.getSyscallMaskFromStartNodes(startNodes))
+
+def summarizeGraph(libcGraph, cfgHash, separator):
+    """
+    :param libcGraph: parsed or compiled libc graph (syscallGraph.SyscallGraph)
+    :return: LibcSummary of every function which reaches at least one system call
+    """
+    libcIndex = libcGraph.getSyscallIndex()
+    functionMasks = dict()
+    for node in libcGraph.getAllNodes():
+        if ( isinstance(node, str) ):
+            syscallMask = libcIndex.getSyscallMask(node)
+            if ( syscallMask ):
+                functionMasks[node] = syscallMask
+    return LibcSummary(cfgHash, separator, functionMasks)
+
+class LibcSummaryStore:
+    """
+    Folder of libc summaries keyed by the hash of the libc callgraph they were built
+    from, a changed callgraph never matches an old summary
+    """
+    def __init__(self, storeDir, logger):
+        self.logger = logger
+        self.summaryCache = graphCache.GraphCache(storeDir, logger, suffix=".summary")
+
+    def getKey(self, cfgPath, separator):
+        return self.summaryCache.computeKey(["libcsummary", SUMMARY_VERSION, separator, contentHash.hashFile(cfgPath)])
+
+    def load(self, cfgPath, separator):
+        """
+        :return: LibcSummary of the callgraph, None if it hasn't been built
+        """
+        key = self.getKey(cfgPath, separator)
+        summary = loadedSummaries.get(key, None)
+        if ( summary is None ):
+            summary = self.summaryCache.load(key)
+            if ( summary is None ):
+                self.logger.info("No libc summary for: %s, use buildLibcSummary.py to create it", cfgPath)
+                return None
+            loadedSummaries[key] = summary
+        return summary
+
+    def build(self, cfgPath, separator, libcGraph=None):
+        """
+        Summarize the callgraph (parsed unless an already loaded graph is given) and store it
+        :return: LibcSummary
+        """
+        if ( libcGraph is None ):
+            libcGraph = compiledGraph.loadGraph(cfgPath, separator, self.logger)
+        key = self.getKey(cfgPath, separator)
+        summary = summarizeGraph(libcGraph, contentHash.hashFile(cfgPath), separator)
+        self.summaryCache.store(key, summary)
+        loadedSummaries[key] = summary
+        self.logger.info("Stored libc summary of %s: %d functions", cfgPath, len(summary.functionMasks))
+        return summary
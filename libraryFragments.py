@@ -0,0 +1,147 @@
+import sys
+
+sys.path.insert(0, './python-utils/')
+
+import graph
+
+import graphCache
+import contentHash
+import librarySummary
+import elfSymbols
+
+# Fragments already loaded by this process, shared by all Piecewise objects
+loadedFragments = dict()
+loadedExports = dict()
+
+class LibraryFragment:
+    """
+    Everything we derive from a single library which does not depend on the binary
+    using it: the parsed callgraph, its leaf nodes, the exported functions and the
+    summary of the leaves reachable from every exported function
+    """
+    def __init__(self, key, libraryName, libraryGraph, leafNodes, exportedFunctions):
+        self.key = key
+        self.libraryName = libraryName
+        self.libraryGraph = libraryGraph
+        self.leafNodes = leafNodes
+        self.exportedFunctions = exportedFunctions
+        self.exportLeaves = None        #exported function -> frozenset of reachable leaves
+
+class LibraryFragmentStore:
+    """
+    Per-library fragment store keyed by the hash of the library callgraph and the
+    hash of the shared object. Fragments are kept in memory for the lifetime of the
+    process and persisted in a GraphCache folder so other runs can reuse them.
+    """
+    def __init__(self, storeDir, logger):
+        self.logger = logger
+        self.fragmentCache = graphCache.GraphCache(storeDir, logger, suffix=".fragment")
+
+    def getFragmentKey(self, libraryCfgFilePath, libPath, separator):
+        #The fragment embeds the exported functions, which depend on the symbol extraction backend
+        return self.fragmentCache.computeKey(["fragment", separator, elfSymbols.getBackend(), contentHash.hashFile(libraryCfgFilePath), contentHash.hashFile(libPath)])
+
+    def getExportedFunctions(self, libPath):
+        """
+        nm exports of a shared object, cached by the content of the file
+        :param libPath:
+        :return:
+        """
+        key = self.fragmentCache.computeKey(["exports", elfSymbols.getBackend(), contentHash.hashFile(libPath)])
+        exportedFunctions = loadedExports.get(key, None)
+        if ( exportedFunctions is None ):
+            exportedFunctions = self.fragmentCache.load(key)
+            if ( exportedFunctions is None ):
+                exportedFunctions = frozenset(elfSymbols.extractExportedFunctions(libPath, self.logger))
+                self.fragmentCache.store(key, exportedFunctions)
+            loadedExports[key] = exportedFunctions
+        return exportedFunctions
+
+    def getFragment(self, libraryName, libraryCfgFilePath, libPath, separator="->"):
+        """
+        Return the fragment for the library, parsing the callgraph and running nm only
+        if no other binary has used the same library (callgraph and shared object) before
+        :param libraryName:
+        :param libraryCfgFilePath:
+        :param libPath:
+        :param separator:
+        :return:
+        """
+        key = self.getFragmentKey(libraryCfgFilePath, libPath, separator)
+        fragment = loadedFragments.get(key, None)
+        if ( fragment ):
+            return fragment
+        fragment = self.fragmentCache.load(key)
+        if ( fragment is None ):
+            self.logger.debug("Creating library fragment for: %s", libraryName)
+            libraryGraph = graph.Graph(self.logger)
+            libraryGraph.createGraphFromInput(libraryCfgFilePath, separator)
+            leafNodes = frozenset(libraryGraph.getAllLeafNodes())
+            exportedFunctions = self.getExportedFunctions(libPath)
+            fragment = LibraryFragment(key, libraryName, libraryGraph, leafNodes, exportedFunctions)
+            self.fragmentCache.store(key, fragment)
+        loadedFragments[key] = fragment
+        return fragment
+
+    def getPrefixedEdges(self, fragment, prefix, nonPrefixNodes):
+        """
+        Return the edges of the library callgraph where every node which isn't in
+        nonPrefixNodes has been renamed to prefix.node
+        :param fragment:
+        :param prefix:
+        :param nonPrefixNodes:
+        :return:
+        """
+        return getNamespacedEdges(fragment.libraryGraph.adjGraph, prefix, nonPrefixNodes)
+
+    def getExportLeaves(self, fragment):
+        """
+        Return the exported function -> leaves summary of the library, computed in a
+        single pass over the library callgraph and persisted along with the fragment
+        :param fragment:
+        :return:
+        """
+        exportLeaves = getattr(fragment, "exportLeaves", None)
+        if ( exportLeaves is None ):
+            self.logger.debug("Summarizing exported functions of library: %s", fragment.libraryName)
+            exportLeaves = librarySummary.summarizeLeaves(fragment.libraryGraph.adjGraph, fragment.exportedFunctions)
+            fragment.exportLeaves = exportLeaves
+            self.fragmentCache.store(fragment.key, fragment)
+        return exportLeaves
+
+def addEdgesToGraph(targetGraph, edges):
+    for srcNode, dstNode in edges:
+        targetGraph.addEdge(srcNode, dstNode)
+
+def getNamespacedEdges(adjGraph, namespace, nonPrefixNodes):
+    """
+    In-memory equivalent of util.addPrefixToCallgraph followed by parsing the
+    prefixed file: the edges of the graph with every node which isn't in
+    nonPrefixNodes renamed to namespace.node
+    :param adjGraph: node -> successors mapping of the parsed callgraph
+    :param namespace: library or binary name
+    :param nonPrefixNodes: nodes keeping their name (exported functions, leaves)
+    :return: list of (src, dst)
+    """
+    prefix = namespace + "."
+    renamedNodes = dict()
+    edges = list()
+    for srcNode, dstNodes in adjGraph.items():
+        newSrcNode = renamedNodes.get(srcNode, None)
+        if ( newSrcNode is None ):
+            newSrcNode = srcNode if srcNode in nonPrefixNodes else prefix + srcNode
+            renamedNodes[srcNode] = newSrcNode
+        for dstNode in dstNodes:
+            newDstNode = renamedNodes.get(dstNode, None)
+            if ( newDstNode is None ):
+                newDstNode = dstNode if dstNode in nonPrefixNodes else prefix + dstNode
+                renamedNodes[dstNode] = newDstNode
+            edges.append((newSrcNode, newDstNode))
+    return edges
+
+def mergeNamespacedGraph(targetGraph, sourceGraph, namespace, nonPrefixNodes):
+    """
+    Merge an already parsed callgraph into targetGraph under a namespace, without
+    writing and re-parsing a prefixed copy of the callgraph file
+    """
+    addEdgesToGraph(targetGraph, getNamespacedEdges(sourceGraph.adjGraph, namespace, nonPrefixNodes))
@@ -0,0 +1,218 @@
+import os
+import glob
+
+import elfReader
+import graphCache
+import contentHash
+
+NOT_FOUND = "not found"
+
+# Searched after the ld.so.conf directories, like the dynamic loader does
+DEFAULT_LIBRARY_DIRS = ["/lib64", "/usr/lib64", "/lib", "/usr/lib"]
+
+# Cached closures are (libraryName -> path dict, path -> content hash dict)
+CLOSURE_FORMAT = "2"
+
+# Resolved closures already computed by this process: cache key -> cached closure
+resolvedClosures = dict()
+
+class LibraryResolver:
+    """
+    Static replacement for ldd: reads DT_NEEDED, DT_RPATH and DT_RUNPATH from the ELF
+    files and walks the dependency closure following the search order of the dynamic
+    loader, without running the binary's loader. Paths are resolved against an
+    alternate library folder (e.g. the libraries extracted from a container) first
+    and then against the system directories, optionally under a sysroot.
+    Resolved closures are cached by the hash of the binary, along with the hashes
+    of the libraries they were resolved from.
+    """
+    def __init__(self, logger, cacheDir=None, sysroot=None):
+        self.logger = logger
+        self.sysroot = sysroot
+        self.closureCache = None
+        if ( cacheDir ):
+            self.closureCache = graphCache.GraphCache(cacheDir, logger, suffix=".libs")
+        self.systemDirs = None
+        self.dynamicInfo = dict()      #path -> (neededLibraries, rpath, runpath, elfClass, interpreter)
+
+    def getSysrootPath(self, path):
+        if ( not self.sysroot ):
+            return path
+        return os.path.join(self.sysroot, path.lstrip("/"))
+
+    def readLdSoConf(self, confPath, libraryDirs, visitedFiles):
+        if ( confPath in visitedFiles or not os.path.isfile(confPath) ):
+            return
+        visitedFiles.add(confPath)
+        with open(confPath, 'r') as confFile:
+            for line in confFile:
+                line = line.split("#")[0].strip()
+                if ( not line ):
+                    continue
+                if ( line.startswith("include") ):
+                    pattern = line.split(None, 1)[1] if len(line.split(None, 1)) == 2 else ""
+                    if ( not pattern.startswith("/") ):
+                        pattern = os.path.join(os.path.dirname(confPath), pattern)
+                    else:
+                        pattern = self.getSysrootPath(pattern)
+                    for includedPath in sorted(glob.glob(pattern)):
+                        self.readLdSoConf(includedPath, libraryDirs, visitedFiles)
+                elif ( line.startswith("/") ):
+                    libraryDirs.append(self.getSysrootPath(line))
+
+    def getSystemDirs(self):
+        """
+        Directories from ld.so.conf followed by the default directories
+        """
+        if ( self.systemDirs is None ):
+            libraryDirs = list()
+            self.readLdSoConf(self.getSysrootPath("/etc/ld.so.conf"), libraryDirs, set())
+            for libraryDir in DEFAULT_LIBRARY_DIRS:
+                libraryDirs.append(self.getSysrootPath(libraryDir))
+            self.systemDirs = [libraryDir for libraryDir in libraryDirs if os.path.isdir(libraryDir)]
+        return self.systemDirs
+
+    def getDynamicInfo(self, filePath):
+        info = self.dynamicInfo.get(filePath, None)
+        if ( info is None ):
+            elfFile = elfReader.openElf(filePath, self.logger)
+            if ( elfFile is None ):
+                return None
+            with elfFile:
+                neededLibraries, rpath, runpath = elfFile.getDynamicInfo()
+                info = (neededLibraries, rpath, runpath, (elfFile.is64, elfFile.machine), elfFile.getInterpreter())
+            self.dynamicInfo[filePath] = info
+        return info
+
+    def expandSearchPath(self, searchPath, originDir):
+        expandedDirs = list()
+        for searchDir in searchPath:
+            if ( not searchDir ):
+                continue
+            if ( "$ORIGIN" in searchDir or "${ORIGIN}" in searchDir ):
+                searchDir = searchDir.replace("${ORIGIN}", originDir).replace("$ORIGIN", originDir)
+            elif ( searchDir.startswith("/") ):
+                searchDir = self.getSysrootPath(searchDir)
+            expandedDirs.append(searchDir)
+        return expandedDirs
+
+    def findLibrary(self, libraryName, searchDirs, elfClass):
+        """
+        First file named libraryName in searchDirs with the same ELF class and
+        machine as the object requesting it (skips e.g. 32-bit libraries in /usr/lib)
+        """
+        for searchDir in searchDirs:
+            candidatePath = os.path.join(searchDir, libraryName)
+            if ( not os.path.isfile(candidatePath) ):
+                continue
+            candidateInfo = self.getDynamicInfo(candidatePath)
+            if ( candidateInfo is None or candidateInfo[3] != elfClass ):
+                self.logger.debug("LibraryResolver skipping incompatible library: %s", candidatePath)
+                continue
+            return os.path.abspath(candidatePath)
+        return None
+
+    def resolveClosure(self, binaryPath, altLibPath=None):
+        """
+        :param binaryPath:
+        :param altLibPath: folder searched before any other directory
+        :return: dict libraryName -> path ("not found" if it can't be resolved), the
+        same format as util.readLibrariesWithLddWithFullname. None if binaryPath isn't
+        an ELF file. Like ldd, the program interpreter isn't part of the result.
+        """
+        binaryInfo = self.getDynamicInfo(binaryPath)
+        if ( binaryInfo is None ):
+            return None
+        binaryRpath = binaryInfo[1] if not binaryInfo[2] else list()
+        elfClass = binaryInfo[3]
+        binaryOriginDir = os.path.dirname(os.path.abspath(binaryPath))
+        altLibDirs = [altLibPath] if altLibPath else list()
+        interpreterName = os.path.basename(binaryInfo[4]) if binaryInfo[4] else None
+
+        libraryToPathDict = dict()
+        worklist = [(binaryPath, binaryInfo)]
+        while ( worklist ):
+            requesterPath, requesterInfo = worklist.pop(0)
+            neededLibraries, rpath, runpath = requesterInfo[:3]
+            originDir = os.path.dirname(os.path.abspath(requesterPath))
+            searchDirs = list(altLibDirs)
+            if ( not runpath ):
+                #DT_RPATH is ignored if DT_RUNPATH is present, the executable's DT_RPATH applies to every library
+                searchDirs.extend(self.expandSearchPath(rpath, originDir))
+                if ( requesterPath != binaryPath ):
+                    searchDirs.extend(self.expandSearchPath(binaryRpath, binaryOriginDir))
+            searchDirs.extend(self.expandSearchPath(runpath, originDir))
+            searchDirs.extend(self.getSystemDirs())
+            for libraryName in neededLibraries:
+                if ( libraryName in libraryToPathDict or libraryName == interpreterName ):
+                    continue
+                if ( "/" in libraryName ):
+                    libPath = self.getSysrootPath(libraryName) if libraryName.startswith("/") else os.path.join(originDir, libraryName)
+                    libPath = os.path.abspath(libPath) if os.path.isfile(libPath) else None
+                else:
+                    libPath = self.findLibrary(libraryName, searchDirs, elfClass)
+                if ( libPath is None ):
+                    self.logger.debug("LibraryResolver: %s needed by %s not found", libraryName, requesterPath)
+                    libraryToPathDict[libraryName] = NOT_FOUND
+                    continue
+                libraryToPathDict[libraryName] = libPath
+                libraryInfo = self.getDynamicInfo(libPath)
+                if ( libraryInfo is not None ):
+                    worklist.append((libPath, libraryInfo))
+        return libraryToPathDict
+
+    def getClosureKey(self, binaryPath, altLibPath):
+        keyComponents = ["closure", CLOSURE_FORMAT, contentHash.hashFile(binaryPath), str(self.sysroot)]
+        if ( altLibPath ):
+            keyComponents.append(os.path.abspath(altLibPath))
+        return contentHash.hashStrings(keyComponents)
+
+    def getLibraryHashes(self, libraryToPathDict):
+        return dict((libPath, contentHash.hashFile(libPath)) for libPath in libraryToPathDict.values() if libPath != NOT_FOUND)
+
+    def isClosureValid(self, libraryToPathDict, libraryHashes):
+        """
+        A closure is reused only if every library still has the content it was
+        resolved with (its own DT_NEEDED entries might have changed). Libraries
+        which weren't found might have been added since, so those are resolved again.
+        """
+        for libPath in libraryToPathDict.values():
+            if ( libPath == NOT_FOUND or contentHash.hashFile(libPath) != libraryHashes.get(libPath, None) ):
+                return False
+        return True
+
+    def getClosureHash(self, binaryPath, altLibPath=None):
+        """
+        Hash of the resolved dependency closure: every library name and the content of
+        the file it resolves to, the same binary in two folders shipping different
+        dependencies has two closure hashes
+        :return: None if binaryPath isn't an ELF file
+        """
+        libraryToPathDict = self.readLibraries(binaryPath, altLibPath)
+        if ( libraryToPathDict is None ):
+            return None
+        closureItems = list()
+        for libraryName, libPath in sorted(libraryToPathDict.items()):
+            closureItems.append(libraryName + ":" + (contentHash.hashFile(libPath) if libPath != NOT_FOUND else NOT_FOUND))
+        return contentHash.hashStrings(closureItems)
+
+    def readLibraries(self, binaryPath, altLibPath=None):
+        """
+        Cached resolveClosure, entries whose libraries have changed, disappeared or
+        weren't found are recomputed
+        """
+        key = self.getClosureKey(binaryPath, altLibPath)
+        cachedClosure = resolvedClosures.get(key, None)
+        if ( cachedClosure is None and self.closureCache ):
+            cachedClosure = self.closureCache.load(key)
+        if ( cachedClosure is not None and self.isClosureValid(*cachedClosure) ):
+            resolvedClosures[key] = cachedClosure
+            return dict(cachedClosure[0])
+        libraryToPathDict = self.resolveClosure(binaryPath, altLibPath)
+        if ( libraryToPathDict is None ):
+            return None
+        cachedClosure = (libraryToPathDict, self.getLibraryHashes(libraryToPathDict))
+        resolvedClosures[key] = cachedClosure
+        if ( self.closureCache ):
+            self.closureCache.store(key, cachedClosure)
+        return dict(libraryToPathDict)
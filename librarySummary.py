@@ -0,0 +1,48 @@
+import condensation
+
+def getAllNodes(adjGraph):
+    allNodes = set(adjGraph.keys())
+    for successors in adjGraph.values():
+        allNodes.update(successors)
+    return allNodes
+
+def summarizeLeaves(adjGraph, startNodes, leafFilter=None):
+    """
+    Compute the leaves reachable from every start node in a single pass over the graph,
+    instead of running getLeavesFromStartNode once per start node.
+    The graph is condensed into its strongly connected components and leaf sets are
+    propagated bottom-up over the condensed DAG. Identical leaf sets are interned, so
+    components which reach the same leaves share one frozenset.
+    :param adjGraph: node -> successors mapping of the library callgraph
+    :param startNodes: nodes to summarize (e.g. the exported functions of the library)
+    :param leafFilter: optional set, only leaves in this set are reported
+    :return: dict startNode -> frozenset of leaves, start nodes missing from the graph are omitted
+    """
+    allNodes = getAllNodes(adjGraph)
+    rootNodes = [node for node in startNodes if node in allNodes]
+    componentOf, components = condensation.condenseGraph(adjGraph, rootNodes)
+    componentSuccessors = condensation.getComponentSuccessors(adjGraph, componentOf, components)
+
+    internedSets = dict()
+    emptySet = frozenset()
+    internedSets[emptySet] = emptySet
+    componentLeaves = list()
+    for componentId, members in enumerate(components):
+        ownLeaves = set()
+        for member in members:
+            if ( not adjGraph.get(member, None) and (leafFilter is None or member in leafFilter) ):
+                ownLeaves.add(member)
+        successorIds = componentSuccessors[componentId]
+        if ( not ownLeaves and len(successorIds) == 1 ):
+            # Share the successor's set instead of copying it
+            componentLeaves.append(componentLeaves[next(iter(successorIds))])
+            continue
+        for successorId in successorIds:
+            ownLeaves.update(componentLeaves[successorId])
+        leaves = frozenset(ownLeaves)
+        componentLeaves.append(internedSets.setdefault(leaves, leaves))
+
+    summaries = dict()
+    for startNode in rootNodes:
+        summaries[startNode] = componentLeaves[componentOf[startNode]]
+    return summaries
@@ -0,0 +1,132 @@
+import itertools
+from collections.abc import Mapping
+
+import reachability
+import syscallGraph
+import syscallIndex
+
+class OverlayAdjacency(Mapping):
+    """
+    Read-only node -> successors view combining the base adjacency with the overlay edges
+    """
+    def __init__(self, baseAdjGraph, overlayAdjGraph):
+        self.baseAdjGraph = baseAdjGraph
+        self.overlayAdjGraph = overlayAdjGraph
+
+    def get(self, node, default=None):
+        overlaySuccessors = self.overlayAdjGraph.get(node, None)
+        baseSuccessors = self.baseAdjGraph.get(node, None)
+        if ( overlaySuccessors is None ):
+            if ( baseSuccessors is None ):
+                return default
+            return baseSuccessors
+        if ( baseSuccessors is None ):
+            return overlaySuccessors
+        return list(baseSuccessors) + overlaySuccessors
+
+    def __getitem__(self, node):
+        successors = self.get(node, None)
+        if ( successors is None ):
+            raise KeyError(node)
+        return successors
+
+    def __contains__(self, node):
+        return node in self.overlayAdjGraph or node in self.baseAdjGraph
+
+    def __iter__(self):
+        baseAdjGraph = self.baseAdjGraph
+        return itertools.chain(iter(baseAdjGraph), (node for node in self.overlayAdjGraph if node not in baseAdjGraph))
+
+    def __len__(self):
+        return len(self.baseAdjGraph) + sum(1 for node in self.overlayAdjGraph if node not in self.baseAdjGraph)
+
+class OverlayGraph(syscallGraph.SyscallGraph):
+    """
+    Graph which layers additional edges (e.g. the library CFGs of one container folder)
+    on top of an immutable base graph (the glibc or musl graph) without copying or
+    modifying it. All edges added through addEdge/createGraphFromInput go to the overlay.
+
+    System call queries reuse the reachable system call index of the base graph: only
+    nodes which can reach an overlay edge ("dirty" nodes) are traversed, for every other
+    node the precomputed base mask is used.
+    """
+    def __init__(self, baseGraph, logger):
+        syscallGraph.SyscallGraph.__init__(self, logger)
+        self.baseGraph = baseGraph
+        self.localAdjGraph = dict()
+        self.adjGraph = OverlayAdjacency(reachability.getAdjacency(baseGraph), self.localAdjGraph)
+        self.dirtyNodes = None
+        self.baseIndex = None
+        self.baseReverseAdjGraph = None
+
+    def invalidate(self):
+        syscallGraph.SyscallGraph.invalidate(self)
+        self.dirtyNodes = None
+
+    def getBaseIndex(self):
+        if ( hasattr(self.baseGraph, "getSyscallIndex") ):
+            return self.baseGraph.getSyscallIndex()
+        if ( self.baseIndex is None ):
+            self.baseIndex = syscallIndex.SyscallIndex(self.baseGraph, self.logger)
+        return self.baseIndex
+
+    def getBaseReverseAdjacency(self):
+        if ( hasattr(self.baseGraph, "getReverseAdjacency") ):
+            return self.baseGraph.getReverseAdjacency()
+        if ( self.baseReverseAdjGraph is None ):
+            self.baseReverseAdjGraph = syscallGraph.buildReverseAdjacency(reachability.getAdjacency(self.baseGraph))
+        return self.baseReverseAdjGraph
+
+    def getDirtyNodes(self):
+        """
+        Nodes which can reach a node with overlay edges, only these have a different
+        set of reachable system calls than in the base graph
+        """
+        if ( self.dirtyNodes is None ):
+            baseReverseAdjGraph = self.getBaseReverseAdjacency()
+            overlayReverseAdjGraph = dict()
+            for srcNode, successors in self.localAdjGraph.items():
+                for dstNode in successors:
+                    overlayReverseAdjGraph.setdefault(dstNode, list()).append(srcNode)
+            dirtyNodes = set(self.localAdjGraph.keys())
+            worklist = list(dirtyNodes)
+            while ( worklist ):
+                currentNode = worklist.pop()
+                for predecessor in itertools.chain(baseReverseAdjGraph.get(currentNode, ()), overlayReverseAdjGraph.get(currentNode, ())):
+                    if ( predecessor not in dirtyNodes ):
+                        dirtyNodes.add(predecessor)
+                        worklist.append(predecessor)
+            self.logger.debug("OverlayGraph: %d overlay nodes, %d dirty nodes", len(self.localAdjGraph), len(dirtyNodes))
+            self.dirtyNodes = dirtyNodes
+        return self.dirtyNodes
+
+    def getSyscallMaskFromStartNodes(self, startNodes):
+        baseIndex = self.getBaseIndex()
+        dirtyNodes = self.getDirtyNodes()
+        adjGraph = self.adjGraph
+        syscallMask = 0
+        visitedNodes = set()
+        worklist = list()
+        for startNode in startNodes:
+            if ( startNode in dirtyNodes ):
+                if ( startNode not in visitedNodes ):
+                    visitedNodes.add(startNode)
+                    worklist.append(startNode)
+            else:
+                syscallMask |= syscallIndex.getNodeMask(baseIndex, startNode)
+        while ( worklist ):
+            currentNode = worklist.pop()
+            syscallNum = reachability.getSyscallNumber(currentNode)
+            if ( syscallNum is not None ):
+                syscallMask |= 1 << syscallNum
+            for node in adjGraph.get(currentNode, ()):
+                if ( node in dirtyNodes ):
+                    if ( node not in visitedNodes ):
+                        visitedNodes.add(node)
+                        worklist.append(node)
+                else:
+                    syscallMask |= syscallIndex.getNodeMask(baseIndex, node)
+        return syscallMask
+
+    def getSyscallsFromStartNodes(self, startNodes):
+        return syscallIndex.maskToSet(self.getSyscallMaskFromStartNodes(startNodes))
@@ -1,6 +1,6 @@
 import sys
 import os
-import re
+import tempfile
 
 sys.path.insert(0, './python-utils/')
 
@@ -8,33 +8,84 @@ import util
 import graph
 import binaryAnalysis
 
+import reachability
+import graphCache
+import contentHash
+import libraryFragments
+import syscallIndex
+import overlayGraph
+import syscallScanner
+import libraryResolver
+import altLibraryIndex
+import compiledGraph
+import internedGraph
+import exceptListSweep
+import elfSymbols
+import leafMemo
+
 class Piecewise:
     libcStartNodes = ['_start', '__libc_start_main', '__libc_csu_init', 'preinit_array_start', '_init', '_dl_start', '_dl_start_final', '_dl_sysdep_start', '__mach_init', '_hurd_startup', 'dl_main', '_dl_allocate_tls_init', '_dl_start_user', '_dl_init_first', '_dl_start_user', '__poll', '__statfs', '__sendmmsg']
     # temporarily adding statfs and poll for libresolv and libpthread requirement -
     #   pthread: should be fixed in callgraph
     #   libresolv: should be provided because it is dlopened by glibc
     #   in the newest glibc (v2.34) all these libraries have been moved back into the glibc shared object (this resolves it automatically)
+    #Libraries whose functions are part of the libc callgraph
+    libcRelatedList = ["ld", "libc", "libdl", "libcrypt", "libnss_compat", "libnsl", "libnss_files", "libnss_nis", "libpthread", "libm", "libresolv", "librt", "libutil", "libnss_dns"]
     """
     This class can be used to perform debloating based on the piece-wise paper (they should've released and extendable code, but didn't)
     """
-    def __init__(self, binaryPath, binaryCfgPath, libcCfgPath, cfgPath, logger, cfginputseparator=":"):
+    def __init__(self, binaryPath, binaryCfgPath, libcCfgPath, cfgPath, logger, cfginputseparator=":", cacheDir=None, libcGraph=None, sysroot=None, libcSummary=None, libcGraphLoader=None):
         self.binaryPath = binaryPath
         self.binaryCfgPath = binaryCfgPath
         self.libcCfgPath = libcCfgPath
         self.cfgPath = cfgPath
         self.libcSeparator = cfginputseparator
         self.logger = logger
+        if ( cacheDir is None ):
+            cacheDir = os.path.join(tempfile.gettempdir(), "piecewise-cache")
+        self.cacheDir = cacheDir
+        #Optional already parsed libc graph (syscallGraph.SyscallGraph), used instead of re-reading libcCfgPath
+        if ( libcGraph is None and libcGraphLoader is None and compiledGraph.isCompiledGraph(libcCfgPath) ):
+            libcGraph = compiledGraph.CompiledGraph(libcCfgPath, logger)
+        self.libcGraph = libcGraph
+        #Optional function returning the libc graph, only called if the graph is needed (see getLibcGraph)
+        self.libcGraphLoader = libcGraphLoader
+        #Optional libcSummary.LibcSummary of libcCfgPath, answers binaries which depend on nothing but libc
+        if ( libcSummary is not None and libcSummary.cfgHash != contentHash.hashFile(libcCfgPath) ):
+            logger.warning("Ignoring libc summary which wasn't built from: %s", libcCfgPath)
+            libcSummary = None
+        self.libcSummary = libcSummary
+        self.fragmentStore = libraryFragments.LibraryFragmentStore(os.path.join(cacheDir, "fragments"), logger)
+        #Libraries are resolved from DT_NEEDED/RPATH/RUNPATH instead of running ldd
+        self.libraryResolver = libraryResolver.LibraryResolver(logger, os.path.join(cacheDir, "libraries"), sysroot)
+
+    def getLibcGraph(self):
+        """
+        :return: the already parsed libc graph, loaded through libcGraphLoader on first use, None if there's neither
+        """
+        if ( self.libcGraph is None and self.libcGraphLoader is not None ):
+            self.libcGraph = self.libcGraphLoader()
+        return self.libcGraph
+
+    def readLibraries(self, altLibPath=None):
+        """
+        dict libraryName (with version and .so) -> library path of every library the
+        binary depends on, "not found" if the library couldn't be resolved
+        Falls back to ldd if the binary can't be parsed.
+        """
+        libraryToPathDict = self.libraryResolver.readLibraries(self.binaryPath, altLibPath)
+        if ( libraryToPathDict is None ):
+            self.logger.warning("Failed to read the dynamic section of: %s, falling back to ldd", self.binaryPath)
+            libraryToPathDict = util.readLibrariesWithLddWithFullname(self.binaryPath)
+        return libraryToPathDict
 
     def getLibcStartNodes(self):
         return Piecewise.libcStartNodes
 
     def cleanLib(self, libName):
         self.logger.debug("cleanLib libName input: %s", libName)
-        if ( ".so" in libName ):
-            #libName = re.sub("-.*so",".so",libName)
-            libName = re.sub("-[0-9][0-9.]*\.so",".so",libName)
-            libName = libName[:libName.index(".so")]
-            #libName = libName + ".so"
+        #libName = re.sub("-.*so",".so",libName)
+        libName = altLibraryIndex.cleanLibName(libName)
         self.logger.debug("cleanLib libName output: %s", libName)
         return libName
 
@@ -46,28 +97,41 @@ class Piecewise:
         # 5. consider start nodes of program (probably main) and count number of accessible functions
         libcRelatedList = ["ld", "libc", "libdl", "libcrypt", "libnss_compat", "libnsl", "libnss_files", "libnss_nis", "libpthread", "libm", "libresolv", "librt", "libutil", "libnss_dns"]
 
-    def createCompleteGraph(self, exceptList=list(), altLibPath=None):
-        cacheFilePath = "/tmp/"
+    def getCompleteGraphCacheKey(self, completeGraphCache, libraryToPathDict, exceptList, altLibPath):
+        # The key covers every input of createCompleteGraph, so changing any CFG, library,
+        # the except list, the alternate library path or the backends extracting the library
+        # symbols and direct system calls results in a new cache entry
+        keyComponents = list()
+        keyComponents.append("binary:" + contentHash.hashFile(self.binaryPath))
+        keyComponents.append("binarycfg:" + contentHash.hashFile(self.binaryCfgPath))
+        keyComponents.append("libccfg:" + contentHash.hashFile(self.libcCfgPath))
+        for libraryName in sorted(libraryToPathDict.keys()):
+            libPath = libraryToPathDict[libraryName]
+            libPathInAlt = self.existsInAltPath(libraryName, altLibPath)
+            if ( libPathInAlt ):
+                libPath = libPathInAlt
+            libraryCfgFilePath = self.cfgPath + "/" + self.cleanLib(libraryName) + ".callgraph.out"
+            keyComponents.append("lib:" + libraryName + ":" + contentHash.hashFile(libPath))
+            keyComponents.append("libcfg:" + libraryName + ":" + contentHash.hashFile(libraryCfgFilePath))
+        keyComponents.append("exceptlist:" + ",".join(sorted(exceptList)))
+        keyComponents.append("symbols:" + elfSymbols.getBackend())
+        keyComponents.append("scanner:" + syscallScanner.getBackend())
+        return completeGraphCache.computeKey(keyComponents)
 
+    def createCompleteGraph(self, exceptList=list(), altLibPath=None):
         binaryName = self.binaryPath
         if ( "/" in binaryName ):
             binaryName = binaryName[binaryName.rindex('/')+1:]
 
-        graphCache = cacheFilePath + "." + binaryName + ".graph"
-        libSyscallCache = cacheFilePath + "." + binaryName + ".libsyscall"
-        libToFuncCache = cacheFilePath + "." + binaryName + ".libtofunc"
-        binNodesCache = cacheFilePath + "." + binaryName + ".binnodes"
-
-        if ( os.path.isfile(graphCache) and 
-             os.path.isfile(libSyscallCache) and
-             os.path.isfile(libToFuncCache) and
-             os.path.isfile(binNodesCache) ):
-            completeGraph = util.readDictFromFileWithPickle(graphCache)
-            librarySyscalls = util.readDictFromFileWithPickle(libSyscallCache)
-            libraryToFuncDict = util.readDictFromFileWithPickle(libToFuncCache)
-            binaryAllNodes = util.readDictFromFileWithPickle(binNodesCache)
+        libraryToPathDict = self.readLibraries(altLibPath)
+
+        completeGraphCache = graphCache.GraphCache(self.cacheDir, self.logger)
+        cacheKey = self.getCompleteGraphCacheKey(completeGraphCache, libraryToPathDict, exceptList, altLibPath)
+        cachedValue = completeGraphCache.load(cacheKey)
+        if ( cachedValue ):
+            self.logger.debug("createCompleteGraph: using cached graph for binary: %s", binaryName)
+            completeGraph, librarySyscalls, libraryToFuncDict, binaryAllNodes = cachedValue
             return completeGraph, librarySyscalls, libraryToFuncDict, binaryAllNodes
-            
 
         '''TODO
         1. Extract required libraries from binary (ldd)
@@ -83,7 +147,6 @@ class Piecewise:
         #We're removing libc from libc related list to consider it along with the other libraries
         libcRelatedList = ["ld", "libdl", "libcrypt", "libnss_compat", "libnsl", "libnss_files", "libnss_nis", "libpthread", "libm", "libresolv", "librt", "libutil", "libnss_dns"]
         librarySyscalls = set()  #Only for libraries which we DO NOT have the CFG
-        libraryToPathDict = util.readLibrariesWithLddWithFullname(self.binaryPath)
 
         libcExportedFunctions = set()   #the libc start nodes are broken among different libraries, we need them in analyzing the libc callgraph
         for libraryName, libPath in libraryToPathDict.items():
@@ -97,7 +160,7 @@ class Piecewise:
                 libraryName = self.cleanLib(libraryName)
                 if ( libraryName in libcRelatedList ):
                     if ( os.path.isfile(libPath) ):
-                        libcExportedFunctions.update(set(util.extractExportedFunctionsWithNm(libPath, self.logger)))
+                        libcExportedFunctions.update(self.fragmentStore.getExportedFunctions(libPath))
 
         libraryToFuncDict = dict()
         binaryToFuncDict = dict()
@@ -109,16 +172,15 @@ class Piecewise:
 
         completeGraph = graph.Graph(self.logger)
         binaryGraphTemp = graph.Graph(self.logger)
-        binaryGraphTemp.createGraphFromInput(self.binaryCfgPath)
+        result = binaryGraphTemp.createGraphFromInput(self.binaryCfgPath)
+        if ( result == -1 ):
+            self.logger.debug("Failed to create graph for input: %s", self.binaryCfgPath)
+            sys.exit(-1)
         binaryLeafNodes = binaryGraphTemp.getAllLeafNodes()
         nonPrefixNodes = set()
         nonPrefixNodes.add("main")
         nonPrefixNodes.update(binaryLeafNodes)
-        binaryWithPrefixCfgPath = util.addPrefixToCallgraph(self.binaryCfgPath, binaryName, nonPrefixNodes)
-        result = completeGraph.createGraphFromInput(binaryWithPrefixCfgPath)
-        if ( result == -1 ):
-            self.logger.debug("Failed to create graph for input: %s", binaryWithPrefixCfgPath)
-            sys.exit(-1)
+        libraryFragments.mergeNamespacedGraph(completeGraph, binaryGraphTemp, binaryName, nonPrefixNodes)
         binaryAllNodes = set()
         tempNodes = completeGraph.getAllNodes()
         for node in tempNodes:
@@ -151,11 +213,11 @@ class Piecewise:
                         self.logger.debug("The library call graph exists for: %s", libraryName)
 
                         #We will generate the library callgraph by itself to extract leaf nodes (should not add prefix to them)
-                        libraryGraphTemp = graph.Graph(self.logger)
-                        libraryGraphTemp.createGraphFromInput(libraryCfgFilePath)
-                        libraryLeafNodes = libraryGraphTemp.getAllLeafNodes()
+                        #The parsed callgraph, leaf nodes and exports are shared between all binaries using this library
+                        libraryFragment = self.fragmentStore.getFragment(libraryName, libraryCfgFilePath, libPath)
+                        libraryLeafNodes = libraryFragment.leafNodes
 
-                        libraryStartNodes = set(util.extractExportedFunctionsWithNm(libPath, self.logger))
+                        libraryStartNodes = set(libraryFragment.exportedFunctions)
                         if ( libraryName == "libc" ):
                             libraryStartNodes.update(libcExportedFunctions)
                         libraryToFuncDict[libraryName] = set(libraryStartNodes)  #TODO we're omitting the leaf nodes for now, because we can't differentiate between the library functions and functions called from other libraries
@@ -164,9 +226,13 @@ class Piecewise:
                         nonPrefixNodes.update(libraryLeafNodes)
                         nonPrefixNodes.update(libraryStartNodes)
                         self.logger.debug("Finished extracting start nodes for library: %s", libraryName)
-                        libraryWithPrefixCfgFilePath = util.addPrefixToCallgraph(libraryCfgFilePath, libraryName, nonPrefixNodes, separator)
+                        #The leaf nodes come from the default "->" parse, the edges use the separator of the library callgraph
+                        edgeFragment = libraryFragment
+                        if ( separator != "->" ):
+                            edgeFragment = self.fragmentStore.getFragment(libraryName, libraryCfgFilePath, libPath, separator)
+                        libraryEdges = self.fragmentStore.getPrefixedEdges(edgeFragment, libraryName, nonPrefixNodes)
                         self.logger.debug("Finished adding prefix to library functions: %s", libraryName)
-                        completeGraph.createGraphFromInput(libraryWithPrefixCfgFilePath, separator)
+                        libraryFragments.addEdgesToGraph(completeGraph, libraryEdges)
                         graphTotalNodes = completeGraph.getNodeCount()
                         self.logger.debug("Finished adding library: %s to complete graph, total nodes: %d", libraryName, graphTotalNodes)
 
@@ -194,7 +260,7 @@ class Piecewise:
                         self.logger.debug("The library call graph doesn't exist, considering all imported functions for: %s", libraryName)
                         self.logger.debug("libPath: %s", libPath)
                         libraryProfiler = binaryAnalysis.BinaryAnalysis(libPath, self.logger)
-                        directSyscallSet, successCount, failedCount  = libraryProfiler.extractDirectSyscalls()
+                        directSyscallSet, successCount, failedCount  = syscallScanner.extractDirectSyscalls(libPath, self.logger)
                         indirectSyscallSet = libraryProfiler.extractIndirectSyscalls(completeGraph)
                         self.logger.debug("libName: %s directSyscalls: %s", libraryName, str(directSyscallSet))
                         self.logger.debug("libName: %s indirectSyscalls: %s", libraryName, str(indirectSyscallSet))
@@ -208,13 +274,102 @@ class Piecewise:
             else:
                 self.logger.debug("Skipping non-library: %s in binary dependencies (can happen because of /proc", libraryName)
 
-        util.writeDictToFileWithPickle(completeGraph, graphCache)
-        util.writeDictToFileWithPickle(librarySyscalls, libSyscallCache)
-        util.writeDictToFileWithPickle(libraryToFuncDict, libToFuncCache)
-        util.writeDictToFileWithPickle(binaryAllNodes, binNodesCache)
+        completeGraphCache.store(cacheKey, (completeGraph, librarySyscalls, libraryToFuncDict, binaryAllNodes))
 
         return completeGraph, librarySyscalls, libraryToFuncDict, binaryAllNodes
 
+    def createCompleteInternedGraph(self, exceptList=list(), altLibPath=None):
+        """
+        createCompleteGraph interned to node ids (internedGraph), every library and the
+        binary own the nodes carrying their prefix. It is cached on its own, so runs
+        with a cached entry neither build nor load the graph.Graph complete graph.
+        :return: InternedGraph, librarySyscalls, libraryToFuncDict, binaryAllNodes
+        """
+        binaryName = self.binaryPath
+        if ( "/" in binaryName ):
+            binaryName = binaryName[binaryName.rindex('/')+1:]
+
+        libraryToPathDict = self.readLibraries(altLibPath)
+
+        internedGraphCache = graphCache.GraphCache(self.cacheDir, self.logger, suffix=".interned")
+        cacheKey = self.getCompleteGraphCacheKey(internedGraphCache, libraryToPathDict, exceptList, altLibPath)
+        cachedValue = internedGraphCache.load(cacheKey)
+        if ( cachedValue ):
+            self.logger.debug("createCompleteInternedGraph: using cached graph for binary: %s", binaryName)
+            return cachedValue
+
+        completeGraph, librarySyscalls, libraryToFuncDict, binaryAllNodes = self.createCompleteGraph(exceptList, altLibPath)
+        ownerNames = list(libraryToFuncDict.keys()) + [binaryName]
+        completeInternedGraph = internedGraph.fromAdjacency(reachability.getAdjacency(completeGraph), ownerNames, self.logger)
+        internedGraphCache.store(cacheKey, (completeInternedGraph, librarySyscalls, libraryToFuncDict, binaryAllNodes))
+        return completeInternedGraph, librarySyscalls, libraryToFuncDict, binaryAllNodes
+
+    def createTaggedCompleteGraph(self, altLibPath=None):
+        """
+        Same graph as createCompleteGraph without an except list, with every edge tagged
+        with the library it comes from, so any except list can be evaluated on it
+        :param altLibPath:
+        :return: exceptListSweep.TaggedGraph
+        """
+        binaryName = self.binaryPath
+        if ( "/" in binaryName ):
+            binaryName = binaryName[binaryName.rindex('/')+1:]
+
+        libraryToPathDict = self.readLibraries(altLibPath)
+        #libc is considered along with the other libraries, as in createCompleteGraph
+        libcRelatedList = [libraryName for libraryName in Piecewise.libcRelatedList if libraryName != "libc"]
+
+        libraryPaths = list()
+        libcExportedFunctions = set()
+        for libraryName, libPath in libraryToPathDict.items():
+            libPathInAlt = self.existsInAltPath(libraryName, altLibPath)
+            if ( libPathInAlt ):
+                libPath = libPathInAlt
+            if ( ".so" in libraryName ):
+                libraryPaths.append((libraryName, libPath))
+                if ( self.cleanLib(libraryName) in libcRelatedList and os.path.isfile(libPath) ):
+                    libcExportedFunctions.update(self.fragmentStore.getExportedFunctions(libPath))
+
+        taggedGraph = exceptListSweep.TaggedGraph(self.logger)
+        binaryGraphTemp = graph.Graph(self.logger)
+        result = binaryGraphTemp.createGraphFromInput(self.binaryCfgPath)
+        if ( result == -1 ):
+            self.logger.debug("Failed to create graph for input: %s", self.binaryCfgPath)
+            sys.exit(-1)
+        nonPrefixNodes = set()
+        nonPrefixNodes.add("main")
+        nonPrefixNodes.update(binaryGraphTemp.getAllLeafNodes())
+        taggedGraph.addEdges(libraryFragments.getNamespacedEdges(binaryGraphTemp.adjGraph, binaryName, nonPrefixNodes))
+
+        libWithCallgraphSet = set()
+        for libraryName, libPath in libraryPaths:
+            libraryCfgFilePath = self.cfgPath + "/" + self.cleanLib(libraryName) + ".callgraph.out"
+            libraryName = self.cleanLib(libraryName)
+            if ( libraryName not in libcRelatedList and os.path.isfile(libraryCfgFilePath) ):
+                libWithCallgraphSet.add(libraryName)
+                libraryFragment = self.fragmentStore.getFragment(libraryName, libraryCfgFilePath, libPath)
+                libraryStartNodes = set(libraryFragment.exportedFunctions)
+                if ( libraryName == "libc" ):
+                    libraryStartNodes.update(libcExportedFunctions)
+                nonPrefixNodes = set()
+                nonPrefixNodes.update(libraryFragment.leafNodes)
+                nonPrefixNodes.update(libraryStartNodes)
+                edgeFragment = libraryFragment
+                if ( libraryName == "libc" ):
+                    edgeFragment = self.fragmentStore.getFragment(libraryName, libraryCfgFilePath, libPath, ":")
+                taggedGraph.addEdges(self.fragmentStore.getPrefixedEdges(edgeFragment, libraryName, nonPrefixNodes), libraryName)
+
+        for libraryName, libPath in libraryPaths:
+            libraryName = self.cleanLib(libraryName)
+            if ( libraryName not in libWithCallgraphSet and libraryName not in libcRelatedList and os.path.isfile(libPath) ):
+                #Indirect system calls of a library without CFG are the ones reachable from its imported functions
+                directSyscallSet, successCount, failedCount = syscallScanner.extractDirectSyscalls(libPath, self.logger)
+                importedFunctions = elfSymbols.extractImportedFunctions(libPath, self.logger)
+                taggedGraph.addLibraryWithoutCfg(libraryName, directSyscallSet if directSyscallSet else set(), importedFunctions if importedFunctions else list())
+
+        self.logger.debug("createTaggedCompleteGraph: %d nodes, %d edges, libraries: %s", taggedGraph.getNodeCount(), len(taggedGraph.edgeTags), str(taggedGraph.getTagNames()))
+        return taggedGraph
+
 
         
         #for libraryName, libPath in libraryToPathDict.items():
@@ -268,41 +423,38 @@ class Piecewise:
         libraryToVisitedFuncs = dict()
         startNodes.update(Piecewise.libcStartNodes)
         #completeGraph, librarySyscalls, libraryCfgGraphs, libcGraph = self.createCompleteGraph(exceptList)
-        completeGraph, librarySyscalls, libraryToFuncDict, binaryFuncSet = self.createCompleteGraph(exceptList)
+        completeInternedGraph, librarySyscalls, libraryToFuncDict, binaryFuncSet = self.createCompleteInternedGraph(exceptList)
 
-        accessibleFuncs = set()
-        allVisitedNodes = set()
-        accessibleSyscalls = set()
-        for startNode in startNodes:
-            self.logger.debug("Iterating startNode: %s", startNode)
-            currentSyscalls, currentVisitedNodes = completeGraph.getSyscallFromStartNodeWithVisitedNodes(startNode)
-            accessibleSyscalls.update(currentSyscalls)
-            accessibleFuncs = completeGraph.dfs(startNode)
-            if ( "nginx.ngx_http_xslt_filter_preconfiguration" in accessibleFuncs ):
-                self.logger.debug("visited ngx_http_xslt_filter_preconfiguration\n")
-            allVisitedNodes.update(accessibleFuncs)
+        # Single pass over the interned complete graph seeded with every start node, every
+        # node is owned by the library whose prefix it carries
+        self.logger.debug("Traversing complete graph from %d start nodes", len(startNodes))
+        completeInternedGraph.addNodes(startNodes)
+        accessibleSyscalls, visitedIds = completeInternedGraph.traverse(startNodes)
+        if ( completeInternedGraph.isVisited(visitedIds, "nginx.ngx_http_xslt_filter_preconfiguration") ):
+            self.logger.debug("visited ngx_http_xslt_filter_preconfiguration\n")
 
         self.logger.debug("printing functions visited per library:")
+        visitedPerOwner = completeInternedGraph.getVisitedNodesPerOwner(visitedIds)
         for libraryName, libraryFuncs in libraryToFuncDict.items():
             self.logger.debug("extractAccessibleSystemCalls iterating over library: %s", libraryName)
-            libraryVisitedSet = set()
             libraryPrefix = libraryName + "."
-            for function in allVisitedNodes:
-                if ( function.startswith(libraryPrefix) or function in libraryFuncs ):
-                    functionName = function
-                    if ( function.startswith(libraryPrefix) ):
-                        functionName = function.replace(libraryPrefix, "")
-                    libraryVisitedSet.add(functionName)
-                    if ( libraryName == "libssl" and function in libraryFuncs ):
+            libraryOwnedNodes = visitedPerOwner.get(completeInternedGraph.getOwnerId(libraryName), ())
+            libraryVisitedSet = set()
+            for function in libraryOwnedNodes:
+                libraryVisitedSet.add(function.replace(libraryPrefix, ""))
+            for function in libraryFuncs:
+                if ( completeInternedGraph.isVisited(visitedIds, function) ):
+                    libraryVisitedSet.add(function)
+                    if ( libraryName == "libssl" ):
                         self.logger.debug("adding function %s to library: %s", function, libraryPrefix)
             libraryToVisitedFuncs[libraryName] = libraryVisitedSet
-            self.logger.debug("visited nodes per library: %s: %d", libraryName, len(libraryVisitedSet))
+            self.logger.debug("visited nodes per library: %s: %d (%d internal)", libraryName, len(libraryVisitedSet), len(libraryOwnedNodes))
         binaryVisitedFuncs = set()
         binaryName = self.binaryPath
         if ( "/" in binaryName ):
             binaryName = binaryName[binaryName.rindex('/')+1:]
-        for function in allVisitedNodes:
-            if ( function in binaryFuncSet ):
+        for function in binaryFuncSet:
+            if ( completeInternedGraph.isVisited(visitedIds, function) ):
                 if ( function.startswith(binaryName + ".") ):
                     function = function.replace(binaryName + ".", "")
                 if ( function.startswith("libc.") ):
@@ -320,33 +472,51 @@ class Piecewise:
         #    accessibleSyscalls.update(currentSyscalls)
         #    allVisitedNodes.update(currentVisitedNodes)
 
-        self.logger.info("Accessible library functions after library specialization: %d", len(allVisitedNodes))
+        self.logger.info("Accessible library functions after library specialization: %d", completeInternedGraph.countVisited(visitedIds))
         self.logger.info("Accessible system calls after library specialization: %d, %s", len(accessibleSyscalls), str(accessibleSyscalls))
         self.logger.info("len(librarySyscalls): %d", len(librarySyscalls))
         accessibleSyscalls.update(librarySyscalls)
         self.logger.info("Accessible system calls after adding libraries without cfg: %d, %s", len(accessibleSyscalls), str(accessibleSyscalls))
         return accessibleSyscalls, libraryToVisitedFuncs, binaryVisitedFuncs
 
+    def extractAccessibleSystemCallsForExceptLists(self, startNodes, exceptLists, altLibPath=None):
+        """
+        What-if analysis: accessible system calls (as in extractAccessibleSystemCalls)
+        for every except list, with the complete graph built and traversed only once
+        :param startNodes:
+        :param exceptLists: list of except lists
+        :param altLibPath:
+        :return: list of sets of accessible system calls, one per except list
+        """
+        startNodes = set(startNodes)
+        startNodes.update(Piecewise.libcStartNodes)
+        taggedGraph = self.createTaggedCompleteGraph(altLibPath)
+        configSyscalls = taggedGraph.evaluate(startNodes, exceptLists)
+        for exceptList, accessibleSyscalls in zip(exceptLists, configSyscalls):
+            self.logger.debug("Accessible system calls with except list %s: %d", str(sorted(exceptList)), len(accessibleSyscalls))
+        return configSyscalls
+
     def extractAccessibleSystemCallsFromIndirectFunctions(self, directCfg, separator, exceptList=list()):
         indirectFunctionToSyscallMap = dict()
 
         tempGraph = graph.Graph(self.logger)
         result = tempGraph.createGraphFromInput(self.binaryCfgPath)
         indirectFunctions = tempGraph.extractIndirectOnlyFunctions(directCfg, separator)
-        completeGraph, librarySyscalls, libraryCfgGraphs, libcGraph = self.createCompleteGraph(exceptList)
+        completeGraph, librarySyscalls, libraryToFuncDict, binaryFuncSet = self.createCompleteGraph(exceptList)
+        #Reachable system calls of every function are looked up in the index instead of traversing the graph per leaf.
+        #The leaves are taken from the complete graph, in which libc is already expanded, so an indirect-only
+        #function maps to the system call leaves it reaches without passing through another indirect-only function.
+        #(This used to query the fourth value returned by createCompleteGraph as the libc graph, which is the set
+        #of binary nodes, and failed as soon as an indirect-only function reached any leaf.)
+        completeGraphIndex = syscallIndex.SyscallIndex(completeGraph, self.logger)
+        #The except list is the same for every query, subgraphs shared by the indirect-only functions are only walked once
+        completeGraphLeaves = leafMemo.LeafMemo(reachability.getAdjacency(completeGraph), exceptNodes=frozenset(indirectFunctions))
 
         for startNode in indirectFunctions:
             accessibleFuncs = set()
-            allVisitedNodes = set()
-            accessibleSyscalls = set()
             self.logger.debug("Iterating indirect-only function: %s", startNode)
-            accessibleFuncs.update(completeGraph.getLeavesFromStartNode(startNode, list(), list(indirectFunctions)))
-
-            for accessibleFunc in accessibleFuncs:
-                self.logger.debug("Iterating accessible function: %s", accessibleFunc)
-                currentSyscalls, currentVisitedNodes = libcGraph.getSyscallFromStartNodeWithVisitedNodes(accessibleFunc)
-                accessibleSyscalls.update(currentSyscalls)
-                allVisitedNodes.update(currentVisitedNodes)
+            accessibleFuncs.update(completeGraphLeaves.getLeaves(startNode))
+            accessibleSyscalls = completeGraphIndex.getSyscallsFromStartNodes(accessibleFuncs)
             indirectFunctionToSyscallMap[startNode] = accessibleSyscalls
         return indirectFunctionToSyscallMap
 
@@ -370,23 +540,26 @@ class Piecewise:
                 Libc: entire graph
                 Other Libraries: start->leave partition
         '''
-        libcRelatedList = ["ld", "libc", "libdl", "libcrypt", "libnss_compat", "libnsl", "libnss_files", "libnss_nis", "libpthread", "libm", "libresolv", "librt", "libutil", "libnss_dns"]
+        libcRelatedList = Piecewise.libcRelatedList
         libraryCfgGraphs = dict()
         librarySyscalls = set()  #Only for libraries which we DO NOT have the CFG
         if ( procLibraryDict and len(procLibraryDict) != 0 ):
             libraryToPathDict = procLibraryDict
-            self.logger.debug("library debloating createCompleteGraphWithoutBinary library name and path received, no need for ldd")
+            self.logger.debug("library debloating createCompleteGraphWithoutBinary library name and path received, no need to resolve libraries")
         else:
-            libraryToPathDict = util.readLibrariesWithLddWithFullname(self.binaryPath)
-        #dict format: libraryName (with version and .so) -> libFullPath (might be not found if ldd is used)
+            libraryToPathDict = self.readLibraries(altLibPath)
+        #dict format: libraryName (with version and .so) -> libFullPath (might be not found)
 
         startNodeToLibDict = dict()
 
-        libcGraph = graph.Graph(self.logger)
-        libcGraph.createGraphFromInput(self.libcCfgPath, self.libcSeparator)
-
-        completeGraph = graph.Graph(self.logger)
-        result = completeGraph.createGraphFromInput(self.libcCfgPath, self.libcSeparator)
+        libcGraph = self.getLibcGraph()
+        if ( libcGraph ):
+            #Library edges are layered on top of the shared libc graph, which isn't modified
+            completeGraph = overlayGraph.OverlayGraph(libcGraph, self.logger)
+            result = 0
+        else:
+            completeGraph = graph.Graph(self.logger)
+            result = completeGraph.createGraphFromInput(self.libcCfgPath, self.libcSeparator)
 
         if ( result == -1 ):
             self.logger.debug("Failed to create graph for input: %s", self.libcCfgPath)
@@ -433,11 +606,11 @@ class Piecewise:
                         libWithCallgraphSet.add(libraryName)
                         self.logger.debug("The library call graph exists for: %s", libraryName)
 
-                        libraryGraph = graph.Graph(self.logger)
-                        libraryGraph.createGraphFromInput(libraryCfgFilePath)
+                        libraryFragment = self.fragmentStore.getFragment(libraryName, libraryCfgFilePath, libPath)
+                        libraryGraph = libraryFragment.libraryGraph
                         self.logger.debug("Finished create graph object for library: %s", libraryName)
                         #libraryStartNodes = libraryGraph.extractStartingNodes()
-                        libraryStartNodes = util.extractExportedFunctionsWithNm(libPath, self.logger)
+                        libraryStartNodes = libraryFragment.exportedFunctions
                         self.logger.debug("Finished extracting start nodes for library: %s", libraryName)
 
                         #We're going keep a copy of the full library call graph, for later stats creation
@@ -446,11 +619,13 @@ class Piecewise:
                         #(Step 3 in todo list): We're going to make a smaller graph containing only start nodes and end nodes
                         #libraryStartToEndGraph = graph.Graph(self.logger)
 
+                        #Leaves of all exported functions are computed in one pass and reused by later binaries
+                        exportLeaves = self.fragmentStore.getExportLeaves(libraryFragment)
                         for startNode in libraryStartNodes:
                             if ( startNodeToLibDict.get(startNode, None) ):
                                 self.logger.debug("library startNode seen in more than one library: %s and %s", libraryName, startNodeToLibDict[startNode])
                             startNodeToLibDict[startNode] = libraryName
-                            leaves = libraryGraph.getLeavesFromStartNode(startNode, list(), list())
+                            leaves = exportLeaves.get(startNode, ())
                             for leaf in leaves:
                                 #self.logger.debug("Adding edge %s->%s from library: %s to complete graph.", startNode, leaf, libraryName)
                                 #libraryStartToEndGraph.addEdge(startNode, leaf)
@@ -482,7 +657,7 @@ class Piecewise:
                         self.logger.debug("The library call graph doesn't exist, considering all imported functions for: %s", libraryName)
                         self.logger.debug("libPath: %s", libPath)
                         libraryProfiler = binaryAnalysis.BinaryAnalysis(libPath, self.logger)
-                        directSyscallSet, successCount, failedCount  = libraryProfiler.extractDirectSyscalls()
+                        directSyscallSet, successCount, failedCount  = syscallScanner.extractDirectSyscalls(libPath, self.logger)
                         indirectSyscallSet = libraryProfiler.extractIndirectSyscalls(completeGraph)
                         self.logger.debug("libName: %s directSyscalls: %s", libraryName, str(directSyscallSet))
                         self.logger.debug("libName: %s indirectSyscalls: %s", libraryName, str(indirectSyscallSet))
@@ -498,17 +673,34 @@ class Piecewise:
 
         return completeGraph, librarySyscalls, libraryCfgGraphs
 
+    def dependsOnlyOnLibc(self, exceptList=list(), altLibPath=None, procLibraryDict=dict()):
+        """
+        :return: True if every library of the binary is libc related or excluded, the
+                 complete graph is then the libc graph alone
+        """
+        libraryToPathDict = procLibraryDict if procLibraryDict else self.readLibraries(altLibPath)
+        for libraryName in libraryToPathDict.keys():
+            if ( ".so" in libraryName ):
+                libraryName = self.cleanLib(libraryName)
+                if ( libraryName not in Piecewise.libcRelatedList and libraryName not in exceptList ):
+                    return False
+        return True
+
     def extractAccessibleSystemCallsFromBinary(self, startNodes, exceptList=list(), altLibPath=None, procLibraryDict=dict(), addLibcStartNodes=True):
         if ( addLibcStartNodes ):
             startNodes.update(Piecewise.libcStartNodes)
+        if ( self.libcSummary and self.dependsOnlyOnLibc(exceptList, altLibPath, procLibraryDict) ):
+            accessibleSyscalls = self.libcSummary.getSyscallsFromStartNodes(startNodes)
+            self.logger.debug("Binary depends only on libc, accessible system calls from the libc summary: %d", len(accessibleSyscalls))
+            return accessibleSyscalls
         self.logger.debug("Extracting acessible system calls from binary")
         completeGraph, librarySyscalls, libraryCfgGraphs = self.createCompleteGraphWithoutBinary(exceptList, altLibPath, procLibraryDict)
 
-        accessibleSyscalls = set()
-        for startNode in startNodes:
-            currentSyscalls = completeGraph.getSyscallFromStartNode(startNode)
-            self.logger.debug("Iterating startNode: %s syscalls: %s", startNode, str(currentSyscalls))
-            accessibleSyscalls.update(currentSyscalls)
+        self.logger.debug("Traversing complete graph from %d start nodes", len(startNodes))
+        if ( self.getLibcGraph() ):
+            accessibleSyscalls = completeGraph.getSyscallsFromStartNodes(startNodes)
+        else:
+            accessibleSyscalls, visitedNodes = reachability.traverseFromStartNodes(completeGraph, startNodes)
 
         self.logger.debug("Accessible system calls after library specialization: %d, %s", len(accessibleSyscalls), str(accessibleSyscalls))
         self.logger.debug("len(librarySyscalls): %d", len(librarySyscalls))
@@ -522,17 +714,10 @@ class Piecewise:
             return None
         self.logger.debug("existsInAltPath looking for: %s", libraryName)
 
-        contents = os.listdir(altLibPath)
-
-        for fileName in contents:
-            cleanedLibName = self.cleanLib(libraryName)
-            cleanedFileName = self.cleanLib(fileName)
-            if ( cleanedLibName == cleanedFileName ):
-            #if c.find(libraryName) != -1:
-                self.logger.debug("existsInAltPath returning: %s", (os.path.abspath(altLibPath) + "/" + fileName))
-                return os.path.abspath(altLibPath) + "/" + fileName
-
-        return None
+        libPathInAlt = altLibraryIndex.getIndex(altLibPath).lookup(libraryName)
+        if ( libPathInAlt ):
+            self.logger.debug("existsInAltPath returning: %s", libPathInAlt)
+        return libPathInAlt
 
     # def getAltBinaryPath(self, libraryName, altLibPath):
     #     library = ""
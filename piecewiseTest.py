@@ -3,6 +3,7 @@ import logging
 import optparse
 
 import piecewise
+import incrementalAnalysis
 
 sys.path.insert(0, './python-utils/')
 
@@ -71,6 +72,12 @@ if __name__ == '__main__':
     parser.add_option("", "--exceptlist", dest="exceptlist", default=None, nargs=1,
                       help="Exception list")
 
+    parser.add_option("", "--exceptlists", dest="exceptlists", default=None, nargs=1,
+                      help="What-if analysis: semicolon separated except lists of comma separated libraries (e.g. libssl,libcrypto;libxml2), all evaluated on one complete graph")
+
+    parser.add_option("", "--incrementalstate", dest="incrementalstate", default=None, nargs=1,
+                      help="State file of the incremental analysis, only start nodes affected by changed libraries are re-analyzed")
+
     parser.add_option("-d", "--debug", dest="debug", action="store_true", default=False,
                       help="Debug enabled/disabled")
 
@@ -91,5 +98,16 @@ if __name__ == '__main__':
             completeGraph, librarySyscalls, libraryCfgGraphs, libcGraph = myPiecewise.createCompleteGraph(exceptList)
             allPaths = completeGraph.printAllPaths(options.startfunc, options.targetfunc)
             rootLogger.info("allPaths: %s", allPaths)
+        elif ( options.exceptlists ):
+            exceptLists = list()
+            for exceptListStr in options.exceptlists.split(";"):
+                exceptLists.append([libraryName.strip() for libraryName in exceptListStr.split(",") if libraryName.strip()])
+            configSyscalls = myPiecewise.extractAccessibleSystemCallsForExceptLists(set(startFuncs), exceptLists)
+            for exceptList, accessibleSyscalls in zip(exceptLists, configSyscalls):
+                rootLogger.info("Except list: %s accessible system calls: %d", ",".join(exceptList), len(accessibleSyscalls))
+        elif ( options.incrementalstate ):
+            myIncrementalAnalysis = incrementalAnalysis.IncrementalAnalysis(myPiecewise, options.incrementalstate, rootLogger)
+            accessibleSyscalls, addedSyscalls, removedSyscalls = myIncrementalAnalysis.extractAccessibleSystemCalls(set(startFuncs))
+            rootLogger.info("Accessible system calls: %d added: %s removed: %s", len(accessibleSyscalls), str(sorted(addedSyscalls)), str(sorted(removedSyscalls)))
         else:
             myPiecewise.extractAccessibleSystemCalls(startFuncs)
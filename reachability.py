@@ -0,0 +1,54 @@
+import re
+
+# The callgraphs spell system call leaves as "syscall(N)", "syscall ( N )" or "syscall( N )"
+syscallNodePattern = re.compile(r"^syscall\s*\(\s*([0-9]+)\s*\)$")
+
+def getSyscallNumber(node):
+    """
+    Return the system call number for a system call leaf, None for any other node
+    :param node: node name (or an already normalized integer system call node)
+    :return:
+    """
+    if ( isinstance(node, int) ):
+        return node
+    if ( not node.startswith("syscall") ):
+        return None
+    match = syscallNodePattern.match(node)
+    if ( not match ):
+        return None
+    return int(match.group(1))
+
+def getAdjacency(graphObj):
+    """
+    Return the node -> successors mapping of a graph object
+    :param graphObj:
+    :return:
+    """
+    return graphObj.adjGraph
+
+def traverseFromStartNodes(graphObj, startNodes, exceptNodes=None):
+    """
+    Multi-source traversal: seed a single worklist with all start nodes and walk
+    the graph once, instead of running one DFS per start node.
+    Shared subgraphs (e.g. libc) are only visited a single time.
+    :param graphObj: graph to traverse
+    :param startNodes: iterable of start nodes
+    :param exceptNodes: optional set of nodes which should not be entered
+    :return: set of reached system call numbers, set of visited nodes
+    """
+    adjGraph = getAdjacency(graphObj)
+    if ( exceptNodes is None ):
+        exceptNodes = set()
+    visitedNodes = set(startNodes)
+    worklist = list(visitedNodes)
+    syscalls = set()
+    while ( worklist ):
+        currentNode = worklist.pop()
+        syscallNum = getSyscallNumber(currentNode)
+        if ( syscallNum is not None ):
+            syscalls.add(syscallNum)
+        for node in adjGraph.get(currentNode, ()):
+            if ( node not in visitedNodes and node not in exceptNodes ):
+                visitedNodes.add(node)
+                worklist.append(node)
+    return syscalls, visitedNodes
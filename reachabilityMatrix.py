@@ -0,0 +1,158 @@
+import reachability
+import syscallIndex
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def masksToMatrix(syscallMasks, minColumns=0):
+    """
+    :param syscallMasks: list of system call bitmasks
+    :param minColumns: minimum number of columns of the matrix
+    :return: NumPy boolean matrix, row i is the bitmask i unpacked (column n is system call n)
+    """
+    byteCount = max([(syscallMask.bit_length() + 7) // 8 for syscallMask in syscallMasks] + [1, (minColumns + 7) // 8])
+    matrix = numpy.zeros((len(syscallMasks), byteCount * 8), dtype=bool)
+    for rowId, syscallMask in enumerate(syscallMasks):
+        if ( syscallMask ):
+            rowBytes = numpy.frombuffer(syscallMask.to_bytes(byteCount, "little"), dtype=numpy.uint8)
+            matrix[rowId] = numpy.unpackbits(rowBytes, bitorder="little").astype(bool)
+    return matrix
+
+def matrixToMasks(matrix):
+    syscallMasks = list()
+    for row in numpy.packbits(matrix, axis=1, bitorder="little"):
+        syscallMasks.append(int.from_bytes(row.tobytes(), "little"))
+    return syscallMasks
+
+class ReachabilityMatrix:
+    """
+    Group-by-syscall reachability: group g (e.g. the executables or one library of a
+    folder) reaches system call n if any of its start nodes does. Every row is kept as
+    a bitmask. The NumPy boolean matrix (if NumPy is available) is only built by the
+    first column operation over many groups, lookups of single groups don't need it.
+    """
+    def __init__(self, groupKeys, groupMasks):
+        self.groupKeys = list(groupKeys)
+        self.groupIds = dict()
+        for groupId, groupKey in enumerate(self.groupKeys):
+            self.groupIds[groupKey] = groupId
+        self.groupMasks = groupMasks
+        self.matrix = None
+
+    def getMatrix(self):
+        """
+        :return: NumPy boolean matrix of the groups, None without NumPy
+        """
+        if ( self.matrix is None and numpy is not None ):
+            self.matrix = masksToMatrix(self.groupMasks)
+        return self.matrix
+
+    def getSyscalls(self, groupKey):
+        return syscallIndex.maskToSet(self.groupMasks[self.groupIds[groupKey]])
+
+    def getSyscallsOfGroups(self, groupKeys):
+        syscallMask = 0
+        for groupKey in groupKeys:
+            syscallMask |= self.groupMasks[self.groupIds[groupKey]]
+        return syscallIndex.maskToSet(syscallMask)
+
+    def countUniqueSyscalls(self, groupKeys, otherGroupKeys):
+        """
+        :return: list with the number of system calls of every group in groupKeys which
+                 aren't reachable from any of otherGroupKeys
+        """
+        groupIds = [self.groupIds[groupKey] for groupKey in groupKeys]
+        otherGroupIds = [self.groupIds[groupKey] for groupKey in otherGroupKeys]
+        matrix = self.getMatrix()
+        if ( matrix is not None ):
+            otherColumns = matrix[otherGroupIds].any(axis=0)
+            return (matrix[groupIds] & ~otherColumns).sum(axis=1).tolist()
+        otherMask = 0
+        for groupId in otherGroupIds:
+            otherMask |= self.groupMasks[groupId]
+        return [bin(self.groupMasks[groupId] & ~otherMask).count("1") for groupId in groupIds]
+
+def fromSyscallSets(groupSyscalls):
+    """
+    :param groupSyscalls: list of (groupKey, set of system calls)
+    :return: ReachabilityMatrix
+    """
+    return ReachabilityMatrix([groupKey for groupKey, syscalls in groupSyscalls], [syscallIndex.setToMask(syscalls) for groupKey, syscalls in groupSyscalls])
+
+def computeReachabilityMatrix(graphObj, startNodeGroups, logger, syscallFilter=None):
+    """
+    System calls reachable from every group of start nodes, in one propagation over
+    the graph instead of one traversal per group. Every traversed node carries the
+    bitmask of the groups reaching it. Only the nodes without a precomputed system
+    call mask (the dirty nodes of an OverlayGraph) are traversed, the others just
+    collect the groups reaching them.
+    :param graphObj: OverlayGraph, or any graph with a reachable system call index
+    :param startNodeGroups: list of (groupKey, start nodes)
+    :param logger:
+    :param syscallFilter: optional bitmask of the system calls to report
+    :return: ReachabilityMatrix
+    """
+    if ( hasattr(graphObj, "getDirtyNodes") ):
+        baseIndex = graphObj.getBaseIndex()
+        dirtyNodes = graphObj.getDirtyNodes()
+    else:
+        baseIndex = graphObj.getSyscallIndex() if hasattr(graphObj, "getSyscallIndex") else syscallIndex.SyscallIndex(graphObj, logger)
+        dirtyNodes = frozenset()
+    adjGraph = reachability.getAdjacency(graphObj)
+
+    dirtyGroups = dict()
+    cleanGroups = dict()
+    worklist = list()
+
+    def reachNode(node, groups):
+        if ( node in dirtyNodes ):
+            currentGroups = dirtyGroups.get(node, 0)
+            if ( groups & ~currentGroups ):
+                dirtyGroups[node] = currentGroups | groups
+                worklist.append(node)
+        else:
+            cleanGroups[node] = cleanGroups.get(node, 0) | groups
+
+    for groupId, (groupKey, startNodes) in enumerate(startNodeGroups):
+        for startNode in startNodes:
+            reachNode(startNode, 1 << groupId)
+    while ( worklist ):
+        currentNode = worklist.pop()
+        groups = dirtyGroups[currentNode]
+        for node in adjGraph.get(currentNode, ()):
+            reachNode(node, groups)
+
+    #Merge the system calls of the nodes reached by the same groups
+    syscallsOfGroups = dict()
+    for node, groups in cleanGroups.items():
+        syscallMask = syscallIndex.getNodeMask(baseIndex, node)
+        if ( syscallMask ):
+            syscallsOfGroups[groups] = syscallsOfGroups.get(groups, 0) | syscallMask
+    for node, groups in dirtyGroups.items():
+        syscallNum = reachability.getSyscallNumber(node)
+        if ( syscallNum is not None ):
+            syscallsOfGroups[groups] = syscallsOfGroups.get(groups, 0) | (1 << syscallNum)
+
+    groupCount = len(startNodeGroups)
+    groupKeys = [groupKey for groupKey, startNodes in startNodeGroups]
+    if ( numpy is not None and syscallsOfGroups ):
+        #(groups x reached-by patterns) @ (patterns x syscalls)
+        patterns = list(syscallsOfGroups.keys())
+        membership = masksToMatrix(patterns, groupCount)[:, :groupCount].T.astype(numpy.int32)
+        patternSyscalls = masksToMatrix(list(syscallsOfGroups.values())).astype(numpy.int32)
+        groupMasks = matrixToMasks(numpy.matmul(membership, patternSyscalls) > 0)
+    else:
+        groupMasks = [0] * groupCount
+        for groups, syscallMask in syscallsOfGroups.items():
+            groupId = 0
+            while ( groups ):
+                if ( groups & 1 ):
+                    groupMasks[groupId] |= syscallMask
+                groups >>= 1
+                groupId += 1
+    if ( syscallFilter is not None ):
+        groupMasks = [syscallMask & syscallFilter for syscallMask in groupMasks]
+    logger.debug("Reachability matrix of %d groups: %d traversed nodes, %d reached indexed nodes", groupCount, len(dirtyGroups), len(cleanGroups))
+    return ReachabilityMatrix(groupKeys, groupMasks)
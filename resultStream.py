@@ -0,0 +1,57 @@
+import json
+import os
+
+class ResultStream:
+    """
+    Append only JSONL sink of records. Every record is written (and flushed) as soon
+    as it's produced, so a run which crashes or gets killed can be resumed from the
+    records which are already on disk. A partially written last line (crash during
+    write) is ignored on load.
+    """
+    def __init__(self, streamPath, logger):
+        self.streamPath = streamPath
+        self.logger = logger
+        self.streamFile = None
+
+    def readRecords(self):
+        """
+        :return: list of the records (dicts) already in the stream
+        """
+        records = list()
+        if ( not os.path.isfile(self.streamPath) ):
+            return records
+        with open(self.streamPath, 'r') as streamFile:
+            for line in streamFile:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    self.logger.warning("Ignoring truncated record in result stream: %s", self.streamPath)
+        return records
+
+    def open(self, resume):
+        """
+        :param resume: keep the existing records (append), otherwise start an empty stream
+        """
+        if ( resume and os.path.isfile(self.streamPath) ):
+            self.truncatePartialRecord()
+            self.streamFile = open(self.streamPath, 'a')
+        else:
+            self.streamFile = open(self.streamPath, 'w')
+
+    def truncatePartialRecord(self):
+        """
+        Drop the partially written last line, so appended records start on a new line
+        """
+        with open(self.streamPath, 'rb+') as streamFile:
+            content = streamFile.read()
+            if ( content and not content.endswith(b"\n") ):
+                streamFile.truncate(content.rfind(b"\n") + 1)
+
+    def appendRecord(self, record):
+        self.streamFile.write(json.dumps(record) + "\n")
+        self.streamFile.flush()
+
+    def close(self):
+        if ( self.streamFile ):
+            self.streamFile.close()
+            self.streamFile = None
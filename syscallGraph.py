@@ -0,0 +1,165 @@
+import os
+
+import reachability
+import syscallIndex
+import leafMemo
+
+#Leaf memos kept per graph, one per (filter list, except list), the least recently used is dropped
+MAX_LEAF_MEMOS = 4
+
+def readCallgraphEdges(inputFilePath, separator):
+    """
+    Yield the (caller, callee) pairs of a textual callgraph file
+    :param inputFilePath:
+    :param separator: ":" for glibc, "->" for musl and other libraries
+    :return:
+    """
+    with open(inputFilePath, 'r') as inputFile:
+        for inputLine in inputFile:
+            if ( inputLine.startswith("#") ):
+                continue
+            splittedInput = inputLine.split(separator)
+            if ( len(splittedInput) != 2 ):
+                continue
+            srcNode = splittedInput[0].strip()
+            dstNode = splittedInput[1].strip()
+            if ( srcNode and dstNode ):
+                yield srcNode, dstNode
+
+def buildReverseAdjacency(adjGraph):
+    """
+    Return the node -> predecessors mapping of a node -> successors mapping
+    :param adjGraph:
+    :return:
+    """
+    reverseAdjGraph = dict()
+    for srcNode, successors in adjGraph.items():
+        for dstNode in successors:
+            predecessors = reverseAdjGraph.get(dstNode, None)
+            if ( predecessors is None ):
+                predecessors = list()
+                reverseAdjGraph[dstNode] = predecessors
+            predecessors.append(srcNode)
+    return reverseAdjGraph
+
+class SyscallGraph:
+    """
+    Callgraph loader which recognizes system call leaves once, at parse time.
+    Any of the "syscall(N)", "syscall ( N )" and "syscall( N )" spellings is stored
+    as the integer N, every other node keeps its name. Traversals therefore return
+    integer system call sets directly, without a syscall filter list or string parsing.
+    """
+    def __init__(self, logger):
+        self.logger = logger
+        self.adjGraph = dict()
+        #Edges are always added to localAdjGraph, which is adjGraph itself for a plain graph
+        self.localAdjGraph = self.adjGraph
+        self.syscallIndex = None
+        self.reverseAdjGraph = None
+        self.leafMemos = dict()
+
+    def normalizeNode(self, node):
+        syscallNum = reachability.getSyscallNumber(node)
+        if ( syscallNum is not None ):
+            return syscallNum
+        return node
+
+    def invalidate(self):
+        self.syscallIndex = None
+        self.reverseAdjGraph = None
+        self.leafMemos = dict()
+
+    def addEdge(self, srcNode, dstNode):
+        srcNode = self.normalizeNode(srcNode)
+        dstNode = self.normalizeNode(dstNode)
+        successors = self.localAdjGraph.get(srcNode, None)
+        if ( successors is None ):
+            successors = list()
+            self.localAdjGraph[srcNode] = successors
+        successors.append(dstNode)
+        self.invalidate()
+
+    def createGraphFromInput(self, inputFilePath, separator="->"):
+        if ( not os.path.isfile(inputFilePath) ):
+            self.logger.error("Callgraph file doesn't exist: %s", inputFilePath)
+            return -1
+        localAdjGraph = self.localAdjGraph
+        normalizeNode = self.normalizeNode
+        edgeCount = 0
+        for srcNode, dstNode in readCallgraphEdges(inputFilePath, separator):
+            srcNode = normalizeNode(srcNode)
+            dstNode = normalizeNode(dstNode)
+            successors = localAdjGraph.get(srcNode, None)
+            if ( successors is None ):
+                successors = list()
+                localAdjGraph[srcNode] = successors
+            successors.append(dstNode)
+            edgeCount += 1
+        self.invalidate()
+        self.logger.debug("Added %d edges from callgraph: %s", edgeCount, inputFilePath)
+        return 0
+
+    def getSyscallIndex(self):
+        """
+        Reachable system call index of the graph, built on first use and dropped
+        whenever edges are added
+        """
+        if ( self.syscallIndex is None ):
+            self.syscallIndex = syscallIndex.SyscallIndex(self, self.logger)
+        return self.syscallIndex
+
+    def getReverseAdjacency(self):
+        if ( self.reverseAdjGraph is None ):
+            self.reverseAdjGraph = buildReverseAdjacency(self.adjGraph)
+        return self.reverseAdjGraph
+
+    def getAllNodes(self):
+        allNodes = set(self.adjGraph.keys())
+        for successors in self.adjGraph.values():
+            allNodes.update(successors)
+        return allNodes
+
+    def getNodeCount(self):
+        return len(self.getAllNodes())
+
+    def getAllLeafNodes(self):
+        leafNodes = set()
+        for successors in self.adjGraph.values():
+            for node in successors:
+                if ( not self.adjGraph.get(node, None) ):
+                    leafNodes.add(node)
+        return leafNodes
+
+    def getSyscallsFromStartNodes(self, startNodes):
+        syscalls, visitedNodes = reachability.traverseFromStartNodes(self, startNodes)
+        return syscalls
+
+    def getSyscallFromStartNode(self, startNode):
+        return self.getSyscallsFromStartNodes([startNode])
+
+    def getSyscallFromStartNodeWithVisitedNodes(self, startNode):
+        return reachability.traverseFromStartNodes(self, [startNode])
+
+    def dfs(self, startNode):
+        syscalls, visitedNodes = reachability.traverseFromStartNodes(self, [startNode])
+        return visitedNodes
+
+    def getLeavesFromStartNode(self, startNode, filterList, exceptList):
+        """
+        Leaves reachable from startNode, with the arguments of graph.Graph.getLeavesFromStartNode.
+        The filter and except lists may name system calls as "syscall(N)" strings or as
+        integers, they're normalized like the parsed nodes, and system call leaves are
+        returned as integers. Results are memoized per filter and except list and
+        reused by later queries reaching the same nodes, until edges are added. Only
+        the MAX_LEAF_MEMOS most recently used filter and except lists are kept.
+        """
+        normalizeNode = self.normalizeNode
+        memoKey = (frozenset(normalizeNode(node) for node in filterList), frozenset(normalizeNode(node) for node in exceptList))
+        memo = self.leafMemos.pop(memoKey, None)
+        if ( memo is None ):
+            memo = leafMemo.LeafMemo(self.adjGraph, memoKey[0] if memoKey[0] else None, memoKey[1])
+            if ( len(self.leafMemos) >= MAX_LEAF_MEMOS ):
+                del self.leafMemos[next(iter(self.leafMemos))]
+        #Reinserted last, the dict is kept in least recently used order
+        self.leafMemos[memoKey] = memo
+        return set(memo.getLeaves(startNode))
@@ -0,0 +1,102 @@
+import condensation
+import librarySummary
+import reachability
+
+# FolderAnalysis and extractElfFunctions.py have always only reported the system calls
+# below 400 (their "syscall(N)" filter list), the higher numbers are masked out
+MAX_SYSCALL_NUMBER = 400
+SYSCALL_FILTER_MASK = (1 << MAX_SYSCALL_NUMBER) - 1
+
+def maskToSet(syscallMask):
+    """
+    Convert a system call bitmask into a set of system call numbers
+    :param syscallMask:
+    :return:
+    """
+    syscalls = set()
+    while ( syscallMask ):
+        lowestBit = syscallMask & -syscallMask
+        syscalls.add(lowestBit.bit_length() - 1)
+        syscallMask ^= lowestBit
+    return syscalls
+
+def setToMask(syscalls):
+    syscallMask = 0
+    for syscallNum in syscalls:
+        syscallMask |= 1 << syscallNum
+    return syscallMask
+
+def getNodeMask(index, node):
+    """
+    :param index: SyscallIndex, or any index with getSyscallMask (compiled graph, libc summary)
+    :return: system call bitmask of the node, system call leaves missing from the index
+             contribute their own bit
+    """
+    syscallMask = index.getSyscallMask(node)
+    if ( not syscallMask ):
+        syscallNum = reachability.getSyscallNumber(node)
+        if ( syscallNum is not None ):
+            syscallMask = 1 << syscallNum
+    return syscallMask
+
+def foldSyscallMask(index, nodes, syscallMask=0):
+    """
+    Fold a stream of nodes (e.g. imported functions, as they are read) into one
+    system call bitmask, every node is looked up exactly once
+    :param index: index with getSyscallMask
+    :param nodes: iterable of nodes
+    :param syscallMask: bitmask to fold into
+    :return: bitmask
+    """
+    for node in nodes:
+        syscallMask |= getNodeMask(index, node)
+    return syscallMask
+
+class SyscallIndex:
+    """
+    Reachable system call index over a callgraph. The graph is condensed into its
+    strongly connected components and every component stores a bitmask (python int,
+    bit N set means syscall N is reachable) of the system calls reachable from it.
+    Querying a function is a dictionary lookup, querying a set of functions is an OR
+    over their masks.
+    The index is a snapshot, it has to be rebuilt if edges are added to the graph.
+    """
+    def __init__(self, graphObj, logger):
+        self.logger = logger
+        adjGraph = reachability.getAdjacency(graphObj)
+        allNodes = librarySummary.getAllNodes(adjGraph)
+        self.componentOf, components = condensation.condenseGraph(adjGraph, allNodes)
+        componentSuccessors = condensation.getComponentSuccessors(adjGraph, self.componentOf, components)
+
+        # Components are in reverse topological order, successors are always computed first
+        self.componentMasks = list()
+        for componentId, members in enumerate(components):
+            syscallMask = 0
+            for member in members:
+                syscallNum = reachability.getSyscallNumber(member)
+                if ( syscallNum is not None ):
+                    syscallMask |= 1 << syscallNum
+            for successorId in componentSuccessors[componentId]:
+                syscallMask |= self.componentMasks[successorId]
+            self.componentMasks.append(syscallMask)
+        self.logger.debug("SyscallIndex created with %d nodes and %d components", len(self.componentOf), len(components))
+
+    def getSyscallMask(self, node):
+        componentId = self.componentOf.get(node, None)
+        if ( componentId is None ):
+            return 0
+        return self.componentMasks[componentId]
+
+    def getSyscallMaskFromStartNodes(self, startNodes):
+        syscallMask = 0
+        for startNode in startNodes:
+            componentId = self.componentOf.get(startNode, None)
+            if ( componentId is not None ):
+                syscallMask |= self.componentMasks[componentId]
+        return syscallMask
+
+    def getSyscallsFromStartNode(self, startNode):
+        return maskToSet(self.getSyscallMask(startNode))
+
+    def getSyscallsFromStartNodes(self, startNodes):
+        return maskToSet(self.getSyscallMaskFromStartNodes(startNodes))
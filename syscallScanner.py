@@ -0,0 +1,492 @@
+import bisect
+import sys
+
+sys.path.insert(0, './python-utils/')
+
+import binaryAnalysis
+
+import elfReader
+
+SHF_EXECINSTR = 0x4
+SYSCALL_INSN = b"\x0f\x05"
+INT80_INSN = b"\xcd\x80"
+# How many instructions before a syscall instruction we look for the eax load
+LOOKBACK_INSTRUCTIONS = 16
+# Values above this can't be system call numbers
+MAX_SYSCALL_NUMBER = 1024
+
+# "objdump" uses binaryAnalysis.BinaryAnalysis (objdump -d), "native" scans the mmap'd file
+BACKEND_OBJDUMP = "objdump"
+BACKEND_NATIVE = "native"
+backends = [BACKEND_OBJDUMP, BACKEND_NATIVE]
+
+backend = BACKEND_OBJDUMP
+
+EAX_UNTOUCHED = 0
+EAX_KNOWN = 1
+EAX_UNKNOWN = 2
+
+# Two-byte opcodes of SSE operations whose destination is an xmm register or memory
+SSE_XMM_DESTINATION = frozenset([0x28, 0x29, 0x2a, 0x2b, 0x7c, 0x7d, 0x7f, 0xc2, 0xc6] + list(range(0x10, 0x18)) +
+                                list(range(0x51, 0x77)) + [opcode for opcode in range(0xd0, 0xff) if opcode not in (0xd7, 0xf7)])
+
+# Instruction length decoding for the linear sweep, only the length is needed here
+LEGACY_PREFIXES = frozenset((0x26, 0x2e, 0x36, 0x3e, 0x64, 0x65, 0x66, 0x67, 0xf0, 0xf2, 0xf3))
+MAX_INSTRUCTION_LENGTH = 15
+# One-byte opcodes taking a ModRM byte
+ONE_BYTE_MODRM = frozenset([opcode for opcode in range(0x40) if (opcode & 0x7) <= 3] +
+                           [0x62, 0x63, 0x69, 0x6b, 0xc0, 0xc1, 0xc4, 0xc5, 0xc6, 0xc7, 0xd0, 0xd1, 0xd2, 0xd3, 0xf6, 0xf7, 0xfe, 0xff] +
+                           list(range(0x80, 0x90)) + list(range(0xd8, 0xe0)))
+# One-byte opcodes with an 8-bit immediate or displacement
+ONE_BYTE_IMM8 = frozenset([(opcode | 0x4) for opcode in range(0, 0x40, 0x8)] +
+                          [0x6a, 0x6b, 0x80, 0x82, 0x83, 0xa8, 0xc0, 0xc1, 0xc6, 0xcd, 0xd4, 0xd5, 0xeb] +
+                          list(range(0x70, 0x80)) + list(range(0xb0, 0xb8)) + list(range(0xe0, 0xe8)))
+# One-byte opcodes with a 16/32-bit immediate depending on the operand size
+ONE_BYTE_IMMZ = frozenset([(opcode | 0x5) for opcode in range(0, 0x40, 0x8)] +
+                          [0x68, 0x69, 0x81, 0xa9, 0xc7, 0xe8, 0xe9] + list(range(0xb8, 0xc0)))
+# Two-byte (0f xx) opcodes without a ModRM byte
+TWO_BYTE_NO_MODRM = frozenset([0x04, 0x05, 0x06, 0x07, 0x08, 0x09, 0x0a, 0x0b, 0x0c, 0x0e, 0x24, 0x25, 0x26, 0x27,
+                               0x30, 0x31, 0x32, 0x33, 0x34, 0x35, 0x36, 0x37, 0x39, 0x3b, 0x3c, 0x3d, 0x3e, 0x3f,
+                               0x77, 0xa0, 0xa1, 0xa2, 0xa8, 0xa9, 0xaa] + list(range(0x80, 0x90)) + list(range(0xc8, 0xd0)))
+# Two-byte opcodes with an 8-bit immediate
+TWO_BYTE_IMM8 = frozenset((0x0f, 0x70, 0x71, 0x72, 0x73, 0xa4, 0xac, 0xba, 0xc2, 0xc4, 0xc5, 0xc6))
+# Opcodes of the VEX 0f map, the others are shown as (bad) by objdump
+VEX_MAP1_VALID = frozenset([0x41, 0x42, 0x44, 0x45, 0x46, 0x47, 0x4a, 0x4b, 0x90, 0x91, 0x92, 0x93, 0x98, 0x99, 0xae, 0xc2, 0xc4, 0xc5, 0xc6] +
+                           list(range(0x10, 0x18)) + list(range(0x28, 0x30)) + list(range(0x50, 0x80)) + list(range(0xd0, 0x100)))
+# One-byte opcodes which have no meaning in 64-bit mode, objdump shows them as (bad)
+INVALID_64 = frozenset((0x06, 0x07, 0x0e, 0x16, 0x17, 0x1e, 0x1f, 0x27, 0x2f, 0x37, 0x3f, 0x60, 0x61, 0x82, 0x9a, 0xce, 0xd4, 0xd5, 0xd6, 0xea))
+
+def setBackend(backendName):
+    global backend
+    if ( backendName not in backends ):
+        raise ValueError("Unknown direct syscall scanner backend: " + str(backendName))
+    backend = backendName
+
+def getBackend():
+    return backend
+
+def getModrmLength(code, position, end):
+    """
+    Length of a ModRM byte with its SIB byte and displacement
+    :return: length, or None if it runs past end
+    """
+    if ( position >= end ):
+        return None
+    modrm = code[position]
+    mod = modrm >> 6
+    rm = modrm & 0x7
+    length = 1
+    if ( mod != 3 and rm == 4 ):
+        if ( position + 1 >= end ):
+            return None
+        sib = code[position + 1]
+        length += 1
+        if ( mod == 0 and (sib & 0x7) == 5 ):
+            length += 4
+    if ( mod == 0 and rm == 5 ):
+        length += 4
+    elif ( mod == 1 ):
+        length += 1
+    elif ( mod == 2 ):
+        length += 4
+    if ( position + length > end ):
+        return None
+    return length
+
+def getEaxState(destination, isEaxZeroing=False):
+    if ( destination != 0 ):
+        return EAX_UNTOUCHED, None
+    if ( isEaxZeroing ):
+        return EAX_KNOWN, 0
+    return EAX_UNKNOWN, None
+
+def decodeInstruction(code, offset, end):
+    """
+    Lightweight decoder for the instructions usually found in front of system call
+    instructions (moves, ALU operations, shifts, test, lea, imul, cmovcc/setcc,
+    SSE moves, nop, push/pop), it only needs to know the length of each
+    instruction and whether it writes eax
+    :return: (length, eaxState, eaxValue) or None if the bytes are not understood
+    """
+    ssePrefix = 0
+    rex = 0
+    position = offset
+    if ( position < end and code[position] in (0x66, 0xf2, 0xf3) ):
+        ssePrefix = code[position]
+        position += 1
+    if ( position < end and 0x40 <= code[position] <= 0x4f ):
+        rex = code[position]
+        position += 1
+    if ( position >= end ):
+        return None
+    opcode = code[position]
+    if ( ssePrefix and opcode != 0x0f ):
+        return None
+    rexW = rex & 0x8
+    rexB = 0x8 if rex & 0x1 else 0
+    rexR = 0x8 if rex & 0x4 else 0
+    # mov $imm, %reg
+    if ( 0xb8 <= opcode <= 0xbf ):
+        immSize = 8 if rexW else 4
+        length = position + 1 + immSize - offset
+        if ( offset + length > end ):
+            return None
+        if ( opcode == 0xb8 and not rexB ):
+            return length, EAX_KNOWN, int.from_bytes(code[position + 1:position + 5], "little")
+        return length, EAX_UNTOUCHED, None
+    # push $imm8, later popped into eax
+    if ( opcode == 0x6a and not rex and position + 1 < end ):
+        return 2, EAX_UNTOUCHED, code[position + 1]
+    # push %reg
+    if ( 0x50 <= opcode <= 0x57 ):
+        return position + 1 - offset, EAX_UNTOUCHED, None
+    # pop %reg
+    if ( 0x58 <= opcode <= 0x5f ):
+        if ( opcode == 0x58 and not rexB ):
+            return position + 1 - offset, EAX_UNKNOWN, None
+        return position + 1 - offset, EAX_UNTOUCHED, None
+    # test %al/%eax with an immediate
+    if ( opcode in (0xa8, 0xa9) ):
+        length = position + (2 if opcode == 0xa8 else 5) - offset
+        if ( offset + length > end ):
+            return None
+        return length, EAX_UNTOUCHED, None
+    # SSE operations writing an xmm register or memory, hint nops (0f 18-1f), cmovcc,
+    # setcc, movzx/movsx, imul, bt/bts/btr/btc with an immediate, all with ModRM
+    if ( opcode == 0x0f ):
+        if ( position + 1 >= end ):
+            return None
+        secondOpcode = code[position + 1]
+        if ( not (secondOpcode in SSE_XMM_DESTINATION or secondOpcode in (0xaf, 0xb6, 0xb7, 0xba, 0xbe, 0xbf) or
+                  0x18 <= secondOpcode <= 0x1f or 0x40 <= secondOpcode <= 0x4f or 0x90 <= secondOpcode <= 0x9f) ):
+            return None
+        modrmLength = getModrmLength(code, position + 2, end)
+        if ( modrmLength is None ):
+            return None
+        length = position + 2 + modrmLength + (1 if secondOpcode in TWO_BYTE_IMM8 else 0) - offset
+        if ( offset + length > end ):
+            return None
+        modrm = code[position + 2]
+        regField = ((modrm >> 3) & 0x7) | rexR
+        rmField = (modrm & 0x7) | rexB
+        if ( secondOpcode in SSE_XMM_DESTINATION or 0x18 <= secondOpcode <= 0x1f ):
+            return length, EAX_UNTOUCHED, None
+        if ( 0x90 <= secondOpcode <= 0x9f or secondOpcode == 0xba ):
+            # bt (/4) doesn't write
+            if ( modrm >> 6 != 3 or (secondOpcode == 0xba and regField & 0x7 == 4) ):
+                return length, EAX_UNTOUCHED, None
+            eaxState, eaxValue = getEaxState(rmField)
+        else:
+            eaxState, eaxValue = getEaxState(regField)
+        return length, eaxState, eaxValue
+    immSize = 0
+    if ( opcode <= 0x3b and (opcode & 0x7) <= 3 ):
+        # ALU r/m,reg and reg,r/m forms (add, or, adc, sbb, and, sub, xor, cmp)
+        pass
+    elif ( opcode in (0x63, 0x84, 0x85, 0x88, 0x89, 0x8a, 0x8b, 0x8d, 0xd0, 0xd1, 0xd2, 0xd3) ):
+        pass
+    elif ( opcode in (0x6b, 0x80, 0x83, 0xc0, 0xc1, 0xc6) ):
+        immSize = 1
+    elif ( opcode in (0x69, 0x81, 0xc7) ):
+        immSize = 4
+    elif ( opcode in (0xf6, 0xf7) and position + 1 < end ):
+        # Only test (/0, /1) of group 3 has an immediate
+        if ( (code[position + 1] >> 3) & 0x7 <= 1 ):
+            immSize = 1 if opcode == 0xf6 else 4
+    else:
+        return None
+    modrmLength = getModrmLength(code, position + 1, end)
+    if ( modrmLength is None ):
+        return None
+    length = position + 1 + modrmLength + immSize - offset
+    if ( offset + length > end ):
+        return None
+    modrm = code[position + 1]
+    mod = modrm >> 6
+    regField = ((modrm >> 3) & 0x7) | rexR
+    rmField = (modrm & 0x7) | rexB
+    if ( opcode in (0x80, 0x81, 0x83, 0xc6, 0xc7) ):
+        # Group opcodes, /7 of the ALU group is cmp which doesn't write
+        if ( mod != 3 or (opcode in (0x80, 0x81, 0x83) and regField & 0x7 == 7) ):
+            return length, EAX_UNTOUCHED, None
+        if ( opcode == 0xc7 and rmField == 0 ):
+            return length, EAX_KNOWN, int.from_bytes(code[position + 2:position + 6], "little")
+        eaxState, eaxValue = getEaxState(rmField)
+        return length, eaxState, eaxValue
+    if ( opcode in (0x63, 0x69, 0x6b, 0x8a, 0x8b, 0x8d) ):
+        eaxState, eaxValue = getEaxState(regField)
+        return length, eaxState, eaxValue
+    if ( opcode in (0x84, 0x85) ):
+        return length, EAX_UNTOUCHED, None
+    if ( opcode in (0xf6, 0xf7) and regField & 0x7 >= 4 ):
+        # mul/imul/div/idiv write eax implicitly
+        return length, EAX_UNKNOWN, None
+    if ( opcode in (0xc0, 0xc1, 0xd0, 0xd1, 0xd2, 0xd3, 0xf6, 0xf7) ):
+        # Shifts, not/neg write their r/m operand, test doesn't write
+        if ( mod != 3 or (opcode in (0xf6, 0xf7) and regField & 0x7 <= 1) ):
+            return length, EAX_UNTOUCHED, None
+        eaxState, eaxValue = getEaxState(rmField)
+        return length, eaxState, eaxValue
+    if ( opcode in (0x88, 0x89) ):
+        if ( mod != 3 ):
+            return length, EAX_UNTOUCHED, None
+        eaxState, eaxValue = getEaxState(rmField)
+        return length, eaxState, eaxValue
+    # ALU operations, cmp (0x38-0x3b) doesn't write its destination
+    if ( opcode >= 0x38 ):
+        return length, EAX_UNTOUCHED, None
+    if ( opcode & 0x2 ):
+        destination = regField
+    elif ( mod == 3 ):
+        destination = rmField
+    else:
+        return length, EAX_UNTOUCHED, None
+    isZeroing = (mod == 3 and regField == rmField and (opcode & 0xf8) in (0x28, 0x30))
+    eaxState, eaxValue = getEaxState(destination, isZeroing)
+    return length, eaxState, eaxValue
+
+def getInstructionLength(code, offset, end, is64=True):
+    """
+    Length of any x86 instruction (legacy prefixes, REX, VEX/EVEX, the 0f, 0f38
+    and 0f3a maps), used to sweep linearly over the code like objdump -d does
+    :return: length, or None if the instruction runs past end
+    """
+    position = offset
+    operandSize16 = False
+    addressSize16 = False
+    while ( position < end and code[position] in LEGACY_PREFIXES ):
+        if ( code[position] == 0x66 ):
+            operandSize16 = True
+        elif ( code[position] == 0x67 ):
+            addressSize16 = True
+        position += 1
+    rexW = False
+    if ( is64 and position < end and 0x40 <= code[position] <= 0x4f ):
+        rexW = bool(code[position] & 0x8)
+        position += 1
+        if ( position < end and (code[position] in LEGACY_PREFIXES or 0x40 <= code[position] <= 0x4f) ):
+            # A REX prefix which isn't right in front of the opcode is ignored
+            return position - offset
+    if ( position >= end ):
+        return None
+    opcode = code[position]
+    position += 1
+    immSize = 0
+    hasModrm = False
+    if ( opcode == 0x0f ):
+        if ( position >= end ):
+            return None
+        opcode = code[position]
+        position += 1
+        if ( opcode == 0x38 ):
+            position += 1
+            hasModrm = True
+        elif ( opcode == 0x3a ):
+            position += 1
+            hasModrm = True
+            immSize = 1
+        elif ( opcode in TWO_BYTE_NO_MODRM ):
+            if ( 0x80 <= opcode <= 0x8f ):
+                immSize = 4
+        else:
+            hasModrm = True
+            if ( opcode in TWO_BYTE_IMM8 ):
+                immSize = 1
+    elif ( opcode in (0xc4, 0xc5, 0x62) and (is64 or (position < end and code[position] >> 6 == 3)) ):
+        # VEX (c4/c5) and EVEX (62) prefixes, in 32-bit mode only when they can't be les/lds/bound
+        if ( opcode == 0xc5 ):
+            opcodeMap = 1
+            position += 1
+        elif ( opcode == 0xc4 ):
+            if ( position >= end ):
+                return None
+            opcodeMap = code[position] & 0x1f
+            position += 2
+        else:
+            if ( position >= end ):
+                return None
+            opcodeMap = code[position] & 0x7
+            position += 3
+        if ( position >= end ):
+            return None
+        opcode = code[position]
+        position += 1
+        if ( opcodeMap == 1 and (opcode == 0x77 or opcode not in VEX_MAP1_VALID) ):
+            # vzeroupper/vzeroall, or (bad)
+            return position - offset
+        hasModrm = True
+        if ( opcodeMap == 3 or (opcodeMap == 1 and opcode in TWO_BYTE_IMM8) ):
+            immSize = 1
+    else:
+        if ( is64 and opcode in INVALID_64 ):
+            # Shown as (bad) by objdump, which goes on after the opcode byte
+            return position - offset
+        if ( opcode in (0xfe, 0xff) and position < end ):
+            # inc/dec are the only byte sized group 4 instructions, group 5 has no /7
+            regField = (code[position] >> 3) & 0x7
+            if ( (opcode == 0xfe and regField >= 2) or (opcode == 0xff and regField == 7) ):
+                return position - offset
+        hasModrm = opcode in ONE_BYTE_MODRM
+        if ( opcode in ONE_BYTE_IMM8 ):
+            immSize = 1
+        elif ( opcode in ONE_BYTE_IMMZ ):
+            if ( 0xb8 <= opcode <= 0xbf and rexW ):
+                immSize = 8
+            elif ( operandSize16 and not rexW and opcode not in (0xe8, 0xe9) ):
+                immSize = 2
+            else:
+                immSize = 4
+        elif ( 0xa0 <= opcode <= 0xa3 ):
+            # mov with a direct memory offset
+            if ( is64 ):
+                immSize = 4 if addressSize16 else 8
+            else:
+                immSize = 2 if addressSize16 else 4
+        elif ( opcode in (0xc2, 0xca) ):
+            immSize = 2
+        elif ( opcode == 0xc8 ):
+            immSize = 3
+        elif ( opcode in (0x9a, 0xea) ):
+            immSize = 6
+        elif ( opcode in (0xf6, 0xf7) and position < end and (code[position] >> 3) & 0x7 in (0, 1) ):
+            # test is the only group 3 instruction with an immediate
+            immSize = 1 if opcode == 0xf6 else (2 if operandSize16 and not rexW else 4)
+    if ( hasModrm ):
+        modrmLength = getModrmLength(code, position, end)
+        if ( modrmLength is None ):
+            return None
+        position += modrmLength
+    position += immSize
+    length = position - offset
+    if ( position > end or length > MAX_INSTRUCTION_LENGTH ):
+        return None
+    return length
+
+def getFunctionStarts(elfFile, section, sectionIndex):
+    """
+    File offsets where functions of the section start, from .symtab or from
+    .dynsym for stripped files, they are the points where the linear sweep
+    synchronizes with the real instruction stream
+    :return: sorted list of offsets, the section start included
+    """
+    functionStarts = {section.offset}
+    symbolTableType = elfReader.SHT_SYMTAB if elfFile.getSectionsByType(elfReader.SHT_SYMTAB) else elfReader.SHT_DYNSYM
+    for symbol in elfFile.iterSymbols(symbolTableType):
+        if ( symbol.shndx != sectionIndex or not symbol.isFunction() ):
+            continue
+        if ( section.addr <= symbol.value < section.addr + section.size ):
+            functionStarts.add(symbol.value - section.addr + section.offset)
+    return sorted(functionStarts)
+
+def findSyscallNumber(code, syscallOffset, instructionStarts):
+    """
+    Walk back from a syscall instruction over the instructions found in front of
+    it by the linear sweep to the closest one writing eax. An instruction which
+    isn't understood ends the walk, it might write eax itself.
+    :return: system call number, or None if it can't be resolved
+    """
+    instructionEnd = syscallOffset
+    for index in range(len(instructionStarts) - 1, -1, -1):
+        startOffset = instructionStarts[index]
+        decoded = decodeInstruction(code, startOffset, instructionEnd)
+        if ( decoded is None or decoded[0] != instructionEnd - startOffset ):
+            return None
+        length, eaxState, eaxValue = decoded
+        if ( eaxState == EAX_KNOWN ):
+            return eaxValue if eaxValue < MAX_SYSCALL_NUMBER else None
+        if ( eaxState == EAX_UNKNOWN ):
+            #push $imm8; pop %rax
+            if ( code[startOffset] == 0x58 and index > 0 and code[instructionStarts[index - 1]] == 0x6a ):
+                return code[instructionStarts[index - 1] + 1]
+            return None
+        instructionEnd = startOffset
+    return None
+
+def sweepToSyscalls(code, functionStart, functionEnd, syscallOffsets, instruction, is64):
+    """
+    Linear sweep from functionStart, like objdump -d a byte which doesn't decode
+    is skipped
+    :return: list of (syscallOffset, instructionStarts) for the candidate syscall
+    offsets which are on an instruction boundary
+    """
+    sites = list()
+    candidates = set(syscallOffsets)
+    lastOffset = max(syscallOffsets)
+    instructionStarts = list()
+    position = functionStart
+    while ( position <= lastOffset and position < functionEnd ):
+        if ( position in candidates ):
+            sites.append((position, instructionStarts[-LOOKBACK_INSTRUCTIONS:]))
+        instructionStarts.append(position)
+        length = getInstructionLength(code, position, functionEnd, is64)
+        position += length if length is not None else 1
+    return sites
+
+def iterDirectSyscallSites(elfFile):
+    """
+    Yield the system call instructions of the executable sections with the number
+    loaded into eax in front of them. 64-bit files are scanned for syscall, 32-bit
+    files for int 0x80. Only the byte patterns which the linear sweep from the
+    enclosing function symbol decodes as an instruction are sites, the same ones
+    objdump -d shows.
+    :param elfFile: elfReader.ElfFile
+    :return: (address, system call number or None) per site
+    """
+    instruction = SYSCALL_INSN if elfFile.is64 else INT80_INSN
+    code = elfFile.data
+    for sectionIndex, section in enumerate(elfFile.sections):
+        if ( not (section.flags & SHF_EXECINSTR) or section.sectionType == elfReader.SHT_NOBITS ):
+            continue
+        sectionStart = section.offset
+        sectionEnd = section.offset + section.size
+        candidateOffsets = list()
+        syscallOffset = code.find(instruction, sectionStart, sectionEnd)
+        while ( syscallOffset != -1 ):
+            candidateOffsets.append(syscallOffset)
+            syscallOffset = code.find(instruction, syscallOffset + 1, sectionEnd)
+        if ( not candidateOffsets ):
+            continue
+        #Only the functions containing a candidate are swept
+        functionStarts = getFunctionStarts(elfFile, section, sectionIndex)
+        functionCandidates = dict()
+        for syscallOffset in candidateOffsets:
+            functionIndex = bisect.bisect_right(functionStarts, syscallOffset) - 1
+            functionCandidates.setdefault(functionIndex, list()).append(syscallOffset)
+        for functionIndex in sorted(functionCandidates):
+            functionStart = functionStarts[functionIndex]
+            functionEnd = functionStarts[functionIndex + 1] if functionIndex + 1 < len(functionStarts) else sectionEnd
+            for syscallOffset, instructionStarts in sweepToSyscalls(code, functionStart, functionEnd, functionCandidates[functionIndex], instruction, elfFile.is64):
+                yield section.addr + syscallOffset - sectionStart, findSyscallNumber(code, syscallOffset, instructionStarts)
+
+def scanDirectSyscalls(filePath, logger):
+    """
+    Find the system call instructions in the mmap'd file and the system call
+    number loaded into eax in front of them
+    :param filePath:
+    :param logger:
+    :return: set of system call numbers, number of sites with a resolved number, number of unresolved sites
+    """
+    syscallSet = set()
+    successCount = 0
+    failedCount = 0
+    elfFile = elfReader.openElf(filePath, logger)
+    if ( elfFile is None ):
+        return syscallSet, successCount, failedCount
+    with elfFile:
+        for address, syscallNum in iterDirectSyscallSites(elfFile):
+            if ( syscallNum is None ):
+                failedCount += 1
+                logger.debug("scanDirectSyscalls: couldn't resolve syscall number at address: %s in %s", hex(address), filePath)
+            else:
+                successCount += 1
+                syscallSet.add(syscallNum)
+    return syscallSet, successCount, failedCount
+
+def extractDirectSyscalls(filePath, logger):
+    """
+    Same result as binaryAnalysis.BinaryAnalysis(filePath, logger).extractDirectSyscalls()
+    using the selected backend
+    """
+    if ( backend == BACKEND_NATIVE ):
+        return scanDirectSyscalls(filePath, logger)
+    return binaryAnalysis.BinaryAnalysis(filePath, logger).extractDirectSyscalls()
@@ -0,0 +1,69 @@
+import logging
+import optparse
+import sys
+
+sys.path.insert(0, './python-utils/')
+
+import piecewise
+
+def parseExceptLists(exceptListsStr):
+    """
+    :param exceptListsStr: "libssl,libcrypto;libxml2;" (an empty list keeps every library)
+    :return: list of except lists
+    """
+    exceptLists = list()
+    for exceptListStr in exceptListsStr.split(";"):
+        exceptLists.append([libraryName.strip() for libraryName in exceptListStr.split(",") if libraryName.strip()])
+    return exceptLists
+
+def compareWithPerListAnalysis(options, startFuncs, exceptLists, logger):
+    """
+    Evaluate all except lists on the tagged complete graph and compare every result
+    with extractAccessibleSystemCalls run with that except list alone
+    :return: list of mismatch descriptions, empty if both agree
+    """
+    sweepPiecewise = piecewise.Piecewise(options.binarypath, options.binarycfgpath, options.libccfgpath, options.otherlibcfgpath, logger)
+    configSyscalls = sweepPiecewise.extractAccessibleSystemCallsForExceptLists(set(startFuncs), exceptLists)
+    mismatches = list()
+    for exceptList, sweepSyscalls in zip(exceptLists, configSyscalls):
+        #A new object per except list, nothing of the other runs is reused
+        listPiecewise = piecewise.Piecewise(options.binarypath, options.binarycfgpath, options.libccfgpath, options.otherlibcfgpath, logger)
+        referenceSyscalls = set(listPiecewise.extractAccessibleSystemCalls(set(startFuncs), exceptList)[0])
+        logger.info("Except list: %s sweep: %d per list: %d", ",".join(exceptList), len(sweepSyscalls), len(referenceSyscalls))
+        if ( set(sweepSyscalls) != referenceSyscalls ):
+            mismatches.append("except list " + ",".join(exceptList) + ": missing " + str(sorted(referenceSyscalls - set(sweepSyscalls))) + " extra " + str(sorted(set(sweepSyscalls) - referenceSyscalls)))
+    return mismatches
+
+if __name__ == '__main__':
+    usage = "Usage: %prog --binarypath <Binary Path> --binarycfgpath <Binary call graph> --libccfgpath <Libc call graph path> --otherlibcfgpath <Path to folder containing other libraries' cfg> --exceptlists <lib1,lib2;lib3>"
+
+    parser = optparse.OptionParser(usage=usage, version="1")
+
+    parser.add_option("", "--binarypath", dest="binarypath", default=None, nargs=1,
+                      help="Binary path")
+
+    parser.add_option("", "--binarycfgpath", dest="binarycfgpath", default=None, nargs=1,
+                      help="Binary call graph path")
+
+    parser.add_option("", "--libccfgpath", dest="libccfgpath", default=None, nargs=1,
+                      help="Libc call graph path")
+
+    parser.add_option("", "--otherlibcfgpath", dest="otherlibcfgpath", default=None, nargs=1,
+                      help="Path to folder containing other libraries' cfg")
+
+    parser.add_option("", "--startfunc", dest="startfunc", default="main", nargs=1,
+                      help="Comma separated start functions")
+
+    parser.add_option("", "--exceptlists", dest="exceptlists", default=";libc", nargs=1,
+                      help="Semicolon separated except lists of comma separated library names")
+
+    (options, args) = parser.parse_args()
+    if ( not options.binarypath or not options.binarycfgpath or not options.libccfgpath or not options.otherlibcfgpath ):
+        parser.error("All options --binarypath, --binarycfgpath, --libccfgpath and --otherlibcfgpath should be provided.")
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("testExceptListSweep")
+    mismatches = compareWithPerListAnalysis(options, options.startfunc.split(","), parseExceptLists(options.exceptlists), logger)
+    for mismatch in mismatches:
+        logger.error(mismatch)
+    sys.exit(1 if mismatches else 0)
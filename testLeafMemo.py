@@ -0,0 +1,121 @@
+import logging
+import os
+import random
+import sys
+import tempfile
+
+import leafMemo
+import syscallGraph
+
+def getLeavesUncached(adjGraph, startNode, leafFilter, exceptNodes):
+    """
+    Reference: plain traversal from startNode which never enters the except nodes
+    :return: set of the leaves (nodes without successors) in leafFilter, any leaf if it's empty
+    """
+    leaves = set()
+    visitedNodes = set([startNode])
+    pendingNodes = [startNode]
+    while ( pendingNodes ):
+        currentNode = pendingNodes.pop()
+        successors = adjGraph.get(currentNode, None)
+        if ( not successors ):
+            if ( not leafFilter or currentNode in leafFilter ):
+                leaves.add(currentNode)
+            continue
+        for successor in successors:
+            if ( successor not in visitedNodes and successor not in exceptNodes ):
+                visitedNodes.add(successor)
+                pendingNodes.append(successor)
+    return leaves
+
+def createRandomEdges(randomGen, nodeCount, edgeCount):
+    """
+    :return: list of (caller, callee), callees include "syscall(N)" leaves and cycles
+    """
+    nodes = ["func" + str(nodeId) for nodeId in range(nodeCount)]
+    leaves = ["syscall(" + str(syscallNum) + ")" for syscallNum in range(nodeCount // 4)] + ["leaf" + str(leafId) for leafId in range(nodeCount // 8)]
+    edges = list()
+    for edgeId in range(edgeCount):
+        callees = nodes if randomGen.random() < 0.7 else leaves
+        edges.append((randomGen.choice(nodes), randomGen.choice(callees)))
+    return edges
+
+def compareWithUncached(graphObj, randomGen, queryCount, filterLists=None, exceptLists=None):
+    """
+    :param filterLists: filter lists to pick from, a few random ones by default
+    :param exceptLists: except lists to pick from, a few random ones by default
+    :return: list of mismatch descriptions of random queries on the graph
+    """
+    mismatches = list()
+    nodes = sorted(node for node in graphObj.getAllNodes() if isinstance(node, str))
+    syscallNums = sorted(node for node in graphObj.getAllNodes() if isinstance(node, int))
+    #By default more combinations than syscallGraph.MAX_LEAF_MEMOS, so memos are dropped and rebuilt
+    if ( filterLists is None ):
+        #The string spellings of graph.Graph callers have to select the same integer leaves
+        filterLists = [list(), syscallNums, syscallNums[::2], ["syscall( " + str(syscallNum) + " )" for syscallNum in syscallNums[1::2]]]
+    if ( exceptLists is None ):
+        exceptLists = [list(), randomGen.sample(nodes, min(3, len(nodes))), randomGen.sample(nodes, min(10, len(nodes)))]
+    for queryId in range(queryCount):
+        startNode = randomGen.choice(nodes)
+        filterList = randomGen.choice(filterLists)
+        exceptList = randomGen.choice(exceptLists)
+        leaves = graphObj.getLeavesFromStartNode(startNode, filterList, exceptList)
+        referenceLeaves = getLeavesUncached(graphObj.adjGraph, startNode, set(graphObj.normalizeNode(node) for node in filterList), set(exceptList))
+        if ( leaves != referenceLeaves ):
+            mismatches.append("start node " + startNode + ": missing " + str(sorted(referenceLeaves - leaves, key=str)) + " extra " + str(sorted(leaves - referenceLeaves, key=str)))
+    return mismatches
+
+def runGraphTest(seed, logger):
+    randomGen = random.Random(seed)
+    graphObj = syscallGraph.SyscallGraph(logger)
+    mismatches = list()
+    cfgFile = tempfile.NamedTemporaryFile("w", suffix=".callgraph.out", delete=False)
+    try:
+        for caller, callee in createRandomEdges(randomGen, 200, 400):
+            cfgFile.write(caller + "->" + callee + "\n")
+        cfgFile.close()
+        graphObj.createGraphFromInput(cfgFile.name, "->")
+        mismatches.extend(compareWithUncached(graphObj, randomGen, 200))
+        #Edges added after queries have to invalidate the memoized leaves, a single
+        #filter and except list keeps the same memo alive across the insertions
+        for insertionRound in range(5):
+            mismatches.extend(compareWithUncached(graphObj, randomGen, 100, [list()], [list()]))
+            for caller, callee in createRandomEdges(randomGen, 220, 20):
+                graphObj.addEdge(caller, callee)
+            mismatches.extend(compareWithUncached(graphObj, randomGen, 100, [list()], [list()]))
+        graphObj.createGraphFromInput(cfgFile.name, "->")
+        mismatches.extend(compareWithUncached(graphObj, randomGen, 100, [list()], [list()]))
+        mismatches.extend(compareWithUncached(graphObj, randomGen, 100))
+    finally:
+        os.remove(cfgFile.name)
+    return mismatches
+
+def runLeafMemoTest(seed):
+    """
+    LeafMemo used directly on an adjacency with an except list, as by
+    Piecewise.extractAccessibleSystemCallsFromIndirectFunctions
+    """
+    randomGen = random.Random(seed)
+    adjGraph = dict()
+    for caller, callee in createRandomEdges(randomGen, 200, 500):
+        adjGraph.setdefault(caller, list()).append(callee)
+    exceptNodes = frozenset(randomGen.sample(sorted(adjGraph.keys()), 20))
+    memo = leafMemo.LeafMemo(adjGraph, exceptNodes=exceptNodes)
+    mismatches = list()
+    for startNode in randomGen.sample(sorted(adjGraph.keys()), 100):
+        if ( set(memo.getLeaves(startNode)) != getLeavesUncached(adjGraph, startNode, set(), exceptNodes) ):
+            mismatches.append("LeafMemo start node " + startNode)
+    return mismatches
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("testLeafMemo")
+    seedCount = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    mismatches = list()
+    for seed in range(seedCount):
+        mismatches.extend(runGraphTest(seed, logger))
+        mismatches.extend(runLeafMemoTest(seed))
+    for mismatch in mismatches:
+        logger.error(mismatch)
+    logger.info("%d seeds, %d mismatches", seedCount, len(mismatches))
+    sys.exit(1 if mismatches else 0)
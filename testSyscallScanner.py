@@ -0,0 +1,84 @@
+import logging
+import re
+import subprocess
+import sys
+
+sys.path.insert(0, './python-utils/')
+
+import elfReader
+import syscallScanner
+
+DEFAULT_LIBC_PATH = "/lib/x86_64-linux-gnu/libc.so.6"
+
+functionHeaderRe = re.compile(r"^[0-9a-f]+ <.*>:$")
+instructionRe = re.compile(r"^\s+([0-9a-f]+):\t(\S+)\s*(.*)$")
+eaxDestinationRe = re.compile(r"(^|,)%[er]ax$")
+movImmediateRe = re.compile(r"^\$0x([0-9a-f]+),%[er]ax$")
+
+def getObjdumpSyscallSites(filePath):
+    """
+    Reference from objdump -d: every syscall instruction with the number of the
+    closest instruction in the same function writing eax, None if that isn't an
+    immediate load or if control flow is hit first
+    :return: dict of address to system call number or None
+    """
+    output = subprocess.run(["objdump", "-d", "--no-show-raw-insn", filePath], stdout=subprocess.PIPE, universal_newlines=True, check=True).stdout
+    sites = dict()
+    functionInstructions = list()
+    for line in output.splitlines():
+        if ( functionHeaderRe.match(line) ):
+            functionInstructions = list()
+            continue
+        match = instructionRe.match(line)
+        if ( not match ):
+            continue
+        address, mnemonic, operands = int(match.group(1), 16), match.group(2), match.group(3).split("#")[0].strip()
+        if ( mnemonic == "syscall" ):
+            syscallNum = None
+            for previousMnemonic, previousOperands in reversed(functionInstructions):
+                if ( previousMnemonic.startswith(("j", "call", "ret")) ):
+                    break
+                if ( eaxDestinationRe.search(previousOperands) ):
+                    immediate = movImmediateRe.match(previousOperands)
+                    if ( previousMnemonic == "mov" and immediate ):
+                        syscallNum = int(immediate.group(1), 16)
+                    elif ( previousMnemonic == "xor" and previousOperands == "%eax,%eax" ):
+                        syscallNum = 0
+                    break
+            sites[address] = syscallNum
+        functionInstructions.append((mnemonic, operands))
+    return sites
+
+def compareWithObjdump(filePath, logger):
+    """
+    :return: list of mismatch descriptions, empty if the native scanner agrees with objdump
+    """
+    referenceSites = getObjdumpSyscallSites(filePath)
+    with elfReader.ElfFile(filePath) as elfFile:
+        nativeSites = dict(syscallScanner.iterDirectSyscallSites(elfFile))
+    mismatches = list()
+    for address in sorted(set(referenceSites) | set(nativeSites)):
+        if ( address not in nativeSites ):
+            mismatches.append("missed site " + hex(address))
+        elif ( address not in referenceSites ):
+            mismatches.append("false site " + hex(address))
+        elif ( referenceSites[address] is not None and nativeSites[address] != referenceSites[address] ):
+            mismatches.append("site " + hex(address) + ": " + str(nativeSites[address]) + " instead of " + str(referenceSites[address]))
+    referenceSyscalls = set(num for num in referenceSites.values() if num is not None)
+    nativeSyscalls, successCount, failedCount = syscallScanner.scanDirectSyscalls(filePath, logger)
+    logger.info("%s: %d sites in objdump, native resolved %d and failed %d", filePath, len(referenceSites), successCount, failedCount)
+    if ( referenceSyscalls - nativeSyscalls ):
+        mismatches.append("missed system calls " + str(sorted(referenceSyscalls - nativeSyscalls)))
+    return mismatches
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("testSyscallScanner")
+    filePaths = sys.argv[1:] if len(sys.argv) > 1 else [DEFAULT_LIBC_PATH]
+    failed = False
+    for filePath in filePaths:
+        mismatches = compareWithObjdump(filePath, logger)
+        for mismatch in mismatches:
+            logger.error("%s: %s", filePath, mismatch)
+        failed = failed or bool(mismatches)
+    sys.exit(1 if failed else 0)